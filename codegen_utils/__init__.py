@@ -0,0 +1,6 @@
+"""
+Shared helpers for the LLM code generation pipelines.
+
+Like ``crawler_utils``, the generator scripts add the repository root to
+``sys.path`` and import from here directly.
+"""
@@ -0,0 +1,136 @@
+"""
+Build cache for the code generators.
+
+A generated crawler only needs regenerating when one of its inputs changes:
+the API documentation, the prompt template, the model or the generator
+itself. ``build_key`` hashes those inputs, and ``BuildCache`` remembers, per
+target, the key of the last successful build and the hashes of the files it
+produced. A generator checks ``is_fresh`` before calling the LLM, so a full
+pipeline run with unchanged inputs costs a few file hashes. Outputs that
+were deleted or edited by hand count as stale and are rebuilt.
+
+The manifest defaults to ``.codegen_cache/builds.json`` in the working
+directory and can be moved with ``CODEGEN_CACHE_DIR``.
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+from crawler_utils import serialization
+
+logger = logging.getLogger(__name__)
+
+
+def default_manifest_path():
+    """Return the build manifest path inside the codegen cache directory."""
+    cache_dir = os.getenv("CODEGEN_CACHE_DIR", ".codegen_cache")
+    return os.path.join(cache_dir, "builds.json")
+
+
+def build_key(api_doc, prompt_template, model_id, generator_version):
+    """
+    Hash the inputs that determine a generated crawler.
+
+    Args:
+        api_doc (str): API documentation text
+        prompt_template (str): Prompt template, or the rendered prompt when the
+            generator has no separate template
+        model_id (str): Model identifier
+        generator_version (str): Version of the generator's own logic; bump it
+            when a change should invalidate every build
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    for part in (api_doc, prompt_template, model_id, generator_version):
+        encoded = (part or "").encode("utf-8")
+        # Length-prefix each part so no two input tuples hash the same bytes
+        digest.update(f"{len(encoded)}:".encode("ascii"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BuildCache:
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str): JSON manifest file; defaults to default_manifest_path()
+        """
+        self.path = path or default_manifest_path()
+        self._entries = self._load()
+
+    def is_fresh(self, target, key):
+        """
+        Check whether a target was built from these inputs and is untouched.
+
+        Args:
+            target (str): Build target name, e.g. "langgraph:ctv"
+            key (str): build_key() of the current inputs
+
+        Returns:
+            bool: True when the build can be skipped
+        """
+        entry = self._entries.get(target)
+        if not isinstance(entry, dict) or entry.get("key") != key:
+            return False
+        for path, expected in entry.get("outputs", {}).items():
+            if not os.path.exists(path) or file_hash(path) != expected:
+                logger.info(f"Output {path} of '{target}' is missing or modified")
+                return False
+        return True
+
+    def outputs(self, target):
+        """Return the output paths recorded for a target."""
+        entry = self._entries.get(target)
+        return list(entry.get("outputs", {})) if isinstance(entry, dict) else []
+
+    def record(self, target, key, outputs):
+        """
+        Record a successful build.
+
+        Args:
+            target (str): Build target name
+            key (str): build_key() of the inputs it was built from
+            outputs (list): Paths of the files it produced
+        """
+        self._entries[target] = {
+            "key": key,
+            "outputs": {path: file_hash(path) for path in outputs},
+            "built_at": time.time(),
+        }
+        self._save()
+
+    def invalidate(self, target):
+        """Forget a target so its next build runs."""
+        if self._entries.pop(target, None) is not None:
+            self._save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            return serialization.read_json(self.path)
+        except (OSError, *serialization.DECODE_ERRORS) as e:
+            logger.warning(f"Ignoring unreadable build manifest {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temp file first so a crash never leaves a truncated manifest
+        tmp_path = f"{self.path}.tmp"
+        serialization.write_json(tmp_path, self._entries)
+        os.replace(tmp_path, self.path)
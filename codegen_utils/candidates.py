@@ -0,0 +1,135 @@
+"""
+Parallel best-of-N code generation.
+
+Instead of retrying one generation after another, N generations are started
+at once with different temperatures and prompt variants. Each candidate is
+validated as soon as its stream finishes, while the others are still
+generating, so the wall time to a working crawler is roughly that of the
+slowest attempt rather than the sum of the sequential retries.
+
+Two selection strategies are supported:
+
+    "first"   return the first candidate that passes and cancel the streams
+              that are still running; validations already in flight are not
+              waited for and finish in the background
+    "best"    wait for every candidate and return the passing one with the
+              highest score (by default, the earliest variant in the list)
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from codegen_utils.streaming import stream_code
+
+Variant = namedtuple("Variant", ["name", "temperature", "instructions"])
+
+Candidate = namedtuple("Candidate", ["index", "variant", "code", "error", "stats"])
+
+DEFAULT_VARIANTS = (
+    Variant("greedy", 0.0, ""),
+    Variant("warm", 0.5, ""),
+    Variant("defensive", 0.2, "Check every HTTP status and guard every dictionary lookup with .get()."),
+    Variant("minimal", 0.3, "Keep the script short: one function per API level and no unused helpers."),
+)
+
+
+def _unfinished_stats(variant, start, stop_reason):
+    return {
+        "ttft_seconds": None,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "stop_reason": stop_reason,
+        "variant": variant.name,
+        "temperature": variant.temperature,
+        "passed": False,
+    }
+
+
+def _run_candidate(index, variant, make_llm, prompt, validate, cancel):
+    start = time.perf_counter()
+    full_prompt = f"{prompt}\n{variant.instructions}" if variant.instructions else prompt
+    try:
+        result = stream_code(make_llm(variant.temperature), full_prompt, cancel=cancel)
+    except Exception as e:
+        # A throttled or failed call sinks only this candidate, not the others
+        return Candidate(index, variant, None, f"Generation failed: {type(e).__name__}: {e}",
+                         _unfinished_stats(variant, start, "error"))
+    stats = dict(result.stats, variant=variant.name, temperature=variant.temperature)
+
+    if result.stop_reason == "cancelled" or cancel.is_set():
+        error = "cancelled"
+    elif result.error:
+        error = f"Invalid Python syntax: {result.error}"
+    else:
+        validate_start = time.perf_counter()
+        try:
+            error = validate(result.code)
+        except Exception as e:
+            error = f"Validation failed: {type(e).__name__}: {e}"
+        stats["validate_seconds"] = round(time.perf_counter() - validate_start, 3)
+    stats["passed"] = error is None
+    stats["candidate_seconds"] = round(time.perf_counter() - start, 3)
+    return Candidate(index, variant, result.code, error, stats)
+
+
+def generate_candidates(make_llm, prompt, validate, variants=DEFAULT_VARIANTS, strategy="first", score=None):
+    """
+    Generate and validate candidates concurrently and pick one that passes.
+
+    Args:
+        make_llm (callable): make_llm(temperature) -> LangChain chat model supporting stream()
+        prompt (str): Generation prompt; each variant's instructions are appended to it
+        validate (callable): validate(code) -> error message, or None if the code passes;
+            called from worker threads, so it must not patch process-wide state
+        variants (sequence): Variants to generate, one candidate each
+        strategy (str): "first" or "best"
+        score (callable): score(candidate) -> sortable; higher wins under "best"
+
+    Returns:
+        tuple: (winning Candidate or None, all Candidates in variant order); under
+            "first", candidates still running when the winner passed are reported as cancelled
+    """
+    if strategy not in ("first", "best"):
+        raise ValueError(f"unknown strategy: {strategy}")
+    score = score or (lambda candidate: -candidate.index)
+    cancel = threading.Event()
+    candidates = []
+    winner = None
+
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=len(variants))
+    futures = {
+        executor.submit(_run_candidate, index, variant, make_llm, prompt, validate, cancel): index
+        for index, variant in enumerate(variants)
+    }
+    pending = set(futures)
+    try:
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate = future.result()
+                candidates.append(candidate)
+                if candidate.error is None and strategy == "first" and winner is None:
+                    winner = candidate
+                    # Stop the streams that are still generating
+                    cancel.set()
+    finally:
+        # A validation subprocess can run for minutes; once there is a winner
+        # it is left to finish in the background instead of being waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+    for future in pending:
+        if future.done() and not future.cancelled():
+            candidates.append(future.result())
+        else:
+            index = futures[future]
+            candidates.append(Candidate(index, variants[index], None, "cancelled",
+                                        _unfinished_stats(variants[index], start, "cancelled")))
+
+    candidates.sort(key=lambda candidate: candidate.index)
+    if strategy == "best":
+        passing = [candidate for candidate in candidates if candidate.error is None]
+        winner = max(passing, key=score) if passing else None
+    return winner, candidates
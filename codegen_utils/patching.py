@@ -0,0 +1,309 @@
+"""
+Patch-mode self-correction for generated code.
+
+Instead of regenerating a whole crawler after a failed parse or test, the
+model is shown the numbered code and the error and asked for only the change:
+either a unified diff or complete replacements of the functions or methods
+that need to change. ``apply_patch`` applies either form locally, so a retry
+costs a few hundred output tokens instead of the whole file. Anything that
+cannot be applied cleanly raises ``PatchError`` and the caller falls back to
+full regeneration.
+"""
+
+import ast
+import re
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_FENCED_BLOCK = re.compile(r"```[\w+-]*\n(.*?)```", re.DOTALL)
+_ERROR_LINE = re.compile(r"line (\d+)")
+
+PATCH_INSTRUCTIONS = """Fix the error by changing as little as possible. Reply with ONLY one of:
+1. A unified diff against the file above (--- a/script.py, +++ b/script.py, @@ hunks), in a ```diff block.
+2. The complete new versions of just the functions or methods that must change, in a ```python block.
+   Wrap methods in their class statement, listing only the changed methods.
+   New top-level imports may be included at the top of the block.
+Do not return the whole file."""
+
+
+class PatchError(Exception):
+    """The model's patch could not be applied to the code."""
+
+
+def error_line(error):
+    """
+    Return the last line number mentioned in an error message, if any.
+
+    Args:
+        error (str): Syntax error or traceback text
+
+    Returns:
+        int: Line number, or None
+    """
+    matches = _ERROR_LINE.findall(error or "")
+    return int(matches[-1]) if matches else None
+
+
+def build_patch_prompt(code, error):
+    """
+    Build the correction prompt for patch mode.
+
+    Args:
+        code (str): Current generated code
+        error (str): Parse or test error to fix
+
+    Returns:
+        str: Prompt text
+    """
+    numbered = "\n".join(f"{i:>4}| {line}" for i, line in enumerate(code.splitlines(), 1))
+    line = error_line(error)
+    hint = f"\nThe error points at line {line}.\n" if line else "\n"
+    return (
+        "The following Python script fails. Line numbers are shown only for reference.\n\n"
+        f"{numbered}\n\n"
+        f"Error:\n---\n{error}\n---\n{hint}\n"
+        f"{PATCH_INSTRUCTIONS}"
+    )
+
+
+def apply_patch(code, response):
+    """
+    Apply a model response in either patch format to code.
+
+    Args:
+        code (str): Current code
+        response (str): Model response containing a unified diff or replacement code
+
+    Returns:
+        str: The patched code, which is guaranteed to parse
+
+    Raises:
+        PatchError: When the response cannot be applied or the result does not parse
+    """
+    blocks = _FENCED_BLOCK.findall(response)
+    body = "\n".join(blocks) if blocks else response
+    if any(_HUNK_HEADER.match(line) for line in body.splitlines()):
+        patched = apply_unified_diff(code, body)
+    else:
+        patched = apply_replacements(code, body)
+    try:
+        ast.parse(patched)
+    except SyntaxError as e:
+        raise PatchError(f"patched code does not parse: {e}") from e
+    return patched
+
+
+def apply_unified_diff(code, diff):
+    """
+    Apply a unified diff, locating each hunk by its content.
+
+    Model-written hunk headers often have wrong line numbers, so each hunk is
+    matched by its context and removed lines, starting at the stated line
+    and searching outward.
+
+    Args:
+        code (str): Current code
+        diff (str): Unified diff text
+
+    Returns:
+        str: The patched code
+
+    Raises:
+        PatchError: When a hunk's context cannot be found
+    """
+    lines = code.splitlines()
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise PatchError("diff contains no hunks")
+
+    offset = 0
+    for stated_start, old, new in hunks:
+        position = _find_block(lines, old, stated_start - 1 + offset)
+        if position is None:
+            raise PatchError(f"hunk at line {stated_start} does not match the code")
+        lines[position:position + len(old)] = new
+        offset += len(new) - len(old)
+    return "\n".join(lines) + "\n"
+
+
+def _parse_hunks(diff):
+    hunks = []
+    current = None
+    for line in diff.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+        elif current is None or line.startswith(("--- ", "+++ ")):
+            continue
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current[1].append(line[1:])
+            current[2].append(line[1:])
+        # "\ No newline at end of file" and stray text are ignored
+    return hunks
+
+
+def _find_block(lines, block, near):
+    if not block:
+        return max(0, min(near, len(lines)))
+    normalized = [line.rstrip() for line in block]
+    candidates = range(len(lines) - len(block) + 1)
+    for start in sorted(candidates, key=lambda i: abs(i - near)):
+        if [line.rstrip() for line in lines[start:start + len(block)]] == normalized:
+            return start
+    return None
+
+
+def apply_replacements(code, replacement):
+    """
+    Replace functions, methods and classes with the definitions in replacement.
+
+    Top-level functions replace their namesakes. A class in the replacement
+    is merged method by method into the existing class of the same name.
+    Definitions that do not exist yet are appended, and new imports are
+    added after the existing ones. The current code does not need to parse,
+    since the error being fixed is often a syntax error; definitions are then
+    located by indentation.
+
+    Args:
+        code (str): Current code
+        replacement (str): Python source with the new definitions
+
+    Returns:
+        str: The patched code
+
+    Raises:
+        PatchError: When the replacement does not parse or holds no definitions
+    """
+    try:
+        new_tree = ast.parse(replacement)
+    except SyntaxError as e:
+        raise PatchError(f"replacement code does not parse: {e}") from e
+
+    lines = code.splitlines()
+    new_lines = replacement.splitlines()
+    edits = []
+    appended = []
+    imports = []
+
+    for node in new_tree.body:
+        source = _node_source(new_lines, node)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if not any(line.strip() == source.strip() for line in lines):
+                imports.append(source)
+            continue
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+
+        existing = _find_definition(lines, node.name)
+        if existing is None:
+            appended.append(source)
+        elif isinstance(node, ast.ClassDef):
+            edits.extend(_merge_class(lines, existing, node, new_lines))
+        else:
+            edits.append((existing.start, existing.end, source))
+
+    if not edits and not appended and not imports:
+        raise PatchError("replacement contains no definitions")
+
+    # Apply from the bottom up so earlier line numbers stay valid
+    for start, end, source in sorted(edits, key=lambda edit: edit[0], reverse=True):
+        lines[start - 1:end] = source.splitlines()
+    if imports:
+        insert_at = _import_insertion_line(lines)
+        lines[insert_at:insert_at] = imports
+    for source in appended:
+        lines.extend(["", ""] + source.splitlines())
+    return "\n".join(lines) + "\n"
+
+
+def _merge_class(lines, existing, node, new_lines):
+    edits = []
+    added = []
+    # Only methods at the class body's own indentation; helpers nested in other methods are not members
+    body_indent = _guess_body_indent(lines, existing)
+    for item in node.body:
+        if not isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        old = _find_definition(lines, item.name, existing.start, existing.end, indent=body_indent)
+        source = _reindent(_node_source(new_lines, item), item.col_offset, body_indent)
+        if old is not None:
+            edits.append((old.start, old.end, source))
+        else:
+            added.append(source)
+    if added:
+        # New methods go after the last line of the class
+        tail = lines[existing.end - 1]
+        edits.append((existing.end, existing.end, "\n".join([tail, ""] + added)))
+    return edits
+
+
+class _Span:
+    """Line range (1-based, inclusive) of a definition, decorators included."""
+
+    def __init__(self, start, end, indent):
+        self.start = start
+        self.end = end
+        self.indent = indent
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def _find_definition(lines, name, lo=1, hi=None, indent=0):
+    hi = len(lines) if hi is None else hi
+    pattern = re.compile(rf"^([ \t]*)(?:async\s+def|def|class)\s+{re.escape(name)}\b")
+    for index in range(lo - 1, hi):
+        match = pattern.match(lines[index])
+        if not match or len(match.group(1)) != indent:
+            continue
+        start = index
+        while start > lo - 1 and lines[start - 1].strip().startswith("@") and _indent(lines[start - 1]) == indent:
+            start -= 1
+        # The definition runs until the next non-blank, non-comment line at its indentation or less
+        end = index + 1
+        while end < hi and (not lines[end].strip() or lines[end].lstrip().startswith("#")
+                            or _indent(lines[end]) > indent):
+            end += 1
+        while end > index + 1 and (not lines[end - 1].strip() or lines[end - 1].lstrip().startswith("#")):
+            end -= 1
+        return _Span(start + 1, end, indent)
+    return None
+
+
+def _guess_body_indent(lines, class_span):
+    # The first code line indented past the class header (decorators and header are at its indent)
+    for line in lines[class_span.start - 1:class_span.end]:
+        if line.strip() and not line.lstrip().startswith("#") and _indent(line) > class_span.indent:
+            return _indent(line)
+    return class_span.indent + 4
+
+
+def _node_source(lines, node):
+    start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+
+def _reindent(source, current, target):
+    if current == target:
+        return source
+    result = []
+    for line in source.splitlines():
+        if line.strip():
+            line = " " * target + line[current:] if line[:current].strip() == "" else line
+        result.append(line)
+    return "\n".join(result)
+
+
+def _import_insertion_line(lines):
+    last = 0
+    for index, line in enumerate(lines):
+        if line.startswith(("import ", "from ")):
+            last = index + 1
+        elif line.strip() and not line.startswith("#") and last:
+            break
+    return last
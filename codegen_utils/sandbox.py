@@ -0,0 +1,98 @@
+"""
+Mocked execution harness for generated crawlers.
+
+The generated code runs with ``requests.get``, ``os.makedirs`` and ``open``
+patched out, so it cannot reach the network or write files. This only shows
+that the module-level code runs without raising.
+
+``unittest.mock.patch`` swaps module attributes for the whole process, so
+the harness is not thread-safe. ``run_sandboxed`` runs it in a child process
+instead, so several candidates can be checked at once:
+
+    python -m codegen_utils.sandbox path/the/code/is/saved/to.py < code.py
+"""
+
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock, mock_open, patch
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def mocked_exec(code, file_path):
+    """
+    Execute generated code with network and file access mocked out.
+
+    Args:
+        code (str): Python source
+        file_path (str): Path the code will be saved to; becomes __file__ so
+            that imports relative to it resolve
+
+    Raises:
+        Exception: Whatever the code raises
+    """
+    # Mock the API response
+    mock_api_response = MagicMock()
+    mock_api_response.status_code = 200
+
+    # Use patch to intercept calls to requests, os, and open
+    with patch('requests.get', return_value=mock_api_response) as mock_get, \
+         patch('os.makedirs') as mock_makedirs, \
+         patch('builtins.open', mock_open()) as mock_file:
+        exec(code, {"__file__": file_path})
+
+        # --- Validation Checks ---
+        # 1. Did it try to make the correct directory?
+        # mock_makedirs.assert_called_with("movies", exist_ok=True)
+
+        # 2. Did it try to fetch data from the API?
+        # mock_get.assert_called_with("[https://swapi.dev/api/films/](https://swapi.dev/api/films/)")
+
+        # 3. Did it try to create the correct files?
+        # mock_file.assert_any_call("movies/A_New_Hope.json", "w")
+
+
+def run_sandboxed(code, file_path, timeout=120):
+    """
+    Run mocked_exec in a child process.
+
+    Args:
+        code (str): Python source
+        file_path (str): See mocked_exec
+        timeout (float): Seconds before the run counts as failed
+
+    Returns:
+        str: Error message, or None if the code ran through
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.getenv("PYTHONPATH")])))
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "codegen_utils.sandbox", file_path],
+            input=code, capture_output=True, text=True, timeout=timeout, env=env,
+        )
+    except subprocess.TimeoutExpired:
+        return f"Runtime or validation error: timed out after {timeout} seconds"
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return f"Runtime or validation error: {lines[-1] if lines else f'exit code {result.returncode}'}"
+    return None
+
+
+def main():
+    file_path = sys.argv[1] if len(sys.argv) > 1 else os.path.abspath("generated_api_crawler.py")
+    code = sys.stdin.read()
+    try:
+        mocked_exec(code, file_path)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            print(f"SystemExit: {e.code}", file=sys.stderr)
+            return 1
+    except BaseException as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""
+Streaming code generation with early syntax checks.
+
+Generations can run to tens of thousands of tokens, and a broken one used to
+be discovered only after the whole completion had arrived. ``CodeStream``
+consumes the completion as it streams. It strips markdown fences on the fly
+and compiles each top-level statement as soon as the next one starts. If a
+statement is definitely invalid, or the output drifts into prose where code
+is expected, generation is cancelled.
+
+Two layouts are supported:
+
+    fenced=False   the completion should be code; a wrapping ```python fence
+                   and a short preamble are tolerated, and streaming stops
+                   once the fence closes
+    fenced=True    prose with ```python blocks (the flow-generation prompts);
+                   only the Python blocks are checked
+
+A fence line only closes a block outside string literals, so generated code
+that embeds markdown in a triple-quoted string (a prompt, say) is not cut
+short. An empty completion is reported as "empty" rather than as prose.
+"""
+
+import codeop
+import io
+import keyword
+import re
+import time
+import tokenize
+import warnings
+from collections import namedtuple
+
+StreamResult = namedtuple("StreamResult", ["text", "code", "error", "stop_reason", "stats"])
+
+# Lines at column 0 that continue the previous statement instead of starting one
+_CONTINUATION_KEYWORDS = ("else", "elif", "except", "finally", "case")
+
+# A lone word compiles as an expression but is far more likely prose
+_BARE_WORD = re.compile(r"[A-Za-z_]\w*[.!]?")
+
+
+def _is_fence(line):
+    return line.lstrip().startswith("```")
+
+
+def _is_python_fence(line):
+    language = line.strip()[3:].strip().lower()
+    return language in ("python", "py", "python3")
+
+
+def _ends_inside_string(source):
+    """Return True if source stops inside an unterminated (triple-quoted) string."""
+    try:
+        for _ in tokenize.generate_tokens(io.StringIO(source).readline):
+            pass
+    except tokenize.TokenError as e:
+        # "EOF in multi-line string", or "unterminated triple-quoted string literal" on 3.12+
+        return "string" in str(e.args[0])
+    except SyntaxError:
+        return False
+    return False
+
+
+def _starts_statement(line):
+    if not line.strip() or line[0] in " \t#)]}":
+        return False
+    word = line.split(None, 1)[0].rstrip(":")
+    return word not in _CONTINUATION_KEYWORDS
+
+
+def check_segment(source):
+    """
+    Classify a chunk of source that starts at a statement boundary.
+
+    Args:
+        source (str): Python source
+
+    Returns:
+        tuple: ("ok" | "incomplete" | "error", SyntaxError or None)
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            compiled = codeop.compile_command(source, "<generated>", "exec")
+    except (SyntaxError, ValueError, OverflowError) as e:
+        return "error", e
+    return ("incomplete", None) if compiled is None else ("ok", None)
+
+
+class CodeStream:
+    def __init__(self, fenced=False, max_preamble_lines=5):
+        """
+        Args:
+            fenced (bool): Code only appears inside ```python blocks amid prose
+            max_preamble_lines (int): Prose lines tolerated before the code when not fenced
+        """
+        self.fenced = fenced
+        self.max_preamble_lines = max_preamble_lines
+        self.text = ""
+        self.error = None
+        self.stop_reason = None
+        self._partial = ""
+        self._code_lines = []
+        self._checked_upto = 0
+        self._state = "prose" if fenced else "start"
+        self._preamble_lines = 0
+
+    @property
+    def code(self):
+        """The code extracted so far, without fences."""
+        return "".join(self._code_lines)
+
+    def feed(self, chunk):
+        """
+        Consume the next piece of the completion.
+
+        Args:
+            chunk (str): Newly streamed text
+
+        Returns:
+            bool: False once generation should stop (see error and stop_reason)
+        """
+        if self.stop_reason:
+            return False
+        self.text += chunk
+        self._partial += chunk
+        *lines, self._partial = self._partial.split("\n")
+        for line in lines:
+            self._consume(line + "\n")
+            if self.stop_reason:
+                return False
+        return True
+
+    def finish(self):
+        """
+        Process the trailing partial line and check the remaining code.
+
+        Returns:
+            str: The extracted code
+        """
+        if self._partial and not self.stop_reason:
+            self._consume(self._partial)
+        self._partial = ""
+        if not self.stop_reason:
+            if not self.text.strip():
+                self._fail(None, reason="empty")
+            elif self._state == "code":
+                self._close_block()
+            elif not self.fenced and not self._code_lines:
+                self._fail(None, reason="prose")
+        self.stop_reason = self.stop_reason or "complete"
+        return self.code
+
+    def _consume(self, line):
+        if self._state == "prose":
+            if _is_fence(line):
+                self._state = "code" if _is_python_fence(line) else "other_fence"
+            return
+        if self._state == "other_fence":
+            if _is_fence(line):
+                self._state = "prose"
+            return
+        if self._state == "start":
+            # Decide whether the completion opens with code, a fence or a preamble
+            if not line.strip():
+                return
+            if _is_fence(line):
+                self._state = "code"
+                return
+            # A line opening with a keyword is broken code, not prose, even if it does not compile
+            opens_with_keyword = keyword.iskeyword(re.split(r"[^\w]", line.strip(), 1)[0])
+            if not opens_with_keyword and (_BARE_WORD.fullmatch(line.strip()) or check_segment(line)[0] == "error"):
+                self._preamble_lines += 1
+                if self._preamble_lines > self.max_preamble_lines:
+                    self._fail(None, reason="prose")
+                return
+            self._state = "code"
+
+        if _is_fence(line) and not self._inside_string():
+            self._close_block()
+            return
+        if _starts_statement(line) and not self._continues_previous_line():
+            self._check_boundary()
+            if self.error:
+                return
+        self._code_lines.append(line)
+
+    def _close_block(self):
+        remaining = "".join(self._code_lines[self._checked_upto:])
+        if remaining.strip():
+            status, error = check_segment(remaining + "\n")
+            if status != "ok":
+                self._fail(error or SyntaxError("the code ends inside an unfinished statement"))
+                return
+        self._checked_upto = len(self._code_lines)
+        if self.fenced:
+            self._state = "prose"
+        else:
+            self.stop_reason = "complete"
+
+    def _inside_string(self):
+        # Strings never span a checked boundary, so the unchecked lines are enough
+        return _ends_inside_string("".join(self._code_lines[self._checked_upto:]))
+
+    def _continues_previous_line(self):
+        for previous in reversed(self._code_lines):
+            if previous.strip():
+                return previous.rstrip("\n").endswith("\\")
+        return False
+
+    def _check_boundary(self):
+        # Everything since the last good boundary should now form complete statements
+        segment = "".join(self._code_lines[self._checked_upto:])
+        if not segment.strip():
+            return
+        status, error = check_segment(segment)
+        if status == "ok":
+            self._checked_upto = len(self._code_lines)
+        elif status == "error":
+            self._fail(error)
+
+    def _fail(self, error, reason="syntax"):
+        if reason == "prose":
+            self.error = "the output drifted into prose where code was expected"
+        elif reason == "empty":
+            self.error = "the completion was empty"
+        else:
+            lineno = (getattr(error, "lineno", None) or 1) + self._checked_upto
+            self.error = f"{getattr(error, 'msg', error)} (line {lineno})"
+        self.stop_reason = reason
+
+
+def stream_code(llm, prompt, fenced=False, cancel=None):
+    """
+    Stream a completion through CodeStream and stop early once it is broken.
+
+    Args:
+        llm: LangChain chat model supporting stream()
+        prompt (str): Prompt text
+        fenced (bool): See CodeStream
+        cancel (threading.Event): Stops the generation once set, e.g. when a
+            concurrent candidate has already succeeded
+
+    Returns:
+        StreamResult: text, extracted code, error (None if valid), stop_reason
+            ("complete", "syntax", "prose", "empty" or "cancelled") and timing/token stats
+    """
+    monitor = CodeStream(fenced=fenced)
+    start = time.perf_counter()
+    first_token_at = None
+    message = None
+    chunks = llm.stream([prompt])
+    try:
+        for chunk in chunks:
+            if first_token_at is None and chunk.content:
+                first_token_at = time.perf_counter()
+            message = chunk if message is None else message + chunk
+            if not monitor.feed(chunk.content if isinstance(chunk.content, str) else ""):
+                break
+            if cancel is not None and cancel.is_set():
+                monitor.stop_reason = "cancelled"
+                break
+    finally:
+        # Closing the generator drops the HTTP stream of a cancelled generation
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+    code = monitor.finish()
+    usage = getattr(message, "usage_metadata", None) or {}
+    stats = {
+        "ttft_seconds": None if first_token_at is None else round(first_token_at - start, 3),
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "prompt_chars": len(prompt),
+        "completion_chars": len(monitor.text),
+        "prompt_tokens": usage.get("input_tokens"),
+        "completion_tokens": usage.get("output_tokens"),
+        "stop_reason": monitor.stop_reason,
+    }
+    return StreamResult(monitor.text, code, monitor.error, monitor.stop_reason, stats)
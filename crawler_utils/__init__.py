@@ -0,0 +1,6 @@
+"""
+Shared runtime helpers for the generated site crawlers.
+
+The crawler scripts live in directories that are not importable packages, so
+they add the repository root to ``sys.path`` and import from here directly.
+"""
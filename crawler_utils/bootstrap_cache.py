@@ -0,0 +1,201 @@
+"""
+Persistent cache for crawler bootstrap values.
+
+Values such as the YLE Next.js build_id or the detected country are needed
+before any crawling starts. Fetching them costs a full round-trip (plus an
+HTML parse for the build_id) on every start, even though they rarely change.
+``BootstrapCache`` keeps them in a small JSON file with a per-key TTL so a
+crawler only refetches them when they have expired or have been proven
+stale, e.g. by a 404 from an endpoint that embeds them. Entries can also be
+refreshed in the background once they pass a soft ``refresh_after`` age, so
+a scheduled crawl keeps using the cached value and never waits on the
+refresh.
+
+The cache directory defaults to ``.crawler_cache`` in the working directory
+and can be moved with ``CRAWLER_CACHE_DIR``.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from crawler_utils import serialization
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_path(name):
+    """
+    Return the cache file path for a named cache.
+
+    Args:
+        name (str): Cache name, e.g. "yle_bootstrap"
+
+    Returns:
+        str: Path of the JSON cache file
+    """
+    cache_dir = os.getenv("CRAWLER_CACHE_DIR", ".crawler_cache")
+    return os.path.join(cache_dir, f"{name}.json")
+
+
+class BootstrapCache:
+    def __init__(self, path, ttl=24 * 3600):
+        """
+        Args:
+            path (str): JSON file backing the cache
+            ttl (float): Default time-to-live of an entry in seconds
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = self._load()
+        self._refreshing = {}
+
+    def get(self, key, ttl=None):
+        """
+        Return a cached value if it is still fresh.
+
+        Args:
+            key (str): Cache key
+            ttl (float): Override the default time-to-live
+
+        Returns:
+            The cached value, or None when missing or expired
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or time.time() - entry["fetched_at"] > ttl:
+            return None
+        return entry["value"]
+
+    def set(self, key, value):
+        """
+        Store a value and persist the cache file.
+
+        Args:
+            key (str): Cache key
+            value: JSON-serializable value
+        """
+        with self._lock:
+            self._entries[key] = {"value": value, "fetched_at": time.time()}
+            self._save()
+
+    def invalidate(self, key):
+        """
+        Drop a value that turned out to be stale.
+
+        Args:
+            key (str): Cache key
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def get_or_fetch(self, key, fetch, ttl=None, refresh_after=None):
+        """
+        Return the cached value, calling fetch() to refresh it when needed.
+
+        A None result from fetch() is returned but not cached. When
+        refresh_after is given and the entry is older than that but still
+        within its TTL, the cached value is returned immediately and fetch()
+        runs on a background thread.
+
+        Args:
+            key (str): Cache key
+            fetch (callable): Zero-argument function producing the value
+            ttl (float): Override the default time-to-live
+            refresh_after (float): Age in seconds after which to refresh in the background
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        value = self.get(key, ttl=ttl)
+        if value is not None:
+            age = self.age(key)
+            if refresh_after is not None and age is not None and age > refresh_after:
+                self.refresh_in_background(key, fetch)
+            return value
+        value = fetch()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def age(self, key):
+        """
+        Return how long ago a key was stored, in seconds.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            float: Age in seconds, or None if the key is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry:
+            return None
+        return time.time() - entry["fetched_at"]
+
+    def refresh_in_background(self, key, fetch):
+        """
+        Refetch a key on a daemon thread unless a refresh is already running.
+
+        Args:
+            key (str): Cache key
+            fetch (callable): Zero-argument function producing the value
+
+        Returns:
+            threading.Thread: The refresh thread
+        """
+        with self._lock:
+            thread = self._refreshing.get(key)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(
+                target=self._refresh, args=(key, fetch), name=f"bootstrap-refresh-{key}", daemon=True
+            )
+            self._refreshing[key] = thread
+            thread.start()
+        return thread
+
+    def wait_for_refreshes(self, timeout=None):
+        """
+        Block until running background refreshes finish.
+
+        Args:
+            timeout (float): Maximum seconds to wait per refresh
+        """
+        with self._lock:
+            threads = list(self._refreshing.values())
+        for thread in threads:
+            thread.join(timeout)
+
+    def _refresh(self, key, fetch):
+        try:
+            value = fetch()
+        except Exception as e:
+            logger.warning(f"Background refresh of '{key}' failed: {e}")
+            return
+        if value is not None:
+            self.set(key, value)
+            logger.info(f"Refreshed bootstrap value '{key}' in the background")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            return serialization.read_json(self.path)
+        except (OSError, *serialization.DECODE_ERRORS) as e:
+            logger.warning(f"Ignoring unreadable bootstrap cache {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temp file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        serialization.write_json(tmp_path, self._entries)
+        os.replace(tmp_path, self.path)
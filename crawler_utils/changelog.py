@@ -0,0 +1,196 @@
+"""
+Change-data capture between successive crawls.
+
+Consumers used to find out what changed by diffing whole output directories
+such as ``ctv_results/<channel>/`` or ``yle_areena_results/<channel>/<date>/``.
+``ChangeLog`` compares every freshly fetched item with the version seen by
+the previous crawl, matched by a stable key (the YLE item ID from
+``pointer.uri``, the CTV channel and ``StartTime``, the Hotstar
+``content_id``), and appends one event per difference to an append-only JSON
+lines file:
+
+    {"ts": ..., "site": "yle", "scope": "yle-tv1/2024-06-01", "key": "1-123",
+     "op": "insert" | "update" | "delete", "digest": ..., "data": {...}}
+
+Inserts and updates carry the new item; deletes only carry the key. A scope
+is a complete snapshot, e.g. one channel's schedule for one date, so keys
+missing from a new snapshot of the scope are reported as deleted. Items that
+are not part of such a snapshot are captured one at a time and are never
+deleted.
+
+The last seen digest per key is kept in a SQLite file next to the other
+crawler caches, so the worker processes of a sharded crawl share it. The
+log directory defaults to ``crawler_changelog`` and can be moved with
+``CRAWLER_CHANGELOG_DIR``; ``read_changes`` lets a downstream job pick up
+where it stopped.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from crawler_utils import serialization
+from crawler_utils.dedup import content_hash
+
+
+def default_changelog_path(site):
+    """
+    Return the append-only change log of a site.
+
+    Args:
+        site (str): Site name, e.g. "yle"
+
+    Returns:
+        str: Path of the JSON lines file
+    """
+    log_dir = os.getenv("CRAWLER_CHANGELOG_DIR", "crawler_changelog")
+    return os.path.join(log_dir, f"{site}.jsonl")
+
+
+def default_state_path(site):
+    """Return the last-seen digest database of a site inside the crawler cache directory."""
+    cache_dir = os.getenv("CRAWLER_CACHE_DIR", ".crawler_cache")
+    return os.path.join(cache_dir, f"{site}_changelog.sqlite")
+
+
+def read_changes(path, offset=0):
+    """
+    Read the events appended to a change log since an offset.
+
+    Args:
+        path (str): Change log file
+        offset (int): Byte offset returned by the previous call
+
+    Returns:
+        tuple: (list of events, offset to pass next time)
+    """
+    if not os.path.exists(path):
+        return [], offset
+    events = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            # A line without its newline is still being written
+            if not line.endswith(b"\n"):
+                break
+            events.append(serialization.loads(line))
+            offset += len(line)
+    return events, offset
+
+
+class ChangeLog:
+    def __init__(self, site, log_path=None, state_path=None, ignore=()):
+        """
+        Args:
+            site (str): Site name recorded in every event
+            log_path (str): Change log file; defaults to default_changelog_path(site)
+            state_path (str): SQLite file with the last seen digests
+            ignore (iterable): Keys left out of the digest at every depth, e.g.
+                signed URLs that differ on every fetch
+        """
+        self.site = site
+        self.log_path = log_path or default_changelog_path(site)
+        self.ignore = tuple(ignore)
+        state_path = state_path or default_state_path(site)
+        for path in (self.log_path, state_path):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(state_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                scope TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (scope, item_key)
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def capture(self, scope, items, key):
+        """
+        Diff a complete snapshot of a scope against the previous one and log the changes.
+
+        Args:
+            scope (str): Snapshot scope, e.g. "yle-tv1/2024-06-01"
+            items (iterable): Items of the snapshot; records are encoded through to_dict()
+            key (callable): Returns an item's stable key, or None to leave it out
+
+        Returns:
+            dict: Number of events per operation
+        """
+        current = {}
+        for item in items:
+            item_key = key(item)
+            if item_key:
+                current[str(item_key)] = self._normalize(item)
+        return self._apply(scope, current, snapshot=True)
+
+    def capture_item(self, scope, item_key, item):
+        """
+        Log a single item if it is new or changed.
+
+        Args:
+            scope (str): Scope the item belongs to, e.g. "movies"
+            item_key (str): Stable key of the item
+            item: The item
+
+        Returns:
+            str: "insert", "update", or None if unchanged
+        """
+        counts = self._apply(scope, {str(item_key): self._normalize(item)}, snapshot=False)
+        return next((op for op, count in counts.items() if count), None)
+
+    def _normalize(self, item):
+        # Round-trip through JSON so records and nested records become plain data
+        data = serialization.loads(serialization.dumps(item, pretty=False))
+        return content_hash(data, ignore=self.ignore), data
+
+    def _apply(self, scope, current, snapshot):
+        now = time.time()
+        counts = {"insert": 0, "update": 0, "delete": 0}
+        events = []
+        with self._lock:
+            # Hold the write lock from reading the old digests until the new ones are stored
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = dict(self._conn.execute(
+                    "SELECT item_key, digest FROM items WHERE scope = ?", (scope,)
+                ).fetchall())
+                for item_key, (digest, data) in current.items():
+                    old = previous.get(item_key)
+                    if old == digest:
+                        continue
+                    op = "insert" if old is None else "update"
+                    counts[op] += 1
+                    events.append({"ts": now, "site": self.site, "scope": scope, "key": item_key,
+                                   "op": op, "digest": digest, "data": data})
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO items (scope, item_key, digest) VALUES (?, ?, ?)",
+                        (scope, item_key, digest),
+                    )
+                if snapshot:
+                    for item_key in previous.keys() - current.keys():
+                        counts["delete"] += 1
+                        events.append({"ts": now, "site": self.site, "scope": scope, "key": item_key,
+                                       "op": "delete", "digest": previous[item_key]})
+                        self._conn.execute(
+                            "DELETE FROM items WHERE scope = ? AND item_key = ?", (scope, item_key)
+                        )
+                if events:
+                    # Append before committing: a crash in between repeats events rather than losing them
+                    lines = b"".join(serialization.dumps(event, pretty=False) + b"\n" for event in events)
+                    with open(self.log_path, "ab") as f:
+                        f.write(lines)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return counts
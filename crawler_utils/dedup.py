@@ -0,0 +1,106 @@
+"""
+Request deduplication for crawlers whose channels share feeds.
+
+Several CTV channels resolve to the same schedule feed: some share a
+(hub, affiliate code) outright, such as CTV Regina and CTV Yorkton, and many
+regional ``ctv_hub`` affiliates carry the network schedule unchanged. The
+helpers here make sure each feed is fetched once:
+
+    collapse()          groups channels whose requests are identical, so the
+                        planner issues one request per distinct feed
+    ScheduleAliases     notices feeds whose responses hash identically in a
+                        probe window and, for the rest of the crawl, serves
+                        them from the feed they match
+
+The other channels in a group get a small reference to the fetched feed
+instead of another copy of every file.
+"""
+
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+FeedGroup = namedtuple("FeedGroup", ["key", "members"])
+
+
+def collapse(requests):
+    """
+    Group identical requests.
+
+    Args:
+        requests (iterable): (member, key) pairs, e.g. (channel name, (hub, code));
+            the key must be hashable and equal for requests that return the same data
+
+    Returns:
+        list: FeedGroups in first-seen order; members[0] is the member the data is saved under
+    """
+    groups = {}
+    for member, key in requests:
+        groups.setdefault(key, []).append(member)
+    return [FeedGroup(key, members) for key, members in groups.items()]
+
+
+def content_hash(data, ignore=()):
+    """
+    Hash a decoded JSON document independently of key order.
+
+    Args:
+        data: Decoded JSON
+        ignore (iterable): Keys dropped at every depth before hashing, e.g.
+            per-affiliate identifiers that differ between otherwise equal feeds
+
+    Returns:
+        str: Hex digest
+    """
+    ignore = frozenset(ignore)
+
+    def strip(value):
+        if isinstance(value, dict):
+            return {k: strip(v) for k, v in value.items() if k not in ignore}
+        if isinstance(value, list):
+            return [strip(v) for v in value]
+        return value
+
+    canonical = json.dumps(strip(data), sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class ScheduleAliases:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._aliases = {}
+
+    def observe(self, window, key, digest):
+        """
+        Record the hash of a feed's response in one window.
+
+        The first feed seen with a hash becomes the leader; any later feed with
+        the same hash in the same window is learned as its alias.
+
+        Args:
+            window (str): Request window, e.g. the schedule date
+            key: Feed key
+            digest (str): content_hash() of the response
+
+        Returns:
+            The key of the leader this feed duplicates, or None
+        """
+        with self._lock:
+            leader = self._seen.setdefault((window, digest), key)
+            if leader == key:
+                return None
+            self._aliases[key] = leader
+            return leader
+
+    def leader(self, key):
+        """Return the feed a key was found to duplicate, or None."""
+        with self._lock:
+            return self._aliases.get(key)
+
+    @property
+    def aliases(self):
+        """Learned {feed key: leader key} pairs."""
+        with self._lock:
+            return dict(self._aliases)
@@ -0,0 +1,228 @@
+"""
+Freshness-aware recrawl scheduling for dated schedule data.
+
+A schedule for a day long past hardly ever changes, while today's and
+tomorrow's are still being edited. Refetching every day of the crawl window
+on every run therefore spends most requests on data that is already known.
+``FreshnessScheduler`` gives every (site, channel, date) work unit its own
+revisit interval and lets a run fetch only the units that are due.
+
+The interval starts from the unit's distance to today: near-term dates are
+revisited every ``near_interval`` (6 hours by default), and the interval grows
+fourfold for every day further in the past, so yesterday is revisited daily
+and a week-old schedule only after ``max_interval``. It is then scaled by the
+unit's change rate, an exponential moving average of how often its content
+hash differed from the previous fetch: a unit that changed on every fetch is
+revisited twice as often, one that never changed half as often.
+
+State is kept in a SQLite file next to the other crawler caches, so the
+worker processes of a sharded crawl share it. Set ``CRAWLER_FULL_RECRAWL=1``
+to treat every unit as due for one run; fetches are still recorded.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date as date_type, datetime
+
+# Weight of the newest observation in the change-rate average
+CHANGE_RATE_ALPHA = 0.3
+# Change rate assumed for a unit fetched only once
+DEFAULT_CHANGE_RATE = 0.5
+
+
+def default_freshness_path(site):
+    """
+    Return the freshness database of a site inside the crawler cache directory.
+
+    Args:
+        site (str): Site name, e.g. "yle"
+
+    Returns:
+        str: Path of the SQLite file
+    """
+    cache_dir = os.getenv("CRAWLER_CACHE_DIR", ".crawler_cache")
+    return os.path.join(cache_dir, f"{site}_freshness.sqlite")
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date_type):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class FreshnessScheduler:
+    def __init__(self, path, near_interval=6 * 3600, min_interval=3600, max_interval=30 * 86400, force=None):
+        """
+        Args:
+            path (str): SQLite database file
+            near_interval (float): Revisit interval in seconds for today and nearby dates
+            min_interval (float): Shortest interval a unit can get
+            max_interval (float): Longest interval a unit can get
+            force (bool): Treat every unit as due; defaults to CRAWLER_FULL_RECRAWL
+        """
+        self.path = path
+        self.near_interval = near_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.force = os.getenv("CRAWLER_FULL_RECRAWL") == "1" if force is None else force
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS freshness (
+                unit_key TEXT PRIMARY KEY,
+                unit_date TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                digest TEXT,
+                change_rate REAL NOT NULL,
+                fetches INTEGER NOT NULL,
+                changes INTEGER NOT NULL
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def _state(self, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT fetched_at, digest, change_rate, fetches FROM freshness WHERE unit_key = ?", (key,)
+            ).fetchone()
+
+    def base_interval(self, date, now=None):
+        """
+        Return the revisit interval implied by a date's distance from today.
+
+        Args:
+            date (str|date): Schedule date (YYYY-MM-DD)
+            now (float): Current timestamp, for testing
+
+        Returns:
+            float: Interval in seconds before change-rate scaling
+        """
+        today = datetime.fromtimestamp(time.time() if now is None else now).date()
+        days_past = (today - _parse_date(date)).days
+        if days_past <= 0:
+            # Today and the future; dates more than a day ahead change less often
+            interval = self.near_interval if days_past >= -1 else 2 * self.near_interval
+        else:
+            interval = self.near_interval * 4 ** min(days_past, 16)
+        return min(interval, self.max_interval)
+
+    def interval(self, key, date, now=None):
+        """
+        Return the revisit interval of a unit.
+
+        Args:
+            key (str): Work unit key
+            date (str|date): Schedule date of the unit
+            now (float): Current timestamp, for testing
+
+        Returns:
+            float: Interval in seconds
+        """
+        state = self._state(key)
+        change_rate = state[2] if state else DEFAULT_CHANGE_RATE
+        # 1.0 at the default rate, halved for always-changing and doubled for static units
+        interval = self.base_interval(date, now) * 2 ** (1 - 2 * change_rate)
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    def is_due(self, key, date, now=None):
+        """
+        Check whether a unit should be fetched in this run.
+
+        Args:
+            key (str): Work unit key
+            date (str|date): Schedule date of the unit
+            now (float): Current timestamp, for testing
+
+        Returns:
+            bool: True for never-fetched units and units whose interval has passed
+        """
+        if self.force:
+            return True
+        state = self._state(key)
+        if state is None:
+            return True
+        now = time.time() if now is None else now
+        return now - state[0] >= self.interval(key, date, now)
+
+    def due(self, units, now=None):
+        """
+        Filter a plan down to the units that are due.
+
+        Args:
+            units (iterable): (key, date, ...) tuples
+            now (float): Current timestamp, for testing
+
+        Returns:
+            list: The due units, in their original order
+        """
+        return [unit for unit in units if self.is_due(unit[0], unit[1], now)]
+
+    def record(self, key, date, digest, now=None):
+        """
+        Record a fetch and update the unit's change rate.
+
+        Args:
+            key (str): Work unit key
+            date (str|date): Schedule date of the unit
+            digest (str): Content hash of the fetched data, e.g. dedup.content_hash()
+            now (float): Current timestamp, for testing
+
+        Returns:
+            bool: True if the content differs from the previous fetch (or is new)
+        """
+        now = time.time() if now is None else now
+        unit_date = _parse_date(date).isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._conn.execute(
+                    "SELECT digest, change_rate, fetches, changes FROM freshness WHERE unit_key = ?", (key,)
+                ).fetchone()
+                if state is None:
+                    changed = True
+                    self._conn.execute(
+                        "INSERT INTO freshness VALUES (?, ?, ?, ?, ?, 1, 0)",
+                        (key, unit_date, now, digest, DEFAULT_CHANGE_RATE),
+                    )
+                else:
+                    previous, change_rate, fetches, changes = state
+                    changed = digest != previous
+                    change_rate += CHANGE_RATE_ALPHA * (float(changed) - change_rate)
+                    self._conn.execute(
+                        "UPDATE freshness SET unit_date = ?, fetched_at = ?, digest = ?, change_rate = ?, "
+                        "fetches = ?, changes = ? WHERE unit_key = ?",
+                        (unit_date, now, digest, change_rate, fetches + 1, changes + changed, key),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return changed
+
+    def prune(self, before):
+        """
+        Forget units whose schedule date is older than a cutoff.
+
+        Args:
+            before (str|date): First date to keep
+
+        Returns:
+            int: Number of units removed
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM freshness WHERE unit_date < ?", (_parse_date(before).isoformat(),)
+            )
+        return cursor.rowcount
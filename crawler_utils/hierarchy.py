@@ -0,0 +1,140 @@
+"""
+Incrementally maintained group -> show -> episodes index.
+
+The full index is kept in a snapshot file (for YLE, ``yle_hierarchical.json``).
+Each crawled (group, partition) batch, e.g. one channel on one date, is
+appended to a delta log next to the snapshot instead of rewriting it, so a
+crawl only pays for the items it actually fetched. The log is folded back into
+the snapshot once it grows past a size threshold, so the snapshot file alone
+can lag behind the latest crawls; readers should use ``load()``, which merges
+the pending deltas in.
+"""
+
+import logging
+import os
+from collections import defaultdict
+
+from crawler_utils import serialization
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchyIndex:
+    def __init__(self, snapshot_path, partition_field="broadcast_date",
+                 title_field="title", max_delta_bytes=8 * 1024 * 1024):
+        """
+        Args:
+            snapshot_path (str): Path of the full hierarchical JSON file
+            partition_field (str): Episode field recording the partition it came from
+            title_field (str): Item field used to group episodes into shows
+            max_delta_bytes (int): Delta log size that triggers compaction on flush
+        """
+        self.snapshot_path = snapshot_path
+        root, _ = os.path.splitext(snapshot_path)
+        self.delta_path = f"{root}_deltas.jsonl"
+        self.partition_field = partition_field
+        self.title_field = title_field
+        self.max_delta_bytes = max_delta_bytes
+
+    def exists(self):
+        """Return True if the index has a snapshot or pending deltas on disk."""
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.delta_path)
+
+    def add(self, group, partition, items):
+        """
+        Record the items crawled for one (group, partition) batch.
+
+        A later batch for the same group and partition replaces this one when
+        the index is loaded, so re-crawling a date does not duplicate episodes.
+
+        Args:
+            group (str): Top-level key, e.g. the channel id
+            partition (str): Batch key, e.g. the broadcast date
+            items (list): Item dicts or records to index
+
+        Returns:
+            int: Number of items recorded
+        """
+        shows = defaultdict(list)
+        for item in items:
+            title = item.get(self.title_field) or "Unknown"
+            episode = item.to_dict() if hasattr(item, "to_dict") else dict(item)
+            episode[self.partition_field] = partition
+            shows[title].append(episode)
+
+        delta = {"group": group, "partition": partition, "shows": dict(shows)}
+        with open(self.delta_path, "ab") as f:
+            f.write(serialization.dumps(delta, pretty=False))
+            f.write(b"\n")
+        return len(items)
+
+    def load(self):
+        """
+        Build the full index from the snapshot plus any pending deltas.
+
+        Returns:
+            dict: {group: {show_title: [episodes]}}
+        """
+        index = {}
+        if os.path.exists(self.snapshot_path):
+            index = serialization.read_json(self.snapshot_path)
+
+        # Keep only the latest batch per (group, partition), then apply each group in one pass
+        groups = defaultdict(dict)
+        for delta in self._read_deltas():
+            batches = groups[delta["group"]]
+            batches.pop(delta["partition"], None)
+            batches[delta["partition"]] = delta["shows"]
+        for group, batches in groups.items():
+            self._apply(index.setdefault(group, {}), batches)
+        return index
+
+    def flush(self, force_compact=False):
+        """
+        Fold the delta log into the snapshot if it has grown large enough.
+
+        Args:
+            force_compact (bool): Compact regardless of the delta log size
+
+        Returns:
+            bool: True if the snapshot was rewritten
+        """
+        if not os.path.exists(self.delta_path):
+            return False
+        if not force_compact and os.path.getsize(self.delta_path) < self.max_delta_bytes:
+            return False
+
+        index = self.load()
+        tmp_path = f"{self.snapshot_path}.tmp"
+        serialization.write_json(tmp_path, index)
+        os.replace(tmp_path, self.snapshot_path)
+        os.remove(self.delta_path)
+        logger.info(f"Compacted hierarchy deltas into {self.snapshot_path}")
+        return True
+
+    def _read_deltas(self):
+        if not os.path.exists(self.delta_path):
+            return
+        with open(self.delta_path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield serialization.loads(line)
+                except serialization.DECODE_ERRORS:
+                    # A crash mid-append leaves at most one truncated line
+                    logger.warning(f"Skipping corrupt delta in {self.delta_path}")
+
+    def _apply(self, group_index, batches):
+        # Drop whatever the snapshot recorded for the re-crawled partitions
+        for title in list(group_index):
+            kept = [ep for ep in group_index[title] if ep.get(self.partition_field) not in batches]
+            if kept:
+                group_index[title] = kept
+            else:
+                del group_index[title]
+
+        for shows in batches.values():
+            for title, episodes in shows.items():
+                group_index.setdefault(title, []).extend(episodes)
@@ -0,0 +1,285 @@
+"""
+Shared HTTP client for the crawlers.
+
+``HttpClient`` wraps a ``requests.Session`` so connections are reused across
+calls, applies a default timeout, and records every call in a
+``crawler_utils.metrics.Metrics`` registry: latency, response bytes and
+status code per endpoint template. Parsing a response through ``json()``
+is accounted under the "parse" phase.
+
+Responses are requested compressed. The client advertises every encoding
+urllib3 can decode while the body streams in, preferring zstd and br
+(available when the optional ``zstandard`` and ``brotli`` packages are
+installed) over gzip and deflate. Both the bytes received on the wire and
+the decoded body size are recorded, so the saving is visible per endpoint.
+
+Concurrent identical GET requests are coalesced ("singleflight"): while one
+call for a URL is in flight, other threads asking for the same method, URL
+and query parameters wait for it and receive the same response instead of
+sending their own. Headers and cookies are not part of the key, so per-call
+values such as Hotstar's random ``x-request-id`` do not defeat it; headers
+that select a different response, such as a language, are named in
+``vary_headers`` and their values are added to the key. The
+parsed body is shared as well, since ``json()`` decodes a response only
+once; callers must treat it as read-only.
+
+GETs to endpoints with a long latency tail can be hedged: if no response
+has arrived once the endpoint's recent ``hedge_percentile`` latency has
+passed, a second identical request is sent and whichever finishes first is
+used. Hedging only starts once an endpoint has ``hedge_min_samples``
+recorded calls, and hedges are capped at ``hedge_budget`` of the hedgeable
+calls so a slow endpoint never sees much more than its normal load.
+
+Idempotent calls also go through a ``crawler_utils.retry.RetryPolicy``:
+failures are retried with decorrelated jitter within a retry budget, and
+an endpoint template that keeps failing is short-circuited with
+``CircuitOpenError`` until it recovers.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from urllib3.util.request import ACCEPT_ENCODING as _URLLIB3_ENCODINGS
+
+from crawler_utils.metrics import endpoint_template, get_metrics
+from crawler_utils.retry import RetryPolicy
+
+
+_UNPARSED = object()
+
+# Encodings urllib3 can decode here, best compression first
+_DECODABLE = {encoding.strip() for encoding in _URLLIB3_ENCODINGS.split(",")}
+ACCEPT_ENCODING = ", ".join(encoding for encoding in ("zstd", "br", "gzip", "deflate") if encoding in _DECODABLE)
+
+# Idempotent methods: concurrent duplicates may share one call and slow calls may be hedged
+COALESCED_METHODS = ("GET", "HEAD")
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class HttpClient:
+    def __init__(self, metrics=None, session=None, timeout=30, compress=True, coalesce=True, vary_headers=(),
+                 retry=True, hedge=False, hedge_percentile=95, hedge_budget=0.05, hedge_min_samples=20,
+                 hedge_workers=8):
+        """
+        Args:
+            metrics (Metrics): Registry to record into; defaults to the process-wide one
+            session (requests.Session): Session to use; a new one by default
+            timeout (float): Default request timeout in seconds
+            compress (bool): Ask for compressed responses (see ACCEPT_ENCODING)
+            coalesce (bool): Share one call between concurrent identical GET requests
+            vary_headers (iterable): Request headers whose values select a different
+                response, so calls differing in them are never coalesced
+            retry (RetryPolicy | bool): Policy for idempotent calls; True for the default
+                policy, False to send every call once
+            hedge (bool): Hedge slow GET requests by default; can be set per call
+            hedge_percentile (float): Latency percentile of the endpoint after which to hedge
+            hedge_budget (float): Maximum share of hedgeable calls that may send a hedge
+            hedge_min_samples (int): Calls an endpoint needs before its latency is trusted
+            hedge_workers (int): Threads running hedged calls
+        """
+        self.metrics = metrics or get_metrics()
+        self.session = session or requests.Session()
+        if compress:
+            self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        self.timeout = timeout
+        self.coalesce = coalesce
+        self.vary_headers = tuple(name.lower() for name in vary_headers)
+        if retry is True:
+            retry = RetryPolicy(metrics=self.metrics)
+        self.retry = retry or None
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_workers = hedge_workers
+        self._flights_lock = threading.Lock()
+        self._flights = {}
+        self._hedge_lock = threading.Lock()
+        self._hedge_pool = None
+        self._hedgeable = 0
+        self._hedges_sent = 0
+
+    def _singleflight(self, key, call):
+        """
+        Run call() unless a call with the same key is already running, then share its outcome.
+
+        Returns:
+            tuple: (result, True if this thread made the call)
+        """
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, False
+
+        try:
+            flight.result = call()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, True
+
+    def _flight_key(self, method, url, kwargs):
+        params = kwargs.get("params")
+        if isinstance(params, dict):
+            params = sorted((str(k), str(v)) for k, v in params.items())
+        elif params is not None:
+            params = str(params)
+        headers = {str(k).lower(): str(v) for k, v in (kwargs.get("headers") or {}).items()}
+        varying = tuple(headers.get(name) for name in self.vary_headers)
+        return method, url, str(params), str(kwargs.get("data")), str(kwargs.get("json")), varying
+
+    def request(self, method, url, endpoint=None, coalesce=None, hedge=None, **kwargs):
+        """
+        Send a request and record it.
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            endpoint (str): Endpoint template to record under; derived from the URL by default
+            coalesce (bool): Override the client's coalescing setting for this call
+            hedge (bool): Override the client's hedging setting for this call
+            **kwargs: Passed on to requests.Session.request
+
+        Returns:
+            requests.Response: The response, possibly shared with concurrent identical calls
+
+        Raises:
+            crawler_utils.retry.CircuitOpenError: When the endpoint's circuit is open
+            requests.exceptions.RequestException: When no response arrives
+        """
+        endpoint = endpoint or endpoint_template(url)
+        kwargs.setdefault("timeout", self.timeout)
+        idempotent = method.upper() in COALESCED_METHODS
+        coalesce = idempotent and (self.coalesce if coalesce is None else coalesce)
+        hedge = idempotent and (self.hedge if hedge is None else hedge)
+        send_once = self._send_hedged if hedge else self._send
+
+        def send():
+            if idempotent and self.retry is not None:
+                return self.retry.call(endpoint, lambda: send_once(method, url, endpoint, kwargs), method=method)
+            return send_once(method, url, endpoint, kwargs)
+
+        if not coalesce:
+            return send()
+
+        response, sent = self._singleflight(self._flight_key(method.upper(), url, kwargs), send)
+        if not sent:
+            self.metrics.record_coalesced(endpoint, method=method)
+        return response
+
+    def _send(self, method, url, endpoint, kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.metrics.record_request(endpoint, None, time.perf_counter() - start, method=method)
+            raise
+        nbytes = len(response.content)
+        self.metrics.record_request(
+            endpoint, response.status_code, time.perf_counter() - start, nbytes, method=method,
+            wire_bytes=self._wire_bytes(response, nbytes),
+        )
+        return response
+
+    def _wire_bytes(self, response, decoded):
+        """Return how many body bytes came over the wire before decoding."""
+        try:
+            # urllib3 counts the raw bytes it read, before decompression
+            wire = response.raw.tell()
+        except (AttributeError, TypeError, ValueError):
+            wire = None
+        if wire:
+            return wire
+        try:
+            return int(response.headers.get("Content-Length", ""))
+        except ValueError:
+            return decoded
+
+    def _hedge_delay(self, endpoint, method):
+        """Return how long to wait before hedging a call, or None if it must not be hedged."""
+        delay = self.metrics.latency_percentile(
+            endpoint, self.hedge_percentile, method=method, min_count=self.hedge_min_samples
+        )
+        if delay is None:
+            return None
+        with self._hedge_lock:
+            # Only calls that could be hedged count towards the budget
+            self._hedgeable += 1
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="http-hedge")
+        return delay
+
+    def _take_hedge(self):
+        with self._hedge_lock:
+            if self._hedges_sent + 1 > self.hedge_budget * self._hedgeable:
+                return False
+            self._hedges_sent += 1
+            return True
+
+    def _send_hedged(self, method, url, endpoint, kwargs):
+        delay = self._hedge_delay(endpoint, method)
+        if delay is None:
+            return self._send(method, url, endpoint, kwargs)
+
+        primary = self._hedge_pool.submit(self._send, method, url, endpoint, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_hedge():
+            return primary.result()
+
+        # The loser keeps running in the pool; its call is still recorded in the metrics
+        backup = self._hedge_pool.submit(self._send, method, url, endpoint, kwargs)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.metrics.record_hedge(endpoint, won=future is backup, method=method)
+                    return future.result()
+                error = future.exception()
+        self.metrics.record_hedge(endpoint, won=False, method=method)
+        raise error
+
+    def get(self, url, **kwargs):
+        """Send a GET request; see request()."""
+        return self.request("GET", url, **kwargs)
+
+    def json(self, response):
+        """Decode a response body as JSON, timed under the "parse" phase; each response is decoded once."""
+        parsed = response.__dict__.get("_crawler_json", _UNPARSED)
+        if parsed is not _UNPARSED:
+            return parsed
+
+        def parse():
+            with self.metrics.timer("parse"):
+                data = response.json()
+            response._crawler_json = data
+            return data
+
+        # Threads sharing a coalesced response wait for one decode
+        data, _ = self._singleflight(("parse", id(response)), parse)
+        return data
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=True)
+        self.session.close()
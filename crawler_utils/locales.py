@@ -0,0 +1,143 @@
+"""
+Multi-locale crawling with shared language-independent data.
+
+Crawling N locales as N separate runs fetches and stores N full copies of
+every item, although only a few fields (titles, descriptions, genre names)
+are actually translated; IDs, times, durations and images are the same in
+every locale. ``fan_out`` fetches the locale variants of an item
+concurrently and ``split_locales`` stores them as
+
+    {"shared": <fields equal in every locale>,
+     "localized": {"fi": {"/title": "Uutiset", ...}, "sv": {"/title": "Nyheter", ...}}}
+
+Translated fields are found by comparing the variants rather than from a
+per-site list, so new fields need no configuration. They are addressed with
+JSON Pointers (RFC 6901) into the shared document; lists of scalars are
+compared as a whole, and lists of objects with the same length in every
+locale are compared element by element. ``merge_locale`` rebuilds the full
+item for one locale.
+"""
+
+import copy
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from crawler_utils import serialization
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def fan_out(locales, fetch, max_workers=None):
+    """
+    Fetch every locale variant concurrently.
+
+    A failed locale is logged and left out, except the first one, whose
+    error is raised because the others are stored relative to it.
+
+    Args:
+        locales (list): Locale codes; the first one is the primary locale
+        fetch (callable): Called with a locale code, returns that locale's data
+        max_workers (int): Concurrent fetches; one per locale by default
+
+    Returns:
+        dict: {locale: data} in the order of locales, without failed locales
+    """
+    if len(locales) == 1:
+        return {locales[0]: fetch(locales[0])}
+    with ThreadPoolExecutor(max_workers=max_workers or len(locales), thread_name_prefix="locale") as pool:
+        futures = {locale: pool.submit(fetch, locale) for locale in locales}
+    variants = {}
+    for index, (locale, future) in enumerate(futures.items()):
+        try:
+            variants[locale] = future.result()
+        except Exception as e:
+            if index == 0:
+                raise
+            logger.warning(f"Skipping locale {locale}: {e}")
+    return variants
+
+
+def _pointer(path):
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in path)
+
+
+def _parse_pointer(pointer):
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer.split("/")[1:]]
+
+
+def _split(values, path, localized):
+    """Return the shared part of values (one per locale), collecting differing leaves into localized."""
+    first = values[0]
+    if all(isinstance(value, dict) for value in values):
+        shared = {}
+        for key in dict.fromkeys(key for value in values for key in value):
+            children = [value.get(key, _MISSING) for value in values]
+            if any(child is _MISSING for child in children):
+                _localize(children, path + [key], localized)
+                continue
+            child = _split(children, path + [key], localized)
+            if child is not _MISSING:
+                shared[key] = child
+        return shared
+    if (all(isinstance(value, list) for value in values) and len({len(value) for value in values}) == 1
+            and first and all(isinstance(item, dict) for value in values for item in value)):
+        return [_split([value[i] for value in values], path + [i], localized) for i in range(len(first))]
+    if all(value == first for value in values):
+        return first
+    _localize(values, path, localized)
+    return _MISSING
+
+
+def _localize(values, path, localized):
+    pointer = _pointer(path)
+    for locale_values, value in zip(localized.values(), values):
+        if value is not _MISSING:
+            locale_values[pointer] = value
+
+
+def split_locales(variants):
+    """
+    Split locale variants of one item into shared and per-locale fields.
+
+    Args:
+        variants (dict): {locale: item}; records are encoded through to_dict()
+
+    Returns:
+        dict: {"shared": ..., "localized": {locale: {json pointer: value}}}
+    """
+    # Round-trip through JSON so records and nested records become plain data
+    values = [serialization.loads(serialization.dumps(item, pretty=False)) for item in variants.values()]
+    localized = {locale: {} for locale in variants}
+    shared = _split(values, [], localized)
+    if shared is _MISSING:
+        shared = None
+    return {"shared": shared, "localized": localized}
+
+
+def merge_locale(split, locale):
+    """
+    Rebuild the full item of one locale from split_locales() output.
+
+    Args:
+        split (dict): Output of split_locales()
+        locale (str): Locale code
+
+    Returns:
+        The item as fetched in that locale
+    """
+    localized = split["localized"][locale]
+    if "" in localized:
+        return copy.deepcopy(localized[""])
+    item = copy.deepcopy(split["shared"])
+    for pointer, value in localized.items():
+        *parents, last = _parse_pointer(pointer)
+        target = item
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        if isinstance(target, list):
+            target[int(last)] = value
+        else:
+            target[last] = value
+    return item
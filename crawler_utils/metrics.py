@@ -0,0 +1,352 @@
+"""
+Request and phase metrics for the crawlers.
+
+Every HTTP call made through ``crawler_utils.http_client.HttpClient`` is
+recorded per endpoint template (e.g. ``areena.api.yle.fi/v1/ui/schedules/{channel}/{date}.json``):
+a latency histogram, decoded and on-the-wire response bytes, status codes, retries, calls
+coalesced into another in-flight call, and hedged calls. Crawlers also
+record where the rest of the wall time goes with ``timer("parse")``,
+``sleep()`` and the ``OutputWriter`` write hook.
+
+A run's metrics are exported as JSON for local inspection and in the
+Prometheus text format for a textfile collector or push gateway. Reports go
+to ``crawler_metrics/`` unless ``CRAWLER_METRICS_DIR`` says otherwise.
+"""
+
+import bisect
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from crawler_utils import serialization
+
+# Upper bounds in seconds, matching the Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_DATE_SEGMENT = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[\w-]{6,}$|^\d+$")
+
+
+def endpoint_template(url):
+    """
+    Collapse the variable parts of a URL into a template.
+
+    Dates become {date} and numeric or ID-like path segments become {id};
+    the query string is dropped.
+
+    Args:
+        url (str): Request URL
+
+    Returns:
+        str: host + templated path
+    """
+    parsed = urlparse(url)
+    segments = []
+    for segment in parsed.path.split("/"):
+        stem, dot, extension = segment.partition(".")
+        if _DATE_SEGMENT.match(stem):
+            stem = "{date}"
+        elif _ID_SEGMENT.match(stem):
+            stem = "{id}"
+        segments.append(stem + dot + extension)
+    return parsed.netloc + "/".join(segments)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024):
+        """
+        Args:
+            buckets (tuple): Sorted bucket upper bounds
+            window (int): Number of recent observations kept for percentiles
+        """
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self._recent.append(value)
+
+    def percentile(self, q):
+        """
+        Return the q-th percentile of the recent observations.
+
+        Args:
+            q (float): Percentile between 0 and 100
+
+        Returns:
+            float: The percentile, or None without observations
+        """
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.bucket_counts)),
+        }
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets (tuple): Latency histogram bucket upper bounds in seconds
+        """
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._bytes = {}
+        self._wire_bytes = {}
+        self._statuses = {}
+        self._retries = {}
+        self._coalesced = {}
+        self._hedges = {}
+        self._phases = {}
+
+    def record_request(self, endpoint, status, seconds, nbytes=0, method="GET", wire_bytes=None):
+        """
+        Record one HTTP call.
+
+        Args:
+            endpoint (str): Endpoint template
+            status (int): HTTP status code, or None when no response arrived
+            seconds (float): Latency in seconds
+            nbytes (int): Response body size after decoding
+            method (str): HTTP method
+            wire_bytes (int): Body bytes received before decompression; defaults to nbytes
+        """
+        key = (method, endpoint)
+        status = "error" if status is None else str(status)
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            self._bytes[key] = self._bytes.get(key, 0) + nbytes
+            self._wire_bytes[key] = self._wire_bytes.get(key, 0) + (nbytes if wire_bytes is None else wire_bytes)
+            self._statuses[key + (status,)] = self._statuses.get(key + (status,), 0) + 1
+
+    def record_retry(self, endpoint, method="GET"):
+        """Count a retried call to an endpoint."""
+        key = (method, endpoint)
+        with self._lock:
+            self._retries[key] = self._retries.get(key, 0) + 1
+
+    def record_coalesced(self, endpoint, method="GET"):
+        """Count a call that shared the response of an identical in-flight call."""
+        key = (method, endpoint)
+        with self._lock:
+            self._coalesced[key] = self._coalesced.get(key, 0) + 1
+
+    def record_hedge(self, endpoint, won, method="GET"):
+        """
+        Count a hedged call.
+
+        Args:
+            endpoint (str): Endpoint template
+            won (bool): True if the hedge answered before the original call
+            method (str): HTTP method
+        """
+        key = (method, endpoint)
+        with self._lock:
+            sent, wins = self._hedges.get(key, (0, 0))
+            self._hedges[key] = (sent + 1, wins + bool(won))
+
+    def add_time(self, phase, seconds):
+        """
+        Add wall time spent in a phase such as "sleep", "parse" or "write".
+
+        Args:
+            phase (str): Phase name
+            seconds (float): Time spent
+        """
+        with self._lock:
+            total, count = self._phases.get(phase, (0.0, 0))
+            self._phases[phase] = (total + seconds, count + 1)
+
+    @contextmanager
+    def timer(self, phase):
+        """Context manager recording the time spent in its block under phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def sleep(self, seconds):
+        """time.sleep() that is accounted under the "sleep" phase."""
+        time.sleep(seconds)
+        self.add_time("sleep", seconds)
+
+    def latency(self, endpoint, method="GET"):
+        """
+        Return the latency histogram of an endpoint.
+
+        Args:
+            endpoint (str): Endpoint template
+            method (str): HTTP method
+
+        Returns:
+            Histogram: The histogram, or None if the endpoint was never called
+        """
+        with self._lock:
+            return self._latency.get((method, endpoint))
+
+    def latency_percentile(self, endpoint, q, method="GET", min_count=0):
+        """
+        Return a latency percentile of an endpoint's recent calls.
+
+        Args:
+            endpoint (str): Endpoint template
+            q (float): Percentile between 0 and 100
+            method (str): HTTP method
+            min_count (int): Calls required before a percentile is returned
+
+        Returns:
+            float: Latency in seconds, or None with too few calls
+        """
+        with self._lock:
+            histogram = self._latency.get((method, endpoint))
+            if histogram is None or histogram.count < max(1, min_count):
+                return None
+            return histogram.percentile(q)
+
+    def to_dict(self):
+        """Return a JSON-serializable snapshot of every metric."""
+        with self._lock:
+            endpoints = {}
+            for (method, endpoint), histogram in self._latency.items():
+                endpoints[f"{method} {endpoint}"] = {
+                    "latency_seconds": histogram.to_dict(),
+                    "bytes": self._bytes.get((method, endpoint), 0),
+                    "wire_bytes": self._wire_bytes.get((method, endpoint), 0),
+                    "retries": self._retries.get((method, endpoint), 0),
+                    "coalesced": self._coalesced.get((method, endpoint), 0),
+                    "hedged": self._hedges.get((method, endpoint), (0, 0))[0],
+                    "hedge_wins": self._hedges.get((method, endpoint), (0, 0))[1],
+                    "statuses": {
+                        status: count for (m, e, status), count in self._statuses.items()
+                        if (m, e) == (method, endpoint)
+                    },
+                }
+            phases = {
+                phase: {"seconds": round(total, 6), "count": count}
+                for phase, (total, count) in self._phases.items()
+            }
+        return {
+            "started_at": self.started_at,
+            "wall_seconds": round(time.time() - self.started_at, 3),
+            "endpoints": endpoints,
+            "phases": phases,
+        }
+
+    def to_prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append("# HELP crawler_http_request_duration_seconds HTTP request latency per endpoint template")
+            lines.append("# TYPE crawler_http_request_duration_seconds histogram")
+            for (method, endpoint), histogram in sorted(self._latency.items()):
+                labels = _labels(method=method, endpoint=endpoint)
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.bucket_counts):
+                    cumulative += count
+                    bucket_labels = _labels(method=method, endpoint=endpoint, le=str(bound))
+                    lines.append(f"crawler_http_request_duration_seconds_bucket{bucket_labels} {cumulative}")
+                lines.append(f"crawler_http_request_duration_seconds_sum{labels} {histogram.sum}")
+                lines.append(f"crawler_http_request_duration_seconds_count{labels} {histogram.count}")
+
+            lines.append("# HELP crawler_http_response_bytes_total Decoded response body bytes per endpoint template")
+            lines.append("# TYPE crawler_http_response_bytes_total counter")
+            for (method, endpoint), nbytes in sorted(self._bytes.items()):
+                lines.append(f"crawler_http_response_bytes_total{_labels(method=method, endpoint=endpoint)} {nbytes}")
+
+            lines.append("# HELP crawler_http_wire_bytes_total Response body bytes received before decompression")
+            lines.append("# TYPE crawler_http_wire_bytes_total counter")
+            for (method, endpoint), nbytes in sorted(self._wire_bytes.items()):
+                lines.append(f"crawler_http_wire_bytes_total{_labels(method=method, endpoint=endpoint)} {nbytes}")
+
+            lines.append("# HELP crawler_http_responses_total Responses per endpoint template and status")
+            lines.append("# TYPE crawler_http_responses_total counter")
+            for (method, endpoint, status), count in sorted(self._statuses.items()):
+                labels = _labels(method=method, endpoint=endpoint, status=status)
+                lines.append(f"crawler_http_responses_total{labels} {count}")
+
+            lines.append("# HELP crawler_http_retries_total Retried requests per endpoint template")
+            lines.append("# TYPE crawler_http_retries_total counter")
+            for (method, endpoint), count in sorted(self._retries.items()):
+                lines.append(f"crawler_http_retries_total{_labels(method=method, endpoint=endpoint)} {count}")
+
+            lines.append("# HELP crawler_http_coalesced_total Calls served by an identical in-flight request")
+            lines.append("# TYPE crawler_http_coalesced_total counter")
+            for (method, endpoint), count in sorted(self._coalesced.items()):
+                lines.append(f"crawler_http_coalesced_total{_labels(method=method, endpoint=endpoint)} {count}")
+
+            lines.append("# HELP crawler_http_hedged_total Hedge requests sent per endpoint template")
+            lines.append("# TYPE crawler_http_hedged_total counter")
+            for (method, endpoint), (sent, _) in sorted(self._hedges.items()):
+                lines.append(f"crawler_http_hedged_total{_labels(method=method, endpoint=endpoint)} {sent}")
+
+            lines.append("# HELP crawler_http_hedge_wins_total Hedge requests that answered first")
+            lines.append("# TYPE crawler_http_hedge_wins_total counter")
+            for (method, endpoint), (_, wins) in sorted(self._hedges.items()):
+                lines.append(f"crawler_http_hedge_wins_total{_labels(method=method, endpoint=endpoint)} {wins}")
+
+            lines.append("# HELP crawler_phase_seconds_total Wall time spent per crawl phase")
+            lines.append("# TYPE crawler_phase_seconds_total counter")
+            for phase, (total, _) in sorted(self._phases.items()):
+                lines.append(f"crawler_phase_seconds_total{_labels(phase=phase)} {total}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, name, directory=None):
+        """
+        Write the JSON and Prometheus reports of this run.
+
+        Args:
+            name (str): Report name, e.g. "hotstar"
+            directory (str): Output directory; defaults to CRAWLER_METRICS_DIR or "crawler_metrics"
+
+        Returns:
+            tuple: (json_path, prometheus_path)
+        """
+        directory = directory or os.getenv("CRAWLER_METRICS_DIR", "crawler_metrics")
+        os.makedirs(directory, exist_ok=True)
+        json_path = os.path.join(directory, f"{name}.json")
+        prom_path = os.path.join(directory, f"{name}.prom")
+        serialization.write_json(json_path, self.to_dict())
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        return json_path, prom_path
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+_default_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry."""
+    return _default_metrics
@@ -0,0 +1,155 @@
+"""
+Write-behind output layer for the file-per-item crawlers.
+
+Crawlers hand parsed items to an ``OutputWriter`` instead of serializing and
+writing them inline, so the next request goes out while earlier items are
+still being persisted. A small pool of writer threads drains bounded queues
+in batches, groups the writes by directory and creates each directory at
+most once per run, which removes the repeated ``os.path.exists``/
+``os.makedirs`` calls that dominate on network filesystems. Because the
+queues are bounded, a slow disk applies backpressure to the fetch loop
+instead of growing memory.
+
+Each directory is always routed to the same writer thread, so writes to one
+path keep their submission order.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from crawler_utils import serialization
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class OutputWriter:
+    def __init__(self, max_pending=1000, batch_size=200, workers=2, metrics=None):
+        """
+        Args:
+            max_pending (int): Maximum queued items before write_json blocks
+            batch_size (int): Maximum items drained and grouped per batch
+            workers (int): Number of writer threads
+            metrics (Metrics): Registry that records time spent writing, if given
+        """
+        self.batch_size = batch_size
+        self.metrics = metrics
+        per_worker = max(1, max_pending // workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(workers)]
+        self._known_dirs = set()
+        self._dirs_lock = threading.Lock()
+        self._error = None
+        self._closed = False
+        self._threads = []
+        for i, work_queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run, args=(work_queue,), name=f"output-writer-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def ensure_dir(self, directory):
+        """
+        Create a directory unless this writer has already seen it.
+
+        Args:
+            directory (str): Directory path
+        """
+        if not directory:
+            return
+        with self._dirs_lock:
+            if directory in self._known_dirs:
+                return
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+
+    def write_json(self, path, data, pretty=None):
+        """
+        Queue a JSON document to be written to path.
+
+        The data is serialized on the writer thread, so callers must not
+        mutate it after handing it over.
+
+        Args:
+            path (str): Destination file path
+            data: JSON-serializable object
+            pretty (bool): Indent the output; defaults to the serialization setting
+        """
+        if self._closed:
+            raise RuntimeError("OutputWriter is closed")
+        self._raise_pending_error()
+        directory = os.path.dirname(path)
+        work_queue = self._queues[hash(directory) % len(self._queues)]
+        work_queue.put((path, data, pretty))
+
+    def flush(self):
+        """Block until every queued write has been persisted."""
+        for work_queue in self._queues:
+            work_queue.join()
+        self._raise_pending_error()
+
+    def close(self):
+        """Flush outstanding writes and stop the writer threads."""
+        if self._closed:
+            return
+        self._closed = True
+        for work_queue in self._queues:
+            work_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._raise_pending_error()
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self, work_queue):
+        while True:
+            batch = [work_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(work_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(entry is _STOP for entry in batch)
+            self._write_batch([entry for entry in batch if entry is not _STOP])
+            for _ in batch:
+                work_queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        by_dir = defaultdict(list)
+        for path, data, pretty in batch:
+            by_dir[os.path.dirname(path)].append((path, data, pretty))
+
+        for directory, writes in by_dir.items():
+            try:
+                self.ensure_dir(directory)
+            except OSError as e:
+                logger.error(f"Error creating directory {directory}: {e}")
+                self._error = self._error or e
+                continue
+
+            for path, data, pretty in writes:
+                start = time.perf_counter()
+                try:
+                    serialization.write_json(path, data, pretty=pretty)
+                except (OSError, TypeError, ValueError) as e:
+                    logger.error(f"Error writing {path}: {e}")
+                    self._error = self._error or e
+                if self.metrics is not None:
+                    self.metrics.add_time("write", time.perf_counter() - start)
@@ -0,0 +1,92 @@
+"""
+Compact typed records for crawled schedule items.
+
+The crawlers used to build a fresh dict per episode, movie or airing. These
+classes use ``__slots__`` instead, which drops the per-instance ``__dict__``
+and cuts memory when a week of schedules is held at once.
+
+Only the fields a crawler actually sets are stored and serialized, so
+``to_dict()`` produces the same keys as the dicts these records replace.
+``serialization.dumps`` encodes records directly.
+"""
+
+
+class Record:
+    __slots__ = ()
+    _fields = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            if name not in self._fields:
+                raise TypeError(f"{type(self).__name__} has no field '{name}'")
+            setattr(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a dict, ignoring keys that are not fields.
+
+        Args:
+            data (dict): Source mapping
+
+        Returns:
+            Record: New record instance
+        """
+        return cls(**{key: value for key, value in data.items() if key in cls._fields})
+
+    def to_dict(self):
+        """
+        Return the fields that have been set, in declaration order.
+
+        Returns:
+            dict: Field values
+        """
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def get(self, name, default=None):
+        """Return a field value, or default when it has not been set."""
+        return getattr(self, name, default)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.to_dict().items())
+        return f"{type(self).__name__}({fields})"
+
+
+class Channel(Record):
+    """A broadcast channel or affiliate."""
+    __slots__ = ("id", "name", "code", "hub")
+
+
+class Airing(Record):
+    """A single scheduled broadcast on a channel."""
+    __slots__ = (
+        "id", "title", "description", "channel", "start_time", "end_time",
+        "broadcast_date", "uri", "raw_data",
+    )
+
+
+class Episode(Record):
+    """An episode of a show."""
+    __slots__ = (
+        "id", "title", "description", "season", "episode", "episode_number",
+        "air_time", "duration", "release_year", "images", "cast", "directors",
+        "streaming_url",
+    )
+
+
+class Movie(Record):
+    """A movie, either scheduled on a channel or available on demand."""
+    __slots__ = (
+        "id", "title", "description", "air_time", "duration", "release_year",
+        "genre", "genres", "language", "images", "cast", "directors",
+        "streaming_url",
+    )
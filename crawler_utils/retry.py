@@ -0,0 +1,223 @@
+"""
+Retry policy and per-endpoint circuit breakers for crawler HTTP calls.
+
+The generated crawlers each retried in their own way: a fixed ``2 ** n``
+sleep without jitter, no retry at all, or giving up on the first exception.
+``RetryPolicy`` replaces them with one engine:
+
+    decorrelated jitter   the delay before retry n is drawn uniformly from
+                          [base_delay, 3 * previous delay], capped at
+                          max_delay, so clients that failed together do not
+                          retry together; a Retry-After header is honoured
+    retry budget          retries may not exceed ``budget_min`` plus
+                          ``budget_ratio`` of all calls, so a widespread
+                          outage does not multiply the load
+    circuit breaker       after ``failure_threshold`` consecutive failures an
+                          endpoint template is open for ``reset_timeout``
+                          seconds and calls fail fast with CircuitOpenError;
+                          then a single trial call decides whether it closes
+
+Connection errors, timeouts and the statuses in ``retry_statuses`` count as
+failures; any other response, including 4xx, proves the endpoint is up.
+Other exceptions raised by a call are counted as failures and re-raised
+without a retry.
+Every retry is counted with ``Metrics.record_retry`` and its sleep is
+accounted under the "sleep" phase.
+"""
+
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from crawler_utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds the circuit stays open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        """"closed", "open" or "half-open"."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def allow(self):
+        """
+        Check whether a call may go out now.
+
+        Returns:
+            bool: False while open, and in half-open state while the trial call runs
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """
+        Count a failed call.
+
+        Returns:
+            bool: True if this failure opened (or reopened) the circuit
+        """
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+                return True
+            return False
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0, budget_ratio=0.1, budget_min=10,
+                 failure_threshold=5, reset_timeout=30.0, retry_statuses=RETRY_STATUSES, metrics=None):
+        """
+        Args:
+            max_attempts (int): Calls per request including the first one
+            base_delay (float): Smallest delay before a retry in seconds
+            max_delay (float): Largest delay before a retry in seconds
+            budget_ratio (float): Retries allowed per call made, on top of budget_min
+            budget_min (int): Retries always allowed, so early failures can be retried
+            failure_threshold (int): Consecutive failures that open an endpoint's circuit
+            reset_timeout (float): Seconds an open circuit fails fast
+            retry_statuses (tuple): Response statuses that are retried and count as failures
+            metrics (Metrics): Registry for retries and sleep time; defaults to the process-wide one
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_statuses = frozenset(retry_statuses)
+        self.metrics = metrics or get_metrics()
+        self._lock = threading.Lock()
+        self._breakers = {}
+        self._calls = 0
+        self._retries = 0
+
+    def breaker(self, endpoint):
+        """Return the circuit breaker of an endpoint template."""
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def backoff(self, previous):
+        """
+        Return the next delay using decorrelated jitter.
+
+        Args:
+            previous (float): The previous delay, or base_delay before the first retry
+
+        Returns:
+            float: Seconds to wait
+        """
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous) * 3))
+
+    def _take_retry(self):
+        with self._lock:
+            if self._retries + 1 > self.budget_min + self.budget_ratio * self._calls:
+                return False
+            self._retries += 1
+            return True
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After") if response is not None else None
+        try:
+            return min(self.max_delay, max(0.0, float(value)))
+        except (TypeError, ValueError):
+            return None
+
+    def call(self, endpoint, send, method="GET"):
+        """
+        Call send() under the endpoint's circuit breaker, retrying failures.
+
+        Args:
+            endpoint (str): Endpoint template the breaker and metrics are keyed by
+            send (callable): Zero-argument function returning a requests.Response
+            method (str): HTTP method, for the metrics
+
+        Returns:
+            requests.Response: The first non-failing response, or the last failing
+                one once attempts or the retry budget are exhausted
+
+        Raises:
+            CircuitOpenError: When the endpoint's circuit is open
+            requests.exceptions.RequestException: When the last attempt raised
+        """
+        breaker = self.breaker(endpoint)
+        with self._lock:
+            self._calls += 1
+        delay = self.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {endpoint}, failing fast")
+
+            error = response = None
+            try:
+                response = send()
+            except requests.exceptions.RequestException as e:
+                error = e
+            except BaseException:
+                # Count anything else as a failure too, so a half-open trial never stays claimed
+                breaker.record_failure()
+                raise
+            if error is None and response.status_code not in self.retry_statuses:
+                breaker.record_success()
+                return response
+
+            if breaker.record_failure():
+                logger.warning(f"Opened circuit for {endpoint} for {self.reset_timeout}s")
+                attempt = self.max_attempts
+            if attempt >= self.max_attempts or not self._take_retry():
+                if error is not None:
+                    raise error
+                return response
+
+            retry_after = self._retry_after(response)
+            delay = self.backoff(delay) if retry_after is None else retry_after
+            reason = error if error is not None else f"status {response.status_code}"
+            logger.info(f"Retrying {endpoint} in {delay:.1f}s after {reason} (attempt {attempt}/{self.max_attempts})")
+            self.metrics.record_retry(endpoint, method=method)
+            self.metrics.sleep(delay)
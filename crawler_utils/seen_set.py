@@ -0,0 +1,235 @@
+"""
+Persistent seen-set for content discovery.
+
+Hotstar lists the same title in many trays, so a full-catalog discovery pass
+sees each content ID many times. ``SeenSet`` answers "have I seen this ID in
+this run?" as items arrive, so a duplicate is skipped before it is queued,
+and "was this ID crawled within the last N days?" across runs.
+
+The exact set lives in a SQLite file next to the other crawler caches. Two
+Bloom filters sit in front of it so most lookups never touch the disk: one
+holds the keys added in this run, the other the keys ever marked crawled.
+A Bloom filter can report false positives but never false negatives, so a
+negative answer is final and only a positive one is confirmed against
+SQLite. The filters take a fixed number of bits sized from the expected
+number of keys, so memory stays bounded however large the catalog grows;
+beyond that capacity they only lose speed, not accuracy.
+
+Keys added in this run are buffered and inserted ``batch_size`` at a time
+in one transaction, so discovery does not pay for a disk write per item;
+``add_many`` checks a whole page of items at once. ``close()`` writes what
+is still buffered.
+
+The in-run check is per process; workers of a sharded crawl share the
+cross-run state through the SQLite file.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+def default_seen_path(name):
+    """
+    Return the seen-set database of a crawler inside the crawler cache directory.
+
+    Args:
+        name (str): Seen-set name, e.g. "hotstar"
+
+    Returns:
+        str: Path of the SQLite file
+    """
+    cache_dir = os.getenv("CRAWLER_CACHE_DIR", ".crawler_cache")
+    return os.path.join(cache_dir, f"{name}_seen.sqlite")
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Args:
+            capacity (int): Expected number of keys
+            error_rate (float): False-positive rate at that capacity
+        """
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class SeenSet:
+    def __init__(self, path, capacity=1_000_000, error_rate=0.001, batch_size=500):
+        """
+        Args:
+            path (str): SQLite database file
+            capacity (int): Expected number of distinct keys, used to size the Bloom filters
+            error_rate (float): Bloom filter false-positive rate at that capacity
+            batch_size (int): Keys added in this run that are buffered before they are written
+        """
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # Keys added in this run and not written yet, with the time they were seen
+        self._pending = {}
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen (
+                item_key TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL,
+                crawled_at REAL
+            )
+            """
+        )
+        self._run = BloomFilter(capacity, error_rate)
+        self._crawled = BloomFilter(capacity, error_rate)
+        for (key,) in self._conn.execute("SELECT item_key FROM seen WHERE crawled_at IS NOT NULL"):
+            self._crawled.add(key)
+
+    def close(self):
+        """Write the buffered keys and close the database."""
+        self.flush()
+        self._conn.close()
+
+    def add(self, key):
+        """
+        Record that a key was seen and report whether this run saw it before.
+
+        Args:
+            key (str): Content ID or other stable key
+
+        Returns:
+            bool: True if the key is new in this run
+        """
+        return self.add_many([key])[0]
+
+    def add_many(self, keys):
+        """
+        Record several keys and report which of them this run had not seen before.
+
+        A key repeated within keys is only new the first time.
+
+        Args:
+            keys (iterable): Content IDs or other stable keys
+
+        Returns:
+            list: One bool per key, True if the key is new in this run
+        """
+        now = time.time()
+        new = []
+        with self._lock:
+            for key in map(str, keys):
+                if key in self._run and self._seen_this_run(key):
+                    new.append(False)
+                    continue
+                self._run.add(key)
+                self._pending[key] = now
+                new.append(True)
+            if len(self._pending) >= self.batch_size:
+                self._write_pending()
+        return new
+
+    def flush(self):
+        """Write the buffered keys to the database."""
+        with self._lock:
+            self._write_pending()
+
+    def _seen_this_run(self, key):
+        # Confirms a Bloom filter hit; the caller holds the lock
+        if key in self._pending:
+            return True
+        row = self._conn.execute("SELECT seen_at FROM seen WHERE item_key = ?", (key,)).fetchone()
+        return row is not None and row[0] >= self.started_at
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO seen (item_key, seen_at) VALUES (?, ?) "
+                "ON CONFLICT(item_key) DO UPDATE SET seen_at = excluded.seen_at",
+                self._pending.items(),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._pending.clear()
+
+    def mark_crawled(self, key):
+        """
+        Record that a key's content was fetched and saved.
+
+        Args:
+            key (str): Content ID or other stable key
+        """
+        key = str(key)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO seen (item_key, seen_at, crawled_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(item_key) DO UPDATE SET crawled_at = excluded.crawled_at",
+                (key, now, now),
+            )
+            self._crawled.add(key)
+
+    def crawled_within(self, key, max_age):
+        """
+        Check whether a key was crawled recently, possibly by an earlier run.
+
+        Args:
+            key (str): Content ID or other stable key
+            max_age (float): Age in seconds
+
+        Returns:
+            bool: True if mark_crawled() was called for the key within max_age
+        """
+        key = str(key)
+        with self._lock:
+            if key not in self._crawled:
+                return False
+            row = self._conn.execute("SELECT crawled_at FROM seen WHERE item_key = ?", (key,)).fetchone()
+        return row is not None and row[0] is not None and time.time() - row[0] <= max_age
+
+    def prune(self, max_age):
+        """
+        Forget keys neither seen nor crawled within max_age seconds.
+
+        The Bloom filters keep their bits until the next run, which only
+        costs an extra lookup for the removed keys.
+
+        Args:
+            max_age (float): Age in seconds
+
+        Returns:
+            int: Number of keys removed
+        """
+        cutoff = time.time() - max_age
+        with self._lock:
+            self._write_pending()
+            cursor = self._conn.execute(
+                "DELETE FROM seen WHERE seen_at < ? AND (crawled_at IS NULL OR crawled_at < ?)", (cutoff, cutoff)
+            )
+        return cursor.rowcount
@@ -0,0 +1,137 @@
+"""
+JSON serialization for crawler output.
+
+Uses orjson or msgspec when one of them is installed and falls back to the
+standard library otherwise. Output is compact by default; pretty-printed
+(2-space indented) output is meant for debugging and is enabled per call or
+for the whole process with ``CRAWLER_JSON_PRETTY=1``.
+
+All backends emit UTF-8 without escaping non-ASCII characters, matching the
+``ensure_ascii=False`` the crawlers used before. Objects with a ``to_dict()``
+method, such as the records in ``crawler_utils.records``, are encoded through
+it.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+PRETTY = os.getenv("CRAWLER_JSON_PRETTY", "").lower() in ("1", "true", "yes")
+
+# Exceptions raised by loads() on malformed input, whichever backend is active
+DECODE_ERRORS = (ValueError,) if msgspec is None else (ValueError, msgspec.DecodeError)
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+
+def _default(obj):
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_dict()
+
+
+def set_pretty(enabled):
+    """
+    Switch the process-wide default between compact and pretty output.
+
+    Args:
+        enabled (bool): True to indent output by default
+    """
+    global PRETTY
+    PRETTY = bool(enabled)
+
+
+def dumps(data, pretty=None):
+    """
+    Serialize data to JSON.
+
+    Args:
+        data: JSON-serializable object
+        pretty (bool): Indent the output; defaults to the process-wide setting
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    if pretty is None:
+        pretty = PRETTY
+
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(data, default=_default, option=option)
+        except TypeError:
+            # orjson rejects a few things json accepts, e.g. integers over 64 bits
+            pass
+    elif msgspec is not None:
+        try:
+            encoded = msgspec.json.encode(data, enc_hook=_default)
+            return msgspec.json.format(encoded, indent=2) if pretty else encoded
+        except (TypeError, msgspec.EncodeError):
+            pass
+
+    if pretty:
+        text = json.dumps(data, default=_default, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+def loads(data):
+    """
+    Parse JSON from bytes or str.
+
+    Args:
+        data (bytes | str): JSON document
+
+    Returns:
+        The decoded object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def write_json(path, data, pretty=None):
+    """
+    Serialize data and write it to path.
+
+    Args:
+        path (str): Destination file path
+        data: JSON-serializable object
+        pretty (bool): Indent the output; defaults to the process-wide setting
+    """
+    with open(path, "wb") as f:
+        f.write(dumps(data, pretty=pretty))
+
+
+def read_json(path):
+    """
+    Read and parse a JSON file.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        The decoded object
+    """
+    with open(path, "rb") as f:
+        return loads(f.read())
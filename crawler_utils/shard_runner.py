@@ -0,0 +1,182 @@
+"""
+Command-line runner for sharded crawls.
+
+Run one shard per host, each with as many worker processes as it has cores:
+
+    python -m crawler_utils.shard_runner ctv --shard-index 0 --shard-count 2 --processes 4
+    python -m crawler_utils.shard_runner ctv --shard-index 1 --shard-count 2 --processes 4
+
+Then collect the per-host queue files in one place and merge them:
+
+    python -m crawler_utils.shard_runner --merge ctv-shard-0.sqlite ctv-shard-1.sqlite --output report.json
+
+With a shared Redis broker all hosts can lease from a single shard instead,
+and more workers can join a running crawl at any time:
+
+    python -m crawler_utils.shard_runner yle --broker redis://queue-host:6379/0 --processes 4
+    python -m crawler_utils.shard_runner yle --broker redis://queue-host:6379/0 --processes 4 --join
+"""
+
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+
+from crawler_utils import serialization
+from crawler_utils.metrics import get_metrics
+from crawler_utils.sharding import HashRing, merge_results, plan, run_worker, shard_names
+from crawler_utils.work_queue import DEFAULT_VISIBILITY_TIMEOUT, open_queue
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Crawlers that implement work_units() and crawl_unit()
+SITES = {
+    "ctv": ("langgraph_approach/ctv_api_crawler.py", "CTVCrawler"),
+    "yle": ("langgraph_approach/yle_api_crawler.py", "YleAreenaCrawler"),
+    "hotstar": ("flow-generation/generated_codes/hotstar_crawler.py", "HotstarCrawler"),
+}
+
+# Brokers that only live inside this process; their workers run as threads
+IN_PROCESS_BROKERS = ("memory://", "local://")
+
+
+def load_crawler(site):
+    """
+    Import a crawler module by path and instantiate its crawler class.
+
+    Args:
+        site (str): Key of SITES
+
+    Returns:
+        The crawler instance
+    """
+    relative_path, class_name = SITES[site]
+    spec = importlib.util.spec_from_file_location(f"{site}_crawler", os.path.join(REPO_ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, class_name)()
+
+
+def default_queue_path(site, shard):
+    """Return the queue file of a shard inside the crawler cache directory."""
+    cache_dir = os.getenv("CRAWLER_CACHE_DIR", ".crawler_cache")
+    return os.path.join(cache_dir, "shards", f"{site}-{shard}.sqlite")
+
+
+def _crawl_worker(site, queue, worker, timeout):
+    crawler = load_crawler(site)
+    try:
+        completed = run_worker(queue, crawler, worker, timeout=timeout)
+        logger.info(f"{worker} completed {completed} units")
+    finally:
+        # Make sure every queued file reaches the disk and the state databases are closed
+        crawler.close()
+
+
+def _worker_main(site, broker, namespace, worker, timeout):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    queue = open_queue(broker, namespace=namespace)
+    try:
+        _crawl_worker(site, queue, worker, timeout)
+    finally:
+        queue.close()
+        get_metrics().export(f"{site}-{worker}")
+
+
+def run_shard(site, shard_index, shard_count, processes, broker=None,
+              timeout=DEFAULT_VISIBILITY_TIMEOUT, plan_units=True):
+    """
+    Plan this host's shard and crawl it with several workers.
+
+    Args:
+        site (str): Key of SITES
+        shard_index (int): Index of this host's shard
+        shard_count (int): Total number of shards (hosts)
+        processes (int): Workers to start
+        broker (str): Work queue URL (see work_queue.open_queue); defaults to
+            a SQLite file in the cache directory
+        timeout (float): Visibility timeout of each lease in seconds
+        plan_units (bool): False to only join the workers of an already planned queue
+
+    Returns:
+        dict: Merged results of this shard
+    """
+    shards = shard_names(shard_count)
+    shard = shards[shard_index]
+    broker = broker or default_queue_path(site, shard)
+    namespace = f"{site}-{shard}"
+    queue = open_queue(broker, namespace=namespace)
+
+    try:
+        if plan_units:
+            planner = load_crawler(site)
+            try:
+                plan(queue, planner.work_units(), HashRing(shards), shard)
+            finally:
+                planner.close()
+
+        if broker in IN_PROCESS_BROKERS:
+            # An in-process queue cannot be shared with child processes
+            workers = [
+                threading.Thread(target=_crawl_worker, args=(site, queue, f"{shard}-worker-{i}", timeout))
+                for i in range(processes)
+            ]
+        else:
+            # Spawn so every worker builds its own crawler, session and writer threads
+            context = multiprocessing.get_context("spawn")
+            workers = [
+                context.Process(target=_worker_main, args=(site, broker, namespace, f"{shard}-worker-{i}", timeout))
+                for i in range(processes)
+            ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if broker in IN_PROCESS_BROKERS:
+            get_metrics().export(f"{site}-{shard}")
+
+        return merge_results([queue])
+    finally:
+        queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded crawl runner")
+    parser.add_argument("site", nargs="?", choices=sorted(SITES), help="Crawler to run")
+    parser.add_argument("--shard-index", type=int, default=0, help="Shard crawled by this host")
+    parser.add_argument("--shard-count", type=int, default=1, help="Total number of shards (hosts)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--broker", help="Work queue URL: a SQLite file, sqlite://, redis://, memory:// or local://")
+    parser.add_argument("--visibility-timeout", type=float, default=DEFAULT_VISIBILITY_TIMEOUT,
+                        help="Seconds before an unacknowledged unit is handed to another worker")
+    parser.add_argument("--join", action="store_true", help="Only add workers to an already planned queue")
+    parser.add_argument("--merge", nargs="+", metavar="QUEUE", help="Merge the results of these queue files")
+    parser.add_argument("--output", help="Write the merged results to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.merge:
+        merged = merge_results(args.merge)
+    elif args.site:
+        if not 0 <= args.shard_index < args.shard_count:
+            parser.error("--shard-index must be between 0 and --shard-count - 1")
+        merged = run_shard(args.site, args.shard_index, args.shard_count, args.processes, args.broker,
+                           timeout=args.visibility_timeout, plan_units=not args.join)
+    else:
+        parser.error("either a site or --merge is required")
+
+    logger.info(f"Work unit status counts: {merged['counts']}")
+    if args.output:
+        serialization.write_json(args.output, merged)
+        logger.info(f"Merged results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
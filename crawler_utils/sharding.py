@@ -0,0 +1,155 @@
+"""
+Crawl sharding across processes and hosts.
+
+A crawl is split into work units: one CTV channel, one YLE (channel, date)
+pair, one Hotstar show or movie. Every unit has a stable string key, and a
+consistent-hash ring maps that key to a shard (normally one shard per host).
+Every host plans the same unit list but only enqueues the units its shard
+owns, so no unit is fetched twice even though the hosts never talk to each
+other. Adding or removing a host only moves the units on the affected arc of
+the ring.
+
+Within a host, worker processes lease units from a work queue (see
+``crawler_utils.work_queue``), so two processes never take the same unit and
+a crashed worker's units are retried once their lease expires. Each unit's
+JSON-serializable result is stored back in the queue, and ``merge_results``
+combines the queues of all hosts at the end. With a shared Redis broker the
+hosts can instead lease from one queue and workers can join at any time.
+
+Crawlers take part by providing two methods:
+
+    work_units() -> list of (key, payload) pairs
+    crawl_unit(payload) -> JSON-serializable result
+"""
+
+import bisect
+import hashlib
+import logging
+import time
+
+from crawler_utils.work_queue import DEFAULT_VISIBILITY_TIMEOUT, SQLiteWorkQueue
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=100):
+        """
+        Args:
+            nodes (list): Shard names, e.g. ["shard-0", "shard-1"]
+            replicas (int): Virtual nodes per shard; more gives a smoother spread
+        """
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        self._ring = sorted(
+            (_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._ring]
+
+    def node_for(self, key):
+        """
+        Return the shard that owns a work unit key.
+
+        Args:
+            key (str): Work unit key
+
+        Returns:
+            str: Shard name
+        """
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def shard_names(shard_count):
+    """Return the canonical shard names for a given number of shards."""
+    return [f"shard-{i}" for i in range(shard_count)]
+
+
+def plan(queue, units, ring, shard):
+    """
+    Enqueue the units owned by one shard.
+
+    Args:
+        queue (WorkQueue): Queue of this shard
+        units (list): (key, payload) pairs, identical on every host
+        ring (HashRing): Ring over all shards
+        shard (str): Shard planned by this host
+
+    Returns:
+        int: Number of newly enqueued units
+    """
+    added = 0
+    for key, payload in units:
+        if ring.node_for(key) == shard and queue.put(key, payload):
+            added += 1
+    logger.info(f"Planned {added} new units for {shard}")
+    return added
+
+
+def run_worker(queue, crawler, worker, timeout=DEFAULT_VISIBILITY_TIMEOUT, poll_interval=5):
+    """
+    Lease and crawl units until every unit in the queue is done or failed.
+
+    A unit whose crawl raises is released for another attempt after a
+    backoff that grows with its attempt count. While units are only waiting
+    out a retry delay or leased by other workers, this worker polls so it
+    can pick up retries and the units of workers that crashed.
+
+    Args:
+        queue (WorkQueue): Queue to pull from
+        crawler: Object providing crawl_unit(payload)
+        worker (str): Worker identifier
+        timeout (float): Visibility timeout of each lease in seconds
+        poll_interval (float): Seconds between polls while nothing is visible
+
+    Returns:
+        int: Number of units completed by this worker
+    """
+    completed = 0
+    while True:
+        lease = queue.lease(worker, timeout=timeout)
+        if lease is None:
+            counts = queue.counts()
+            if not counts.get("pending") and not counts.get("running"):
+                return completed
+            time.sleep(poll_interval)
+            continue
+        try:
+            result = crawler.crawl_unit(lease.payload)
+        except Exception as e:
+            logger.error(f"{worker} failed on {lease.key} (attempt {lease.attempts}): {e}")
+            queue.nack(lease, e, delay=min(60, 2 ** lease.attempts))
+            continue
+        if queue.ack(lease, result):
+            completed += 1
+        else:
+            logger.warning(f"{worker} lost the lease on {lease.key} before finishing it")
+
+
+def merge_results(queues):
+    """
+    Combine the results stored in several shard queues.
+
+    Args:
+        queues (list): Work queues or SQLite queue file paths, typically one per host
+
+    Returns:
+        dict: {"results": {key: result}, "counts": {status: n}}
+    """
+    merged = {"results": {}, "counts": {}}
+    for queue in queues:
+        opened = isinstance(queue, str)
+        if opened:
+            queue = SQLiteWorkQueue(queue)
+        try:
+            merged["results"].update(queue.results())
+            for status, count in queue.counts().items():
+                merged["counts"][status] = merged["counts"].get(status, 0) + count
+        finally:
+            if opened:
+                queue.close()
+    return merged
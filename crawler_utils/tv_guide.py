@@ -0,0 +1,90 @@
+"""
+Crawl planning from the YLE Areena TV guide page.
+
+The YLE crawlers used to guess which dates to fetch (the past week, the
+next few days, -3..+3), and dates outside the guide's window came back as
+empty schedule pages. The guide's Next.js data page
+(``_next/data/{build_id}/fi/tv/opas.json``) already lists the dates the
+guide can navigate to and the channels whose schedules it links to, so one
+request is enough to plan only (channel, date) pairs that exist.
+
+The page layout is not documented, so ``TvGuide.from_next_data`` does not
+depend on it: it scans every string in the page for
+
+    ?t=YYYY-MM-DD / /tv/opas?t=...                 navigable guide dates
+    .../schedules/{channel}/{YYYY-MM-DD}.json      schedule links
+    tv.guide.{YYYY-MM-DD}.tv_opas.{channel}...     schedule referers
+"""
+
+import re
+
+_DATE_LINK = re.compile(r"[?&]t=(\d{4}-\d{2}-\d{2})\b")
+_SCHEDULE_LINK = re.compile(r"schedules/([a-z0-9][\w-]*)/(\d{4}-\d{2}-\d{2})\.json")
+_SCHEDULE_REFERER = re.compile(r"tv\.guide\.(\d{4}-\d{2}-\d{2})\.tv_opas\.([a-z0-9][\w-]*?)\.")
+
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield str(key)
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+class TvGuide:
+    def __init__(self, dates, channels, schedules=()):
+        """
+        Args:
+            dates (iterable): Dates (YYYY-MM-DD) the guide offers
+            channels (iterable): Channel ids that have schedules, in guide order
+            schedules (iterable): (channel, date) pairs the page links to directly
+        """
+        self.schedules = set(schedules)
+        self.dates = sorted(set(dates) | {date for _, date in self.schedules})
+        self.channels = list(dict.fromkeys(list(channels) + [channel for channel, _ in sorted(self.schedules)]))
+
+    @classmethod
+    def from_next_data(cls, data):
+        """
+        Build the guide from a decoded opas.json Next.js data page.
+
+        Args:
+            data (dict): Decoded page
+
+        Returns:
+            TvGuide: The guide; empty dates or channels mean nothing was recognised
+        """
+        dates = []
+        channels = []
+        schedules = []
+        for text in _strings(data):
+            dates.extend(_DATE_LINK.findall(text))
+            for channel, date in _SCHEDULE_LINK.findall(text):
+                schedules.append((channel, date))
+            for date, channel in _SCHEDULE_REFERER.findall(text):
+                # Referers spell channel ids with underscores (tv_opas.yle_tv1)
+                channels.append(channel.replace("_", "-"))
+                dates.append(date)
+        return cls(dates, channels, schedules)
+
+    def plan(self, start=None, end=None):
+        """
+        Return the (channel, date) pairs to crawl, ordered by date.
+
+        Args:
+            start (str): First date to include (YYYY-MM-DD), or None for no bound
+            end (str): Last date to include, or None for no bound
+
+        Returns:
+            list: (channel, date) pairs
+        """
+        return [
+            (channel, date)
+            for date in self.dates
+            if (start is None or date >= start) and (end is None or date <= end)
+            for channel in self.channels
+        ]
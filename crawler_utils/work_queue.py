@@ -0,0 +1,552 @@
+"""
+Pluggable work queues for the crawl frontier.
+
+All backends share one interface, so crawler workers do not care where the
+frontier lives:
+
+    put(key, payload)               enqueue a unit unless the key is known
+    lease(worker, timeout)          take a visible unit for `timeout` seconds
+    ack(lease, result)              mark a leased unit done
+    nack(lease, error, delay)       release a unit for retry after `delay`
+    counts() / results()            status counts and results of done units
+
+A leased unit is invisible to other workers until its visibility timeout
+runs out. If a worker crashes, the lease simply expires and the unit is
+handed to the next worker, so nothing is lost. A unit that has been leased
+``max_attempts`` times without being acked is marked failed.
+
+Backends:
+
+    InMemoryWorkQueue   threads of one process
+    SQLiteWorkQueue     processes of one host sharing a database file
+    RedisWorkQueue      any number of hosts sharing a Redis-compatible broker
+
+``RedisWorkQueue`` claims, acks, releases and requeues a lease in one
+WATCH/MULTI transaction each, so two workers can never both ack or requeue
+the same lease, and a worker that dies mid-claim never strands a unit
+outside both the ready and the leased set.
+``LocalBroker`` implements the handful of Redis commands it uses, including
+``transaction``, so the Redis backend runs without a server in tests and on
+a single machine. ``open_queue`` builds a queue from a URL.
+"""
+
+import abc
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from crawler_utils import serialization
+
+Lease = namedtuple("Lease", ["key", "payload", "attempts", "lease_id"])
+
+DEFAULT_VISIBILITY_TIMEOUT = 15 * 60
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def _new_lease_id():
+    return uuid.uuid4().hex
+
+
+class WorkQueue(abc.ABC):
+    """Interface shared by the work queue backends."""
+
+    @abc.abstractmethod
+    def put(self, key, payload):
+        """
+        Enqueue a work unit unless its key is already known.
+
+        Args:
+            key (str): Stable work unit key
+            payload: JSON-serializable unit description
+
+        Returns:
+            bool: True if the unit was newly added
+        """
+
+    @abc.abstractmethod
+    def lease(self, worker, timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        """
+        Take the next visible unit and hide it from other workers.
+
+        Args:
+            worker (str): Identifier of the leasing worker
+            timeout (float): Seconds until the unit becomes visible again unless acked
+
+        Returns:
+            Lease: The leased unit, or None when nothing is visible
+        """
+
+    @abc.abstractmethod
+    def ack(self, lease, result=None):
+        """
+        Mark a leased unit done and store its result.
+
+        Args:
+            lease (Lease): Lease returned by lease()
+            result: JSON-serializable result
+
+        Returns:
+            bool: False if the lease was lost, e.g. it expired and was re-leased
+        """
+
+    @abc.abstractmethod
+    def nack(self, lease, error=None, delay=0):
+        """
+        Release a leased unit for another attempt, or fail it when out of attempts.
+
+        Args:
+            lease (Lease): Lease returned by lease()
+            error: Error to record
+            delay (float): Seconds before the unit becomes visible again
+
+        Returns:
+            bool: False if the lease was lost
+        """
+
+    @abc.abstractmethod
+    def counts(self):
+        """Return the number of units per status."""
+
+    @abc.abstractmethod
+    def results(self):
+        """Return {key: result} for every completed unit."""
+
+    def close(self):
+        """Release the backend's resources."""
+
+
+class InMemoryWorkQueue(WorkQueue):
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            max_attempts (int): Leases allowed per unit before it is marked failed
+        """
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._units = {}
+
+    def put(self, key, payload):
+        with self._lock:
+            if key in self._units:
+                return False
+            self._units[key] = {
+                "payload": payload, "status": "pending", "visible_at": 0.0,
+                "attempts": 0, "lease_id": None, "worker": None, "result": None, "error": None,
+            }
+            return True
+
+    def lease(self, worker, timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        now = time.time()
+        with self._lock:
+            for key, unit in self._units.items():
+                if unit["status"] not in ("pending", "running") or unit["visible_at"] > now:
+                    continue
+                if unit["attempts"] >= self.max_attempts:
+                    unit["status"] = "failed"
+                    unit["error"] = unit["error"] or "lease expired"
+                    continue
+                unit.update(status="running", visible_at=now + timeout, worker=worker,
+                            lease_id=_new_lease_id(), attempts=unit["attempts"] + 1)
+                return Lease(key, unit["payload"], unit["attempts"], unit["lease_id"])
+        return None
+
+    def ack(self, lease, result=None):
+        with self._lock:
+            unit = self._units.get(lease.key)
+            if unit is None or unit["lease_id"] != lease.lease_id:
+                return False
+            unit.update(status="done", result=result, error=None, lease_id=None)
+            return True
+
+    def nack(self, lease, error=None, delay=0):
+        with self._lock:
+            unit = self._units.get(lease.key)
+            if unit is None or unit["lease_id"] != lease.lease_id:
+                return False
+            status = "failed" if unit["attempts"] >= self.max_attempts else "pending"
+            unit.update(status=status, error=None if error is None else str(error),
+                        visible_at=time.time() + delay, lease_id=None)
+            return True
+
+    def counts(self):
+        counts = {}
+        with self._lock:
+            for unit in self._units.values():
+                counts[unit["status"]] = counts.get(unit["status"], 0) + 1
+        return counts
+
+    def results(self):
+        with self._lock:
+            return {key: unit["result"] for key, unit in self._units.items() if unit["status"] == "done"}
+
+
+class SQLiteWorkQueue(WorkQueue):
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            path (str): SQLite database file shared by the worker processes
+            max_attempts (int): Leases allowed per unit before it is marked failed
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS work_units (
+                unit_key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                visible_at REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_id TEXT,
+                worker TEXT,
+                result TEXT,
+                error TEXT
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def put(self, key, payload):
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO work_units (unit_key, payload) VALUES (?, ?)",
+            (key, serialization.dumps(payload).decode("utf-8")),
+        )
+        return cursor.rowcount == 1
+
+    def lease(self, worker, timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # can never select the same row
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = self._conn.execute(
+                    "SELECT unit_key, payload, attempts FROM work_units "
+                    "WHERE status IN ('pending', 'running') AND visible_at <= ? "
+                    "ORDER BY visible_at, rowid LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                key, payload, attempts = row
+                if attempts >= self.max_attempts:
+                    self._conn.execute(
+                        "UPDATE work_units SET status = 'failed', error = COALESCE(error, 'lease expired') "
+                        "WHERE unit_key = ?",
+                        (key,),
+                    )
+                    continue
+                lease_id = _new_lease_id()
+                self._conn.execute(
+                    "UPDATE work_units SET status = 'running', visible_at = ?, attempts = ?, "
+                    "lease_id = ?, worker = ? WHERE unit_key = ?",
+                    (now + timeout, attempts + 1, lease_id, worker, key),
+                )
+                self._conn.execute("COMMIT")
+                return Lease(key, serialization.loads(payload), attempts + 1, lease_id)
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def ack(self, lease, result=None):
+        cursor = self._conn.execute(
+            "UPDATE work_units SET status = 'done', result = ?, error = NULL, lease_id = NULL "
+            "WHERE unit_key = ? AND lease_id = ?",
+            (serialization.dumps(result).decode("utf-8"), lease.key, lease.lease_id),
+        )
+        return cursor.rowcount == 1
+
+    def nack(self, lease, error=None, delay=0):
+        cursor = self._conn.execute(
+            "UPDATE work_units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = ?, visible_at = ?, lease_id = NULL WHERE unit_key = ? AND lease_id = ?",
+            (self.max_attempts, None if error is None else str(error), time.time() + delay,
+             lease.key, lease.lease_id),
+        )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM work_units GROUP BY status").fetchall()
+        return dict(rows)
+
+    def results(self):
+        rows = self._conn.execute(
+            "SELECT unit_key, result FROM work_units WHERE status = 'done'"
+        ).fetchall()
+        return {key: serialization.loads(result) for key, result in rows}
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class RedisWorkQueue(WorkQueue):
+    def __init__(self, client, namespace="crawl", max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            client: redis.Redis-compatible client, or a LocalBroker
+            namespace (str): Prefix of every key this queue uses
+            max_attempts (int): Leases allowed per unit before it is marked failed
+        """
+        self.client = client
+        self.max_attempts = max_attempts
+        self._payloads = f"{namespace}:payload"
+        self._ready = f"{namespace}:ready"
+        self._leased = f"{namespace}:leased"
+        self._state_prefix = f"{namespace}:state:"
+
+    def put(self, key, payload):
+        if not self.client.hsetnx(self._payloads, key, serialization.dumps(payload)):
+            return False
+        self.client.hset(self._state_prefix + key, mapping={"status": "pending", "attempts": 0})
+        self.client.zadd(self._ready, {key: 0})
+        return True
+
+    def lease(self, worker, timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        now = time.time()
+        self._requeue_expired(now)
+        lease_id = _new_lease_id()
+
+        def claim(pipe):
+            # Moves the first visible unit from the ready set to the leased set in one
+            # transaction, so a crash can never leave it in neither; re-run if the
+            # ready set changes before it commits
+            for key in map(_text, pipe.zrangebyscore(self._ready, 0, now, start=0, num=1)):
+                state = self._state_prefix + key
+                attempts = int(_text(pipe.hget(state, "attempts")) or 0) + 1
+                pipe.multi()
+                pipe.zrem(self._ready, key)
+                pipe.hincrby(state, "attempts", 1)
+                if attempts > self.max_attempts:
+                    pipe.hset(state, "status", "failed")
+                    return key, None
+                pipe.hset(state, mapping={"status": "running", "lease_id": lease_id, "worker": worker})
+                pipe.zadd(self._leased, {key: now + timeout})
+                return key, attempts
+            return None
+
+        while True:
+            claimed = self.client.transaction(claim, self._ready, value_from_callable=True)
+            if claimed is None:
+                return None
+            key, attempts = claimed
+            if attempts is not None:
+                payload = serialization.loads(self.client.hget(self._payloads, key))
+                return Lease(key, payload, attempts, lease_id)
+
+    def ack(self, lease, result=None):
+        state = self._state_prefix + lease.key
+        encoded = serialization.dumps(result)
+
+        def complete(pipe):
+            if _text(pipe.hget(state, "lease_id")) != lease.lease_id:
+                return False
+            pipe.multi()
+            pipe.zrem(self._leased, lease.key)
+            pipe.hset(state, mapping={"status": "done", "lease_id": "", "result": encoded})
+            return True
+
+        # Re-run if the unit's state changes between the check and the write
+        return self.client.transaction(complete, state, value_from_callable=True)
+
+    def nack(self, lease, error=None, delay=0):
+        state = self._state_prefix + lease.key
+        failed = lease.attempts >= self.max_attempts
+
+        def release(pipe):
+            if _text(pipe.hget(state, "lease_id")) != lease.lease_id:
+                return False
+            if pipe.zscore(self._leased, lease.key) is None:
+                return False
+            pipe.multi()
+            pipe.zrem(self._leased, lease.key)
+            pipe.hset(state, mapping={"status": "failed" if failed else "pending", "lease_id": "",
+                                      "error": "" if error is None else str(error)})
+            if not failed:
+                pipe.zadd(self._ready, {lease.key: time.time() + delay})
+            return True
+
+        return self.client.transaction(release, state, value_from_callable=True)
+
+    def counts(self):
+        counts = {}
+        for key in self.client.hkeys(self._payloads):
+            status = _text(self.client.hget(self._state_prefix + _text(key), "status"))
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def results(self):
+        results = {}
+        for key in map(_text, self.client.hkeys(self._payloads)):
+            state = {_text(k): v for k, v in self.client.hgetall(self._state_prefix + key).items()}
+            if _text(state.get("status")) == "done":
+                results[key] = serialization.loads(state["result"])
+        return results
+
+    def _requeue_expired(self, now):
+        for key in map(_text, self.client.zrangebyscore(self._leased, 0, now)):
+            state = self._state_prefix + key
+
+            def requeue(pipe, key=key, state=state):
+                # Skip leases acked, released or renewed since the range was read
+                if not _text(pipe.hget(state, "lease_id")):
+                    return
+                score = pipe.zscore(self._leased, key)
+                if score is None or score > now:
+                    return
+                pipe.multi()
+                pipe.zrem(self._leased, key)
+                pipe.hset(state, mapping={"status": "pending", "lease_id": ""})
+                pipe.zadd(self._ready, {key: now})
+
+            self.client.transaction(requeue, state)
+
+
+class LocalBroker:
+    """
+    In-process stand-in for the Redis commands RedisWorkQueue uses.
+
+    Values are returned as str, like redis.Redis(decode_responses=True).
+    """
+
+    def __init__(self):
+        # Reentrant, so a transaction can hold it across the commands it runs
+        self._lock = threading.RLock()
+        self._hashes = {}
+        self._zsets = {}
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        """
+        Run func(pipe) like redis.Redis.transaction.
+
+        The broker lock is held throughout, so nothing can change the watched
+        keys and the transaction never has to be retried.
+        """
+        with self._lock:
+            pipe = _LocalPipeline(self)
+            value = func(pipe)
+            results = pipe.execute()
+        return value if value_from_callable else results
+
+    def hsetnx(self, name, key, value):
+        with self._lock:
+            fields = self._hashes.setdefault(name, {})
+            if key in fields:
+                return 0
+            fields[key] = _text(value)
+            return 1
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self._lock:
+            fields = self._hashes.setdefault(name, {})
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = sum(1 for field in items if field not in fields)
+            fields.update({field: _text(v) if isinstance(v, bytes) else str(v) for field, v in items.items()})
+            return added
+
+    def hget(self, name, key):
+        with self._lock:
+            return self._hashes.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hkeys(self, name):
+        with self._lock:
+            return list(self._hashes.get(name, {}))
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            fields = self._hashes.setdefault(name, {})
+            value = int(fields.get(key, 0)) + amount
+            fields[key] = str(value)
+            return value
+
+    def zadd(self, name, mapping):
+        with self._lock:
+            zset = self._zsets.setdefault(name, {})
+            added = sum(1 for member in mapping if member not in zset)
+            zset.update({member: float(score) for member, score in mapping.items()})
+            return added
+
+    def zrem(self, name, *members):
+        with self._lock:
+            zset = self._zsets.get(name, {})
+            return sum(1 for member in members if zset.pop(member, None) is not None)
+
+    def zscore(self, name, member):
+        with self._lock:
+            return self._zsets.get(name, {}).get(member)
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        with self._lock:
+            members = sorted(
+                (score, member) for member, score in self._zsets.get(name, {}).items()
+                if min <= score <= max
+            )
+        members = [member for _, member in members]
+        if start is not None and num is not None:
+            members = members[start:start + num]
+        return members
+
+
+class _LocalPipeline:
+    """Pipeline handed to LocalBroker.transaction callables: commands run at once until multi(), then queue."""
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._queued = None
+
+    def multi(self):
+        self._queued = []
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self._queued or ()]
+
+    def __getattr__(self, name):
+        command = getattr(self._broker, name)
+        if self._queued is None:
+            return command
+        return lambda *args, **kwargs: self._queued.append((command, args, kwargs))
+
+
+def open_queue(url, namespace="crawl", max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Build a work queue from a URL.
+
+    Args:
+        url (str): "memory://", "local://" (Redis backend on a LocalBroker),
+            "sqlite:///path/to/queue.sqlite", a plain file path, or "redis://host:port/db"
+        namespace (str): Key prefix for the Redis backends
+        max_attempts (int): Leases allowed per unit before it is marked failed
+
+    Returns:
+        A work queue
+    """
+    if url == "memory://":
+        return InMemoryWorkQueue(max_attempts=max_attempts)
+    if url == "local://":
+        return RedisWorkQueue(LocalBroker(), namespace=namespace, max_attempts=max_attempts)
+    if url.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required for redis:// work queues") from None
+        return RedisWorkQueue(redis.Redis.from_url(url), namespace=namespace, max_attempts=max_attempts)
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://"):]
+    return SQLiteWorkQueue(url, max_attempts=max_attempts)
@@ -31,5 +31,7 @@ def parse_code(code):
     if re.search("```python(.*?)```", result, re.DOTALL):
         code = result
 
-    with open(f"../generated_codes/{file_name}.py", "w") as f:
-        f.write(code)
\ No newline at end of file
+    output_path = f"../generated_codes/{file_name}.py"
+    with open(output_path, "w") as f:
+        f.write(code)
+    return output_path
\ No newline at end of file
@@ -1,10 +1,13 @@
 import os
+import sys
 import boto3
 import configparser
 from langchain_aws.chat_models import ChatBedrock
-from langchain_core.messages import HumanMessage
 from botocore.config import Config
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".."))
+from codegen_utils.streaming import stream_code
+
 os.environ["AWS_SHARED_CREDENTIALS_FILE"] = '~/.aws/credentials'
 os.environ["AWS_PROFILE"] = '536697239187-/AI-DEVELOPER'
 
@@ -36,8 +39,10 @@ config = Config(
 
 bedrock_runtime = boto3.client("bedrock-runtime", region_name=region_name, config=config)
 
+MODEL_ID = "arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
 llm = ChatBedrock(
-    model_id="arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+    model_id=MODEL_ID,
     client=bedrock_runtime,
     provider="anthropic",
     model_kwargs={
@@ -47,9 +52,17 @@ llm = ChatBedrock(
     }
 )
 
-def invoke_llm(prompt):
+def invoke_llm(prompt, max_attempts=2):
     
     print("-----------LLM CALLED-----------")
-    llm_prompt = HumanMessage(content=prompt)
-    response = llm.invoke([prompt])
-    return response.content
\ No newline at end of file
+    # Stream the response and cancel as soon as a ```python block turns out
+    # to be syntactically broken, then ask again with the error as feedback
+    for attempt in range(1, max_attempts + 1):
+        result = stream_code(llm, prompt, fenced=True)
+        print(f"LLM responded in {result.stats['total_seconds']}s "
+              f"(first token after {result.stats['ttft_seconds']}s)")
+        if not result.error or attempt == max_attempts:
+            return result.text
+        print(f"Generation cancelled early: {result.error}")
+        prompt = (f"{prompt}\n\nA previous attempt was abandoned because its code had a "
+                  f"syntax error: {result.error}. Make sure the code is valid Python.")
\ No newline at end of file
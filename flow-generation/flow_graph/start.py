@@ -45,9 +45,13 @@ instructions = f"""
         7. Some websites require properties like usertoken/device_id,\n
         so you can mention that in the code to input it, and\n
         crawl using that so that you don't get unauthorized errors\n
+        8. Write the json files with serialization.write_json(path, data)\n
+        from the shared crawler_utils package instead of json.dump. Import it with\n
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))\n
+        followed by from crawler_utils import serialization\n
 
         API Documentation\n
         {ctv_api_doc}
 """
 
-code_generation.generate_code(instructions)
\ No newline at end of file
+code_generation.generate_code(instructions, target="flow-generation:ctv", api_doc=ctv_api_doc)
\ No newline at end of file
@@ -6,11 +6,17 @@ This script crawls the CTV API to extract TV schedule data and stores it in a st
 """
 
 import os
-import json
-import time
+import sys
 import datetime
 import requests
-from urllib.parse import quote
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils.bootstrap_cache import BootstrapCache, default_cache_path
+from crawler_utils.dedup import ScheduleAliases, collapse, content_hash
+from crawler_utils.http_client import HttpClient
+from crawler_utils.metrics import get_metrics
+from crawler_utils.output import OutputWriter
+from crawler_utils.records import Channel, Episode, Movie
 
 class CTVCrawler:
     def __init__(self):
@@ -33,21 +39,54 @@ class CTVCrawler:
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(os.path.join(self.output_dir, "shows"), exist_ok=True)
         os.makedirs(os.path.join(self.output_dir, "movies"), exist_ok=True)
+        
+        # Request, sleep, parse and write timings for the run report
+        self.metrics = get_metrics()
+        self.http = HttpClient(metrics=self.metrics)
+        
+        # Background writer so disk I/O overlaps with the next schedule fetch
+        self.writer = OutputWriter(metrics=self.metrics)
+        
+        # Smart-id keys and the channel mapping are cached between runs and
+        # refreshed in the background once they get old, so a scheduled crawl
+        # can start fetching schedules straight away
+        self.bootstrap_cache = BootstrapCache(default_cache_path("ctv_bootstrap"))
 
     def get_smart_id(self):
         """Get API keys needed for authentication"""
+        self.api_keys = self.bootstrap_cache.get_or_fetch(
+            "smart_id", self._fetch_smart_id, ttl=12 * 3600, refresh_after=3600
+        )
+        return self.api_keys
+
+    def _fetch_smart_id(self):
+        """Request fresh API keys from the smart-id endpoint"""
         url = f"{self.base_url}/api/smart-id"
         response = requests.get(url, headers=self.headers)
         if response.status_code == 200:
-            self.api_keys = response.json()
-            print(f"Successfully retrieved API keys: {self.api_keys}")
-            return self.api_keys
+            api_keys = response.json()
+            print(f"Successfully retrieved API keys: {api_keys}")
+            return api_keys
         else:
             print(f"Failed to get API keys: {response.status_code}")
             return None
 
     def get_channel_collections(self, postal_code="M5V"):
         """Get list of available channels and their identifiers"""
+        mapping = self.bootstrap_cache.get_or_fetch(
+            f"channel_mapping:{postal_code}",
+            lambda: self._fetch_channel_mapping(postal_code),
+            ttl=7 * 24 * 3600,
+            refresh_after=24 * 3600
+        )
+        if mapping is None:
+            return None
+        
+        self.channel_mapping = {name: Channel.from_dict(info) for name, info in mapping.items()}
+        return self.channel_mapping
+
+    def _fetch_channel_mapping(self, postal_code):
+        """Request the channel collection and build a cacheable channel mapping"""
         url = f"{self.capi_url}/destinations/ctv_hub/platforms/atexace/collections/4126/contents"
         params = {
             "$include": "[Id,Tags,Media.Id,Name]",
@@ -58,8 +97,8 @@ class CTVCrawler:
         if response.status_code == 200:
             channels = response.json()
             # Create a mapping of channel names to their codes and hubs
-            self.channel_mapping = self._create_channel_mapping(channels)
-            return self.channel_mapping
+            channel_mapping = self._create_channel_mapping(channels)
+            return {name: channel.to_dict() for name, channel in channel_mapping.items()}
         else:
             print(f"Failed to get channel collections: {response.status_code}")
             return None
@@ -104,11 +143,11 @@ class CTVCrawler:
                     hub = specific_hub
                     break
                     
-            channel_mapping[name] = {
-                "code": channel_code,
-                "hub": hub,
-                "id": item.get("Id")
-            }
+            channel_mapping[name] = Channel(
+                code=channel_code,
+                hub=hub,
+                id=item.get("Id")
+            )
             
         return channel_mapping
 
@@ -122,8 +161,8 @@ class CTVCrawler:
             return None
             
         channel_info = self.channel_mapping[channel_name]
-        channel_hub = channel_info["hub"]
-        channel_code = channel_info["code"]
+        channel_hub = channel_info.hub
+        channel_code = channel_info.code
         
         # Default to today if no dates provided
         if not start_date:
@@ -145,9 +184,12 @@ class CTVCrawler:
         headers = self.headers.copy()
         headers["referer"] = "https://www.ctv.ca/"
         
-        response = requests.get(url, params=params, headers=headers)
+        response = self.http.get(
+            url, params=params, headers=headers,
+            endpoint="capi.9c9media.com/destinations/{hub}/platforms/atexace/channelaffiliates/{code}/schedules",
+        )
         if response.status_code == 200:
-            schedule_data = response.json()
+            schedule_data = self.http.json(response)
             return schedule_data
         else:
             print(f"Failed to get schedule for {channel_name}: {response.status_code}")
@@ -176,18 +218,18 @@ class CTVCrawler:
                         "description": item.get("LongDescription", item.get("Desc", ""))
                     }
                 
-                episode = {
-                    "title": item.get("Title", "Untitled Episode"),
-                    "description": item.get("Desc", ""),
-                    "season": item.get("SeasonNo"),
-                    "episode": item.get("EpisodeNumber"),
-                    "air_time": item.get("StartTime"),
-                    "duration": item.get("Duration"),
-                    "release_year": item.get("ReleaseYear"),
-                    "images": item.get("Images", []),
-                    "cast": item.get("TopCast", []),
-                    "directors": item.get("Directors", [])
-                }
+                episode = Episode(
+                    title=item.get("Title", "Untitled Episode"),
+                    description=item.get("Desc", ""),
+                    season=item.get("SeasonNo"),
+                    episode=item.get("EpisodeNumber"),
+                    air_time=item.get("StartTime"),
+                    duration=item.get("Duration"),
+                    release_year=item.get("ReleaseYear"),
+                    images=item.get("Images", []),
+                    cast=item.get("TopCast", []),
+                    directors=item.get("Directors", [])
+                )
                 
                 shows[show_name]["episodes"].append(episode)
                 
@@ -196,17 +238,17 @@ class CTVCrawler:
                 movie_name = item.get("Name", "Unknown Movie")
                 
                 if movie_name not in movies:
-                    movies[movie_name] = {
-                        "title": movie_name,
-                        "description": item.get("LongDescription", item.get("Desc", "")),
-                        "air_time": item.get("StartTime"),
-                        "duration": item.get("Duration"),
-                        "release_year": item.get("ReleaseYear"),
-                        "genres": item.get("Genres", []),
-                        "images": item.get("Images", []),
-                        "cast": item.get("TopCast", []),
-                        "directors": item.get("Directors", [])
-                    }
+                    movies[movie_name] = Movie(
+                        title=movie_name,
+                        description=item.get("LongDescription", item.get("Desc", "")),
+                        air_time=item.get("StartTime"),
+                        duration=item.get("Duration"),
+                        release_year=item.get("ReleaseYear"),
+                        genres=item.get("Genres", []),
+                        images=item.get("Images", []),
+                        cast=item.get("TopCast", []),
+                        directors=item.get("Directors", [])
+                    )
         
         return {"shows": shows, "movies": movies}
 
@@ -222,23 +264,20 @@ class CTVCrawler:
             safe_name = "".join([c if c.isalnum() or c in [' ', '-', '_'] else '_' for c in show_name])
             safe_name = safe_name.strip().replace(' ', '_')
             
-            # Create show directory
+            # Show directory, created by the writer on first use
             show_dir = os.path.join(shows_dir, safe_name)
-            os.makedirs(show_dir, exist_ok=True)
             
             # Save show info
-            with open(os.path.join(show_dir, "info.json"), 'w') as f:
-                json.dump({
-                    "name": show_name,
-                    "genres": show_data.get("genres", []),
-                    "description": show_data.get("description", "")
-                }, f, indent=2)
+            self.writer.write_json(os.path.join(show_dir, "info.json"), {
+                "name": show_name,
+                "genres": show_data.get("genres", []),
+                "description": show_data.get("description", "")
+            })
             
             # Save episodes
             for i, episode in enumerate(show_data.get("episodes", [])):
                 episode_filename = f"s{episode.get('season', '00')}e{episode.get('episode', str(i+1).zfill(2))}.json"
-                with open(os.path.join(show_dir, episode_filename), 'w') as f:
-                    json.dump(episode, f, indent=2)
+                self.writer.write_json(os.path.join(show_dir, episode_filename), episode)
         
         # Save movies
         movies_dir = os.path.join(self.output_dir, "movies")
@@ -248,8 +287,7 @@ class CTVCrawler:
             safe_name = safe_name.strip().replace(' ', '_')
             
             # Save movie info
-            with open(os.path.join(movies_dir, f"{safe_name}.json"), 'w') as f:
-                json.dump(movie_data, f, indent=2)
+            self.writer.write_json(os.path.join(movies_dir, f"{safe_name}.json"), movie_data)
 
     def crawl_all_channels(self, days=7):
         """Crawl schedules for all channels for a specified number of days"""
@@ -262,13 +300,25 @@ class CTVCrawler:
             
         today = datetime.datetime.now()
         
-        for channel_name, channel_info in self.channel_mapping.items():
-            print(f"Crawling schedule for {channel_name}...")
+        # Channels that share a (hub, code) feed are fetched once; their content
+        # lands in the same shows/ and movies/ files anyway
+        groups = collapse((name, (info.hub, info.code)) for name, info in self.channel_mapping.items())
+        print(f"{len(self.channel_mapping)} channels share {len(groups)} distinct feeds")
+        aliases = ScheduleAliases()
+        
+        # Date by date, so the first date can reveal affiliates that carry identical schedules
+        for day_offset in range(days):
+            current_date = today + datetime.timedelta(days=day_offset)
+            print(f"Getting schedules for {current_date.strftime('%Y-%m-%d')}...")
             
-            for day_offset in range(days):
-                current_date = today + datetime.timedelta(days=day_offset)
-                print(f"  Getting schedule for {current_date.strftime('%Y-%m-%d')}...")
+            for group in groups:
+                leader = aliases.leader(group.key)
+                if leader is not None:
+                    print(f"  {', '.join(group.members)}: same schedule as the {leader[1]} feed, skipped")
+                    continue
                 
+                channel_name = group.members[0]
+                print(f"  Crawling schedule for {', '.join(group.members)}...")
                 schedule_data = self.get_channel_schedule(
                     channel_name, 
                     start_date=current_date,
@@ -276,15 +326,20 @@ class CTVCrawler:
                 )
                 
                 if schedule_data:
+                    if day_offset == 0:
+                        digest = content_hash(schedule_data.get("Items", []))
+                        if aliases.observe(current_date.strftime('%Y-%m-%d'), group.key, digest):
+                            print("  Identical to a feed already saved, skipping it from now on")
+                            continue
                     content_data = self.process_schedule_data(schedule_data)
                     self.save_content(content_data)
                     print(f"  Saved {len(content_data.get('shows', {}))} shows and {len(content_data.get('movies', {}))} movies")
                 
                 # Be nice to the API
-                time.sleep(1)
+                self.metrics.sleep(1)
             
-            # Be extra nice between channels
-            time.sleep(2)
+            # Be extra nice between dates
+            self.metrics.sleep(2)
 
     def run(self):
         """Main execution method"""
@@ -297,7 +352,14 @@ class CTVCrawler:
         self.get_channel_collections()
         
         # Crawl all channels for the next 7 days
-        self.crawl_all_channels(days=7)
+        try:
+            self.crawl_all_channels(days=7)
+        finally:
+            # Wait for the queued files and any bootstrap refresh to finish
+            self.writer.close()
+            self.bootstrap_cache.wait_for_refreshes(timeout=30)
+            json_path, _ = self.metrics.export("ctv")
+            print(f"Metrics written to {json_path}")
         
         print(f"Crawling complete! Results saved to {self.output_dir}")
 
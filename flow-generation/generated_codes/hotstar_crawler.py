@@ -19,32 +19,60 @@ Requirements:
 import requests
 import json
 import os
+import sys
 import time
 import random
 from tqdm import tqdm
 from urllib.parse import urlparse, parse_qs
 import dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils.changelog import ChangeLog
+from crawler_utils.http_client import HttpClient
+from crawler_utils.locales import fan_out, split_locales
+from crawler_utils.metrics import get_metrics
+from crawler_utils.output import OutputWriter
+from crawler_utils.records import Episode, Movie
+from crawler_utils.seen_set import SeenSet, default_seen_path
+
 dotenv.load_dotenv()
 
 class HotstarCrawler:
-    def __init__(self, user_token=os.getenv('x-hs-usertoken'), device_id=os.getenv('x-hs-device-id')):
+    def __init__(self, user_token=os.getenv('x-hs-usertoken'), device_id=os.getenv('x-hs-device-id'), languages=None):
         """
         Initialize the Hotstar crawler with authentication details.
         
         Args:
             user_token (str): User token for authentication
             device_id (str): Device ID for authentication
+            languages (list): x-hs-accept-language values to crawl, fetched concurrently;
+                the first is primary and the others only store their translated fields
         """
         self.base_url = "https://www.hotstar.com"
         self.api_base = f"{self.base_url}/api/internal/bff/v2"
         self.country = "in"  # Default country code
+        self.languages = languages or os.getenv("HOTSTAR_LANGUAGES", "eng").split(",")
         self.result_dir = "../result_json"
         
         # Create result directory if it doesn't exist
         if not os.path.exists(self.result_dir):
             os.makedirs(self.result_dir)
         
+        # Request, sleep, parse and write timings for the run report
+        self.metrics = get_metrics()
+        # Language variants of one URL must not share a coalesced call
+        self.http = HttpClient(metrics=self.metrics, vary_headers=("x-hs-accept-language",))
+        
+        # Background writer that batches file writes and caches directories
+        self.writer = OutputWriter(metrics=self.metrics)
+        
+        # Insert/update/delete events against the previous crawl, keyed by
+        # content_id; streaming URLs are signed per request, so they are not compared
+        self.changelog = ChangeLog("hotstar", ignore=("streaming_url",))
+        
+        # Content IDs seen during discovery and crawled in earlier runs
+        self.seen = SeenSet(default_seen_path("hotstar"))
+        
         # Authentication details
         self.user_token = user_token or ""
         self.device_id = device_id or self._generate_device_id()
@@ -97,25 +125,30 @@ class HotstarCrawler:
             parts.append(''.join(random.choices('0123456789abcdef', k=length)))
         return '-'.join(parts)
     
-    def _make_request(self, url, params=None):
+    def _make_request(self, url, params=None, endpoint=None, hedge=False, language=None):
         """
         Make a GET request to the API.
         
         Args:
             url (str): URL to request
             params (dict): Query parameters
+            endpoint (str): Endpoint template for metrics; derived from the URL by default
+            hedge (bool): Send a second request if this one is slower than the endpoint usually is
+            language (str): x-hs-accept-language for this request; the default language otherwise
             
         Returns:
             dict: JSON response
         """
-        # Update request ID for each request
-        self.headers["x-request-id"] = self._generate_request_id()
-        self.headers["x-hs-request-id"] = self.headers["x-request-id"]
+        # New request ID for each request, on a copy so concurrent requests do not share one
+        request_id = self._generate_request_id()
+        headers = {**self.headers, "x-request-id": request_id, "x-hs-request-id": request_id}
+        if language:
+            headers["x-hs-accept-language"] = language
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self.http.get(url, headers=headers, params=params, endpoint=endpoint, hedge=hedge)
             response.raise_for_status()
-            return response.json()
+            return self.http.json(response)
         except requests.exceptions.RequestException as e:
             print(f"Request error: {e}")
             if hasattr(e, 'response') and e.response:
@@ -133,7 +166,7 @@ class HotstarCrawler:
         url = f"{self.api_base}/slugs/{self.country}/home"
         return self._make_request(url)
     
-    def get_content_details(self, content_type, content_slug, content_id):
+    def get_content_details(self, content_type, content_slug, content_id, language=None):
         """
         Get details for a specific content item.
         
@@ -141,12 +174,34 @@ class HotstarCrawler:
             content_type (str): Type of content (shows, movies)
             content_slug (str): URL-friendly name of the content
             content_id (str): Unique identifier for the content
+            language (str): x-hs-accept-language to request; the default language otherwise
             
         Returns:
             dict: Content details
         """
         url = f"{self.api_base}/slugs/{self.country}/{content_type}/{content_slug}/{content_id}"
-        return self._make_request(url)
+        return self._make_request(
+            url, endpoint=f"hotstar/slugs/{{country}}/{content_type}/{{slug}}/{{id}}", language=language
+        )
+    
+    def get_localized_details(self, content_type, content_slug, content_id, extract):
+        """
+        Fetch a content item in every crawl language concurrently.
+        
+        Args:
+            content_type (str): Type of content (shows, movies)
+            content_slug (str): URL-friendly name of the content
+            content_id (str): Unique identifier for the content
+            extract (callable): Turns a details response into the saved structure
+            
+        Returns:
+            dict: {language: extracted details}, without languages that returned nothing
+        """
+        variants = fan_out(
+            self.languages,
+            lambda language: extract(self.get_content_details(content_type, content_slug, content_id, language))
+        )
+        return {language: details for language, details in variants.items() if details}
     
     def get_tray_content(self, category, subcategory, tray_id, card_type="VERTICAL_LARGE"):
         """
@@ -162,8 +217,9 @@ class HotstarCrawler:
             dict: Tray content
         """
         url = f"{self.api_base}/slugs/{self.country}/browse/{category}/{subcategory}/{tray_id}"
+        endpoint = "hotstar/slugs/{country}/browse/{category}/{subcategory}/{tray_id}"
         params = {"card_type": card_type}
-        return self._make_request(url, params)
+        return self._make_request(url, params, endpoint)
     
     def get_paginated_content(self, page_id, space_id, offset=0, size=10, page_enum="home", rws=None):
         """
@@ -181,6 +237,7 @@ class HotstarCrawler:
             dict: Paginated content
         """
         url = f"{self.api_base}/pages/{page_id}/spaces/{space_id}"
+        endpoint = "hotstar/pages/{page_id}/spaces/{space_id}"
         params = {
             "offset": offset,
             "size": size,
@@ -195,7 +252,7 @@ class HotstarCrawler:
         random_suffix = ''.join(random.choices('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-', k=16))
         params["anchor-session-token"] = f"{timestamp}-{random_suffix}"
         
-        return self._make_request(url, params)
+        return self._make_request(url, params, endpoint)
     
     def get_widget_items(self, url):
         """
@@ -226,7 +283,8 @@ class HotstarCrawler:
             "client_capabilities": json.dumps(self.client_capabilities),
             "drm_parameters": json.dumps(self.drm_parameters)
         }
-        return self._make_request(url, params)
+        # Playback info has a long latency tail, so slow calls are hedged
+        return self._make_request(url, params, hedge=True)
     
     def extract_content_from_tray(self, tray_data):
         """
@@ -322,13 +380,13 @@ class HotstarCrawler:
                     
                     if "episodes" in season:
                         for episode in season["episodes"]:
-                            episode_data = {
-                                "id": episode.get("content_id", ""),
-                                "title": episode.get("title", ""),
-                                "description": episode.get("description", ""),
-                                "episode_number": episode.get("episode_num", 0),
-                                "duration": episode.get("duration", 0)
-                            }
+                            episode_data = Episode(
+                                id=episode.get("content_id", ""),
+                                title=episode.get("title", ""),
+                                description=episode.get("description", ""),
+                                episode_number=episode.get("episode_num", 0),
+                                duration=episode.get("duration", 0)
+                            )
                             season_data["episodes"].append(episode_data)
                     
                     structured_data["seasons"].append(season_data)
@@ -347,7 +405,7 @@ class HotstarCrawler:
             movie_data (dict): Movie data
             
         Returns:
-            dict: Movie details
+            Movie: Movie details, or an empty dict on failure
         """
         if not movie_data or "success" not in movie_data:
             return {}
@@ -358,14 +416,14 @@ class HotstarCrawler:
             movie_details = hero_widget["data"]
             
             # Clean up and structure the data
-            structured_data = {
-                "id": movie_details.get("content_id", ""),
-                "title": movie_details.get("title", ""),
-                "description": movie_details.get("description", ""),
-                "genre": movie_details.get("genre", []),
-                "language": movie_details.get("lang", []),
-                "duration": movie_details.get("duration", 0)
-            }
+            structured_data = Movie(
+                id=movie_details.get("content_id", ""),
+                title=movie_details.get("title", ""),
+                description=movie_details.get("description", ""),
+                genre=movie_details.get("genre", []),
+                language=movie_details.get("lang", []),
+                duration=movie_details.get("duration", 0)
+            )
             
             return structured_data
         
@@ -382,15 +440,12 @@ class HotstarCrawler:
             content_data (dict): Content data
             filename (str): Filename to save the data
         """
-        # Create directory if it doesn't exist
+        # The writer creates the directory the first time it is used
         directory = os.path.join(self.result_dir, content_type)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
         
-        # Save data to file
+        # Queue data for the background writer
         filepath = os.path.join(directory, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(content_data, f, indent=2, ensure_ascii=False)
+        self.writer.write_json(filepath, content_data)
     
     def crawl_show(self, show_id, show_slug):
         """
@@ -405,37 +460,31 @@ class HotstarCrawler:
         """
         print(f"Crawling show: {show_slug} ({show_id})")
         
-        # Get show details
-        show_data = self.get_content_details("shows", show_slug, show_id)
-        show_details = self.extract_show_details(show_data)
+        # Get show details in every crawl language
+        show_variants = self.get_localized_details("shows", show_slug, show_id, self.extract_show_details)
+        show_details = show_variants.get(self.languages[0])
         
         if not show_details:
             print(f"Failed to extract details for show: {show_slug}")
             return None
         
-        # Create show directory
+        # Show directory, created by the writer on first use
         show_dir = os.path.join(self.result_dir, "shows", show_slug)
-        if not os.path.exists(show_dir):
-            os.makedirs(show_dir)
         
-        # Save show metadata
-        show_metadata_path = os.path.join(show_dir, "metadata.json")
-        with open(show_metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(show_details, f, indent=2, ensure_ascii=False)
+        # Streaming URLs by episode ID; they do not depend on the language
+        streaming_urls = {}
         
         # Process each season and episode
         for season in show_details.get("seasons", []):
             season_num = season.get("season_number", 0)
             
-            # Create season directory
+            # Season directory, created by the writer on first use
             season_dir = os.path.join(show_dir, f"season_{season_num}")
-            if not os.path.exists(season_dir):
-                os.makedirs(season_dir)
             
             # Process episodes
             for episode in season.get("episodes", []):
-                episode_num = episode.get("episode_number", 0)
-                episode_id = episode.get("id", "")
+                episode_num = episode.episode_number
+                episode_id = episode.id
                 
                 # Get video details for the episode
                 if episode_id:
@@ -445,18 +494,42 @@ class HotstarCrawler:
                             # Extract streaming URL
                             media_asset = video_data["success"]["widget_wrapper"]["widget"]["data"]["media_asset"]
                             if "primary" in media_asset and "content_url" in media_asset["primary"]:
-                                episode["streaming_url"] = media_asset["primary"]["content_url"]
+                                streaming_urls[episode_id] = media_asset["primary"]["content_url"]
+                                episode.streaming_url = streaming_urls[episode_id]
                         except (KeyError, TypeError):
                             pass
                 
-                # Save episode data
+                # Queue episode data
                 episode_filename = f"episode_{episode_num}.json"
                 episode_path = os.path.join(season_dir, episode_filename)
-                with open(episode_path, 'w', encoding='utf-8') as f:
-                    json.dump(episode, f, indent=2, ensure_ascii=False)
+                self.writer.write_json(episode_path, episode)
                 
                 # Add a small delay to avoid rate limiting
-                time.sleep(0.5)
+                self.metrics.sleep(0.5)
+        
+        # Save show metadata once the episodes carry their streaming URLs, with
+        # the other languages' translated fields next to the shared ones
+        show_metadata_path = os.path.join(show_dir, "metadata.json")
+        if len(show_variants) > 1:
+            # Give every language the primary's streaming URLs so they are stored as shared fields
+            for variant in show_variants.values():
+                for season in variant.get("seasons", []):
+                    for episode in season.get("episodes", []):
+                        if episode.id in streaming_urls:
+                            episode.streaming_url = streaming_urls[episode.id]
+            self.writer.write_json(show_metadata_path, {"locales": list(show_variants), **split_locales(show_variants)})
+        else:
+            self.writer.write_json(show_metadata_path, show_details)
+        
+        # Log changes to the show and to its episode list
+        content_id = show_details.get("id") or show_id
+        self.changelog.capture_item("shows", content_id, {k: v for k, v in show_details.items() if k != "seasons"})
+        self.changelog.capture(
+            f"shows/{content_id}",
+            (episode for season in show_details.get("seasons", []) for episode in season.get("episodes", [])),
+            lambda episode: episode.id,
+        )
+        self.seen.mark_crawled(show_id)
         
         return show_details
     
@@ -473,9 +546,9 @@ class HotstarCrawler:
         """
         print(f"Crawling movie: {movie_slug} ({movie_id})")
         
-        # Get movie details
-        movie_data = self.get_content_details("movies", movie_slug, movie_id)
-        movie_details = self.extract_movie_details(movie_data)
+        # Get movie details in every crawl language
+        movie_variants = self.get_localized_details("movies", movie_slug, movie_id, self.extract_movie_details)
+        movie_details = movie_variants.get(self.languages[0])
         
         if not movie_details:
             print(f"Failed to extract details for movie: {movie_slug}")
@@ -488,12 +561,19 @@ class HotstarCrawler:
                 # Extract streaming URL
                 media_asset = video_data["success"]["widget_wrapper"]["widget"]["data"]["media_asset"]
                 if "primary" in media_asset and "content_url" in media_asset["primary"]:
-                    movie_details["streaming_url"] = media_asset["primary"]["content_url"]
+                    # Set on every language so the split stores it as a shared field
+                    for variant in movie_variants.values():
+                        variant.streaming_url = media_asset["primary"]["content_url"]
             except (KeyError, TypeError):
                 pass
         
-        # Save movie data
-        self.save_content("movies", movie_details, f"{movie_slug}.json")
+        # Save movie data, with the other languages' translated fields next to the shared ones
+        if len(movie_variants) > 1:
+            self.save_content("movies", {"locales": list(movie_variants), **split_locales(movie_variants)}, f"{movie_slug}.json")
+        else:
+            self.save_content("movies", movie_details, f"{movie_slug}.json")
+        self.changelog.capture_item("movies", movie_details.get("id") or movie_id, movie_details)
+        self.seen.mark_crawled(movie_id)
         
         return movie_details
     
@@ -582,7 +662,7 @@ class HotstarCrawler:
                     more_url = None
                 
                 # Add a small delay to avoid rate limiting
-                time.sleep(0.5)
+                self.metrics.sleep(0.5)
         
         except (KeyError, TypeError):
             pass
@@ -598,9 +678,10 @@ class HotstarCrawler:
         """
         print("Crawling homepage...")
         
-        # Get homepage content
+        # Get homepage content; titles repeated across trays are dropped as they arrive
         home_data = self.get_home_page()
-        content_items = self.extract_content_from_home(home_data)
+        home_items = self.extract_content_from_home(home_data)
+        content_items = self._new_items(home_items)
         
         # Handle pagination for homepage content
         try:
@@ -620,7 +701,7 @@ class HotstarCrawler:
                         rws.append(widget_id)
             
             # Paginate through content
-            offset = len(content_items)
+            offset = len(home_items)
             size = 10
             
             while True:
@@ -648,14 +729,14 @@ class HotstarCrawler:
                 if not more_items:
                     break
                 
-                # Add items to the list
-                content_items.extend(more_items)
+                # Add the items not seen in an earlier tray
+                content_items.extend(self._new_items(more_items))
                 
                 # Update offset for next page
                 offset += size
                 
                 # Add a small delay to avoid rate limiting
-                time.sleep(0.5)
+                self.metrics.sleep(0.5)
         
         except (KeyError, TypeError) as e:
             print(f"Error during homepage pagination: {e}")
@@ -675,44 +756,107 @@ class HotstarCrawler:
         
         return shows, movies
     
-    def crawl(self, max_shows=10, max_movies=10):
+    def _new_items(self, items):
+        """
+        Keep the items whose content ID has not been seen yet in this run.
+        
+        Args:
+            items (list): Content items
+            
+        Returns:
+            list: Items seen for the first time
+        """
+        items = [item for item in items if item.get("id")]
+        return [item for item, new in zip(items, self.seen.add_many(item["id"] for item in items)) if new]
+    
+    def work_units(self):
+        """
+        Discover content on the homepage and return one work unit per show or movie.
+        
+        Keys only depend on the content ID, so hosts that discover the same
+        item assign it to the same shard.
+        
+        Returns:
+            list: (key, payload) pairs
+        """
+        shows, movies = self.crawl_home_page()
+        units = [(f"hotstar:show:{show_id}", {"type": "show", "id": show_id, "slug": show_slug})
+                 for show_id, show_slug in dict.fromkeys(shows)]
+        units += [(f"hotstar:movie:{movie_id}", {"type": "movie", "id": movie_id, "slug": movie_slug})
+                  for movie_id, movie_slug in dict.fromkeys(movies)]
+        return units
+    
+    def crawl_unit(self, unit):
+        """
+        Crawl a single work unit produced by work_units().
+        
+        Args:
+            unit (dict): Work unit payload
+            
+        Returns:
+            dict: Summary of the crawled item
+        """
+        if unit["type"] == "show":
+            details = self.crawl_show(unit["id"], unit["slug"])
+        else:
+            details = self.crawl_movie(unit["id"], unit["slug"])
+        return {"type": unit["type"], "found": details is not None}
+    
+    def close(self):
+        """
+        Wait for the queued files to reach the disk and close the crawl state databases.
+        """
+        self.writer.close()
+        self.changelog.close()
+        self.seen.close()
+    
+    def crawl(self, max_shows=10, max_movies=10, skip_crawled_days=0):
         """
         Main crawling function.
         
         Args:
             max_shows (int): Maximum number of shows to crawl
             max_movies (int): Maximum number of movies to crawl
+            skip_crawled_days (float): Skip content crawled within this many days, 0 to crawl everything
         """
         print(f"Starting Hotstar crawler (max_shows={max_shows}, max_movies={max_movies})...")
         
-        # Crawl homepage to discover content
+        # Crawl homepage to discover content; duplicates are dropped during discovery
         shows, movies = self.crawl_home_page()
         
-        # Deduplicate content
-        shows = list(set(shows))
-        movies = list(set(movies))
-        
         print(f"Discovered {len(shows)} shows and {len(movies)} movies")
         
+        if skip_crawled_days:
+            max_age = skip_crawled_days * 86400
+            shows = [show for show in shows if not self.seen.crawled_within(show[0], max_age)]
+            movies = [movie for movie in movies if not self.seen.crawled_within(movie[0], max_age)]
+            print(f"{len(shows)} shows and {len(movies)} movies were not crawled in the last {skip_crawled_days} days")
+        
         # Limit the number of items to crawl
         shows = shows[:max_shows]
         movies = movies[:max_movies]
         
-        # Crawl shows
-        print(f"\nCrawling {len(shows)} shows...")
-        for i, (show_id, show_slug) in enumerate(tqdm(shows)):
-            self.crawl_show(show_id, show_slug)
-            # Add a delay between shows to avoid rate limiting
-            if i < len(shows) - 1:
-                time.sleep(1)
-        
-        # Crawl movies
-        print(f"\nCrawling {len(movies)} movies...")
-        for i, (movie_id, movie_slug) in enumerate(tqdm(movies)):
-            self.crawl_movie(movie_id, movie_slug)
-            # Add a delay between movies to avoid rate limiting
-            if i < len(movies) - 1:
-                time.sleep(1)
+        try:
+            # Crawl shows
+            print(f"\nCrawling {len(shows)} shows...")
+            for i, (show_id, show_slug) in enumerate(tqdm(shows)):
+                self.crawl_show(show_id, show_slug)
+                # Add a delay between shows to avoid rate limiting
+                if i < len(shows) - 1:
+                    self.metrics.sleep(1)
+            
+            # Crawl movies
+            print(f"\nCrawling {len(movies)} movies...")
+            for i, (movie_id, movie_slug) in enumerate(tqdm(movies)):
+                self.crawl_movie(movie_id, movie_slug)
+                # Add a delay between movies to avoid rate limiting
+                if i < len(movies) - 1:
+                    self.metrics.sleep(1)
+        finally:
+            # Wait for the queued files to reach the disk
+            self.close()
+            json_path, _ = self.metrics.export("hotstar")
+            print(f"Metrics written to {json_path}")
         
         print("\nCrawling completed!")
 
@@ -727,17 +871,21 @@ def main():
     parser.add_argument('--device-id', help='Device ID for authentication')
     parser.add_argument('--max-shows', type=int, default=10, help='Maximum number of shows to crawl')
     parser.add_argument('--max-movies', type=int, default=10, help='Maximum number of movies to crawl')
+    parser.add_argument('--skip-crawled-days', type=float, default=0,
+                        help='Skip content crawled within this many days (0 crawls everything)')
+    parser.add_argument('--languages', help='Comma-separated x-hs-accept-language values, e.g. eng,hin')
     
     args = parser.parse_args()
     
     # Initialize crawler
     crawler = HotstarCrawler(
         user_token=args.user_token,
-        device_id=args.device_id
+        device_id=args.device_id,
+        languages=args.languages.split(",") if args.languages else None
     )
     
     # Start crawling
-    crawler.crawl(max_shows=args.max_shows, max_movies=args.max_movies)
+    crawler.crawl(max_shows=args.max_shows, max_movies=args.max_movies, skip_crawled_days=args.skip_crawled_days)
 
 
 if __name__ == "__main__":
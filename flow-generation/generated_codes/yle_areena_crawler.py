@@ -1,11 +1,21 @@
 import os
+import sys
 import json
-import time
 import requests
 from datetime import datetime, timedelta
 import re
 from bs4 import BeautifulSoup
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils.bootstrap_cache import BootstrapCache, default_cache_path
+from crawler_utils.http_client import HttpClient
+from crawler_utils.metrics import get_metrics
+from crawler_utils.output import OutputWriter
+from crawler_utils.records import Airing
+from crawler_utils.tv_guide import TvGuide
+
+FALLBACK_BUILD_ID = "Q_35nL8jUwGOhxPC9wVX5"
+
 class YleAreenaCrawler:
     def __init__(self):
         # API credentials
@@ -43,17 +53,25 @@ class YleAreenaCrawler:
             "yle-areena"
         ]
         
-        # Output directory
+        # Output directory and the background writer that persists into it
         self.output_dir = "yle_areena_data"
+        # Request, sleep, parse and write timings for the run report
+        self.metrics = get_metrics()
+        self.http = HttpClient(metrics=self.metrics)
+        self.writer = OutputWriter(metrics=self.metrics)
+        
+        # Build ID and location are cached between runs. The build ID is only
+        # refetched once it expires or a _next/data call reports it stale.
+        self.bootstrap_cache = BootstrapCache(default_cache_path("yle_bootstrap"))
         
         # Get build ID for Next.js API calls
-        self.build_id = self._get_build_id()
+        self.build_id = self.bootstrap_cache.get_or_fetch("build_id", self._get_build_id) or FALLBACK_BUILD_ID
         
         # Get user location
-        self.location = self._get_user_location()
+        self.location = self.bootstrap_cache.get_or_fetch("location", self._get_user_location) or {"country_code": "IN"}
         
     def _get_build_id(self):
-        """Extract the build ID from the main page HTML"""
+        """Extract the build ID from the main page HTML, or None if it cannot be found"""
         try:
             response = requests.get("https://areena.yle.fi/tv/opas", headers=self.headers, cookies=self.cookies)
             response.raise_for_status()
@@ -70,14 +88,46 @@ class YleAreenaCrawler:
                 data = json.loads(scripts[0].string)
                 return data.get('buildId')
                 
-            print("Warning: Could not extract build ID, using fallback")
-            return "Q_35nL8jUwGOhxPC9wVX5"  # Fallback build ID
+            print("Warning: Could not extract build ID")
+            return None
         except Exception as e:
             print(f"Error getting build ID: {e}")
-            return "Q_35nL8jUwGOhxPC9wVX5"  # Fallback build ID
+            return None
+    
+    def _refresh_build_id(self):
+        """Drop the cached build ID and fetch the current one"""
+        self.bootstrap_cache.invalidate("build_id")
+        self.build_id = self.bootstrap_cache.get_or_fetch("build_id", self._get_build_id) or FALLBACK_BUILD_ID
+        print(f"Refreshed build ID: {self.build_id}")
+        return self.build_id
+    
+    def _get_next_data(self, page, params=None):
+        """Fetch a Next.js data page such as "fi/tv/opas.json" for the current build"""
+        headers = self.headers.copy()
+        headers["x-nextjs-data"] = "1"
+        
+        for attempt in range(2):
+            url = f"https://areena.yle.fi/_next/data/{self.build_id}/{page}"
+            # Hedged: these pages have a long latency tail
+            response = self.http.get(
+                url,
+                params=params,
+                headers=headers,
+                cookies=self.cookies,
+                endpoint=f"areena.yle.fi/_next/data/{{build_id}}/{page}",
+                hedge=True
+            )
+            
+            # A 404 means the site was redeployed and the build ID is stale
+            if response.status_code == 404 and attempt == 0:
+                self._refresh_build_id()
+                continue
+            
+            response.raise_for_status()
+            return response.json()
     
     def _get_user_location(self):
-        """Get user location information"""
+        """Get user location information, or None if the lookup fails"""
         try:
             location_params = {
                 "app_id": "analytics-sdk",
@@ -93,10 +143,10 @@ class YleAreenaCrawler:
             
             if response.status_code == 200:
                 return response.json()
-            return {"country_code": "IN"}  # Default fallback
+            return None
         except Exception as e:
             print(f"Error getting location: {e}")
-            return {"country_code": "IN"}  # Default fallback
+            return None
     
     def _get_available_dates(self, days=7):
         """Get a list of available dates for TV schedules"""
@@ -110,6 +160,22 @@ class YleAreenaCrawler:
         
         return dates
     
+    def _get_crawl_plan(self):
+        """Get the (channel, date) pairs the TV guide has schedules for within the available dates"""
+        dates = self._get_available_dates()
+        try:
+            guide = TvGuide.from_next_data(self._get_next_data("fi/tv/opas.json"))
+        except Exception as e:
+            print(f"Error reading the TV guide page: {e}")
+            guide = None
+        
+        # Fall back to every channel on every date if the guide listed nothing
+        if not guide or not guide.dates or not guide.channels:
+            return [(channel, date) for channel in self.channels for date in dates]
+        
+        plan = guide.plan(start=min(dates), end=max(dates))
+        return sorted(plan, key=lambda pair: guide.channels.index(pair[0]))
+    
     def _get_channel_schedule(self, channel_id, date):
         """Get the TV schedule for a specific channel and date"""
         all_programs = []
@@ -127,18 +193,19 @@ class YleAreenaCrawler:
                 
                 url = f"https://areena.api.yle.fi/v1/ui/schedules/{channel_id}/{date}.json"
                 
-                response = requests.get(
+                response = self.http.get(
                     url,
                     params=params,
                     headers=self.headers,
-                    cookies=self.cookies
+                    cookies=self.cookies,
+                    endpoint="areena.api.yle.fi/v1/ui/schedules/{channel}/{date}.json"
                 )
                 
                 if response.status_code != 200:
                     print(f"Error fetching schedule for {channel_id} on {date}: {response.status_code}")
                     break
                 
-                data = response.json()
+                data = self.http.json(response)
                 programs = data.get("data", [])
                 all_programs.extend(programs)
                 
@@ -150,7 +217,7 @@ class YleAreenaCrawler:
                     break
                 
                 offset += limit
-                time.sleep(0.5)  # Be nice to the API
+                self.metrics.sleep(0.5)  # Be nice to the API
                 
             except Exception as e:
                 print(f"Error fetching schedule for {channel_id} on {date}: {e}")
@@ -178,14 +245,14 @@ class YleAreenaCrawler:
             elif label.get("type") == "broadcastEndDate" and "raw" in label:
                 end_time = label["raw"]
         
-        return {
-            "title": title,
-            "description": description,
-            "id": program_id,
-            "start_time": start_time,
-            "end_time": end_time,
-            "uri": uri
-        }
+        return Airing(
+            title=title,
+            description=description,
+            id=program_id,
+            start_time=start_time,
+            end_time=end_time,
+            uri=uri
+        )
     
     def _create_directory(self, path):
         """Create directory if it doesn't exist"""
@@ -193,20 +260,17 @@ class YleAreenaCrawler:
             os.makedirs(path)
     
     def _save_program_data(self, program_data, channel, date):
-        """Save program data to file"""
-        channel_dir = os.path.join(self.output_dir, channel)
-        self._create_directory(channel_dir)
-        
-        date_dir = os.path.join(channel_dir, date)
-        self._create_directory(date_dir)
+        """Queue program data for the background writer"""
+        # The writer creates the channel/date directory on first use
+        date_dir = os.path.join(self.output_dir, channel, date)
         
         # Create a safe filename from the title
-        title = program_data["title"]
+        title = program_data.title
         safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
         
         # Add start time to filename to ensure uniqueness and chronological order
-        if program_data["start_time"]:
-            start_time = datetime.fromisoformat(program_data["start_time"].replace('Z', '+00:00'))
+        if program_data.start_time:
+            start_time = datetime.fromisoformat(program_data.start_time.replace('Z', '+00:00'))
             time_str = start_time.strftime("%H%M")
             filename = f"{time_str}_{safe_title}.json"
         else:
@@ -214,8 +278,7 @@ class YleAreenaCrawler:
         
         file_path = os.path.join(date_dir, filename)
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(program_data, f, ensure_ascii=False, indent=2)
+        self.writer.write_json(file_path, program_data)
     
     def crawl(self):
         """Main crawling function"""
@@ -226,15 +289,18 @@ class YleAreenaCrawler:
         # Create output directory
         self._create_directory(self.output_dir)
         
-        # Get available dates
-        dates = self._get_available_dates()
-        print(f"Crawling schedules for dates: {', '.join(dates)}")
+        # Get the (channel, date) pairs the TV guide has schedules for
+        plan = self._get_crawl_plan()
+        print(f"Crawling schedules for dates: {', '.join(sorted({date for _, date in plan}))}")
         
         # Crawl each channel for each date
-        for channel in self.channels:
-            print(f"\nProcessing channel: {channel}")
-            
-            for date in dates:
+        try:
+            current_channel = None
+            for channel, date in plan:
+                if channel != current_channel:
+                    print(f"\nProcessing channel: {channel}")
+                    current_channel = channel
+                
                 print(f"  Date: {date}")
                 programs = self._get_channel_schedule(channel, date)
                 print(f"  Found {len(programs)} programs")
@@ -243,7 +309,12 @@ class YleAreenaCrawler:
                     processed_program = self._process_program(program)
                     self._save_program_data(processed_program, channel, date)
                 
-                time.sleep(1)  # Be nice to the API
+                self.metrics.sleep(1)  # Be nice to the API
+        finally:
+            # Wait for the queued programs to reach the disk
+            self.writer.close()
+            json_path, _ = self.metrics.export("yle")
+            print(f"Metrics written to {json_path}")
         
         print("\nCrawling completed successfully!")
 
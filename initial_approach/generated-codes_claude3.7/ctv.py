@@ -1,10 +1,15 @@
 import requests
 import json
+import os
+import sys
 import time
 from datetime import datetime, timedelta
 import urllib.parse
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils.output import OutputWriter
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,6 +42,9 @@ class CTVCrawler:
         # Channel mapping
         self.channel_mapping = {}
         
+        # Background writer for the schedule snapshots
+        self.writer = OutputWriter(workers=1)
+        
     def get_smart_id(self):
         """Get API keys needed for subsequent API calls"""
         url = f"{self.base_url}/api/smart-id"
@@ -250,38 +258,44 @@ class CTVCrawler:
         today = datetime.now().date()
         date_range = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
         
-        for channel in channels:
-            channel_name = channel["name"]
-            hub = channel["hub"]
-            channel_code = channel["channel_code"]
-            
-            logger.info(f"Processing channel: {channel_name} ({channel_code})")
-            
-            channel_schedules = []
-            for start_date in date_range:
-                # Add a small delay to avoid rate limiting
-                time.sleep(0.5)
+        try:
+            for channel in channels:
+                channel_name = channel["name"]
+                hub = channel["hub"]
+                channel_code = channel["channel_code"]
                 
-                # Get schedule for this date
-                listings = self.get_channel_schedule(hub, channel_code, start_date, start_date, timezone)
-                if listings:
-                    channel_schedules.extend(listings)
-            
-            all_schedules[channel_name] = channel_schedules
+                logger.info(f"Processing channel: {channel_name} ({channel_code})")
+                
+                channel_schedules = []
+                for start_date in date_range:
+                    # Add a small delay to avoid rate limiting
+                    time.sleep(0.5)
+                    
+                    # Get schedule for this date
+                    listings = self.get_channel_schedule(hub, channel_code, start_date, start_date, timezone)
+                    if listings:
+                        channel_schedules.extend(listings)
+                
+                all_schedules[channel_name] = channel_schedules
+                
+                # Save data incrementally to avoid data loss in case of failure.
+                # The writer serializes later, so hand it a snapshot of the dict.
+                self.save_data(dict(all_schedules), f"ctv_schedules_partial_{len(all_schedules)}.json")
             
-            # Save data incrementally to avoid data loss in case of failure
-            self.save_data(all_schedules, f"ctv_schedules_partial_{len(all_schedules)}.json")
-        
-        # Save complete data
-        self.save_data(all_schedules, "ctv_schedules_complete.json")
+            # Save complete data
+            self.save_data(all_schedules, "ctv_schedules_complete.json")
+        finally:
+            try:
+                self.writer.close()
+            except Exception as e:
+                logger.error(f"Error flushing schedule data: {e}")
         return all_schedules
     
     def save_data(self, data, filename):
-        """Save data to a JSON file"""
+        """Queue data to be written to a JSON file"""
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Data saved to {filename}")
+            self.writer.write_json(filename, data)
+            logger.info(f"Data queued for {filename}")
         except Exception as e:
             logger.error(f"Error saving data to {filename}: {e}")
 
@@ -1,17 +1,21 @@
 import requests
-import json
 import os
-import time
+import sys
 import logging
-from urllib.parse import urljoin, urlparse, parse_qs
 import random
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils.metrics import endpoint_template
+from crawler_utils.output import OutputWriter
+from crawler_utils.retry import RetryPolicy
+from crawler_utils.seen_set import SeenSet, default_seen_path
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class HotstarCrawler:
-    def __init__(self):
+    def __init__(self, skip_crawled_days=0):
         self.base_url = "https://www.hotstar.com"
         self.api_base_url = "https://www.hotstar.com/api/internal/bff/v2"
         self.headers = {
@@ -25,13 +29,21 @@ class HotstarCrawler:
             "x-hs-usertoken": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJhcHBJZCI6IiIsImF1ZCI6InVtX2FjY2VzcyIsImV4cCI6MTc0OTU1MzQ1MSwiaWF0IjoxNzQ5NDY3MDUxLCJpc3MiOiJUUyIsImp0aSI6IjhmMWJhOTNmNTMxYjRmOTJhOWJiODNlNDE3MzRmNmFlIiwic3ViIjoie1wiaElkXCI6XCJlZmRlM2IzYjA1Nzg0MGE3ODIzNDdmZWNkYTE5YjM5N1wiLFwicElkXCI6XCJmODJjNWM4MjhmOTQ0ZDdkOTgzMjI4MjFiNDFlYjRmZFwiLFwiZHdIaWRcIjpcIjdiODVhZWE1NzI0NTNkMjJkMTVkZWFiOGVkODA5OWY5N2Y2MmI4YzE2ZWZmYTQwMDQ1YzEwOGM3NGQ3YjI4NGRcIixcImR3UGlkXCI6XCI0MjY4MTEwYjc2NjA4ZTIxZTA0OTRlMzQxZGFhMDg5MjE2ZmRjNDc4ZGM5NTQ0NTg4OWUwNmU5MTIxYjg2ZGViXCIsXCJvbGRIaWRcIjpcImVmZGUzYjNiMDU3ODQwYTc4MjM0N2ZlY2RhMTliMzk3XCIsXCJvbGRQaWRcIjpcImY4MmM1YzgyOGY5NDRkN2Q5ODMyMjgyMWI0MWViNGZkXCIsXCJpc1BpaVVzZXJNaWdyYXRlZFwiOmZhbHNlLFwibmFtZVwiOlwiWW91XCIsXCJpcFwiOlwiMjAzLjE5OS41Ny45OFwiLFwiY291bnRyeUNvZGVcIjpcImluXCIsXCJjdXN0b21lclR5cGVcIjpcIm51XCIsXCJ0eXBlXCI6XCJndWVzdFwiLFwiaXNFbWFpbFZlcmlmaWVkXCI6ZmFsc2UsXCJpc1Bob25lVmVyaWZpZWRcIjpmYWxzZSxcImRldmljZUlkXCI6XCIzNjIzYjEtMjBkNzUzLTNjYzI5Yy0xMWJiMzJcIixcInByb2ZpbGVcIjpcIkFEVUxUXCIsXCJ2ZXJzaW9uXCI6XCJ2MlwiLFwic3Vic2NyaXB0aW9uc1wiOntcImluXCI6e319LFwiaXNzdWVkQXRcIjoxNzQ5NDY3MDUxNzkzLFwiZHBpZFwiOlwiZjgyYzVjODI4Zjk0NGQ3ZDk4MzIyODIxYjQxZWI0ZmRcIixcInN0XCI6MSxcImRhdGFcIjpcIkNnUUlBRElBQ2dRSUFDb0FDZ1FJQUJJQUNnUUlBRG9BQ2dRSUFFSUFDZ3dJQUNJSWtBSDk3ZktpOVRJPVwifSIsInZlcnNpb24iOiIxXzAifQ.CAIHUw9TelTQ1wn4aUz4Myahhkk5A9ihbC9r0qwuez0"
         }
         self.results_dir = "../results_claude3.7/hotstar"
-        self.processed_content_ids = set()
-        self.processed_trays = set()
+        # Content IDs and trays seen in this run, persisted so content crawled
+        # within skip_crawled_days by an earlier run is not fetched again
+        self.seen = SeenSet(default_seen_path("hotstar_claude37"))
+        self.skip_crawled_days = skip_crawled_days
         self.country = "in"
         
         # Create results directory if it doesn't exist
         os.makedirs(self.results_dir, exist_ok=True)
         
+        # Background writer so saving responses does not block the next request
+        self.writer = OutputWriter()
+        
+        # Jittered retries within a budget, failing fast while an endpoint is down
+        self.retry_policy = RetryPolicy(max_attempts=3)
+        
     def _generate_request_id(self):
         """Generate a random request ID in the format used by Hotstar"""
         parts = []
@@ -50,29 +62,22 @@ class HotstarCrawler:
         """Make a request to the API with error handling and rate limiting"""
         self._update_request_headers()
         
-        max_retries = 3
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            try:
-                response = requests.get(url, headers=self.headers, params=params)
-                response.raise_for_status()
-                return response.json()
-            except requests.exceptions.RequestException as e:
-                retry_count += 1
-                wait_time = 2 ** retry_count  # Exponential backoff
-                logger.error(f"Request failed: {e}. Retrying in {wait_time} seconds... (Attempt {retry_count}/{max_retries})")
-                time.sleep(wait_time)
-        
-        logger.error(f"Failed to make request to {url} after {max_retries} attempts")
-        return None
+        try:
+            response = self.retry_policy.call(
+                endpoint_template(url),
+                lambda: requests.get(url, headers=self.headers, params=params)
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to make request to {url}: {e}")
+            return None
     
     def save_to_json(self, data, filename):
         """Save data to a JSON file"""
         filepath = os.path.join(self.results_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        logger.info(f"Saved data to {filepath}")
+        self.writer.write_json(filepath, data)
+        logger.info(f"Queued data for {filepath}")
     
     def extract_content_from_widget(self, widget):
         """Extract content items from a widget"""
@@ -258,9 +263,7 @@ class HotstarCrawler:
                     tray_data = widget.get("data", {})
                     tray_id = tray_data.get("tray_id", "")
                     
-                    if tray_id and tray_id not in self.processed_trays:
-                        self.processed_trays.add(tray_id)
-                        
+                    if tray_id and self.seen.add(f"tray:{tray_id}"):
                         tray = {
                             "title": tray_data.get("title", ""),
                             "tray_id": tray_id,
@@ -300,7 +303,6 @@ class HotstarCrawler:
             return
         
         tray_type = parts[0]
-        tray_code = parts[1]
         
         # Determine subcategory based on tray_type
         subcategory_mapping = {
@@ -417,10 +419,12 @@ class HotstarCrawler:
         content_id = content_item.get("content_id")
         content_type = content_item.get("content_type", "")
         
-        if not content_id or content_id in self.processed_content_ids:
+        if not content_id or not self.seen.add(content_id):
             return
         
-        self.processed_content_ids.add(content_id)
+        if self.skip_crawled_days and self.seen.crawled_within(content_id, self.skip_crawled_days * 86400):
+            logger.info(f"Skipping content crawled in the last {self.skip_crawled_days} days: {content_id}")
+            return
         
         # Map content_type to API path
         content_type_mapping = {
@@ -472,6 +476,7 @@ class HotstarCrawler:
             logger.error(f"Error extracting details for content {content_id}: {e}")
         
         self.save_to_json(content_details, f"details_{content_id}.json")
+        self.seen.mark_crawled(content_id)
     
     def process_show_seasons(self, show_details):
         """Process seasons and episodes of a TV show"""
@@ -479,14 +484,11 @@ class HotstarCrawler:
         seasons = show_details.get("seasons", [])
         
         for season in seasons:
-            season_num = season.get("season_num")
             episodes = season.get("episodes", [])
             
             for episode in episodes:
                 episode_id = episode.get("content_id")
-                if episode_id and episode_id not in self.processed_content_ids:
-                    self.processed_content_ids.add(episode_id)
-                    
+                if episode_id and self.seen.add(episode_id):
                     # Process the episode to get more details
                     episode_item = {
                         "content_id": episode_id,
@@ -517,7 +519,12 @@ class HotstarCrawler:
         logger.info("Starting Hotstar crawler")
         
         # Start with the homepage
-        home_data = self.crawl_home()
+        try:
+            home_data = self.crawl_home()
+        finally:
+            # Wait for the queued files to reach the disk
+            self.writer.close()
+            self.seen.close()
         
         logger.info("Crawling completed")
         return home_data
@@ -1,11 +1,18 @@
 import os
-import json
+import sys
 import time
 import requests
 from datetime import datetime, timedelta
 import re
 from bs4 import BeautifulSoup
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils import serialization
+from crawler_utils.hierarchy import HierarchyIndex
+from crawler_utils.output import OutputWriter
+from crawler_utils.records import Airing
+from crawler_utils.tv_guide import TvGuide
+
 class YleAreenaCrawler:
     def __init__(self):
         self.base_url = "https://areena.yle.fi"
@@ -32,6 +39,8 @@ class YleAreenaCrawler:
         self.build_id = None
         self.output_dir = "../results_claude3.7/yle"
         os.makedirs(self.output_dir, exist_ok=True)
+        # Channel -> show -> episodes index, updated as schedules come in
+        self.hierarchy = HierarchyIndex(os.path.join(self.output_dir, "yle_hierarchical.json"))
         
     def get_build_id(self):
         """Extract the build_id from the main page HTML"""
@@ -75,11 +84,14 @@ class YleAreenaCrawler:
         
         response = requests.get(url, headers=headers, cookies=self.cookies)
         if response.status_code == 200:
-            data = response.json()
-            # Extract dates from the navigation elements
-            # For simplicity, we'll use the current date and a few days before/after
+            # Use the dates the guide navigates to within a few days of today,
+            # and only the channels it has schedules for
             today = datetime.now()
             dates = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(-3, 4)]
+            guide = TvGuide.from_next_data(response.json())
+            if guide.dates and guide.channels:
+                self.channels = guide.channels
+                dates = [date for date in guide.dates if dates[0] <= date <= dates[-1]]
             return dates
         
         raise Exception(f"Failed to get available dates: {response.status_code}")
@@ -133,14 +145,14 @@ class YleAreenaCrawler:
             elif label.get("type") == "broadcastEndDate" and label.get("raw"):
                 end_time = label["raw"]
         
-        return {
-            "id": program_id,
-            "title": program.get("title", ""),
-            "description": program.get("description", ""),
-            "start_time": start_time,
-            "end_time": end_time,
-            "raw_data": program
-        }
+        return Airing(
+            id=program_id,
+            title=program.get("title", ""),
+            description=program.get("description", ""),
+            start_time=start_time,
+            end_time=end_time,
+            raw_data=program
+        )
     
     def crawl(self):
         """Main crawling function"""
@@ -152,73 +164,68 @@ class YleAreenaCrawler:
         dates = self.get_available_dates()
         print(f"Available dates: {dates}")
         
+        # Index schedules saved before the incremental index existed
+        self.seed_hierarchy()
+        
         # Structure to hold all data
         all_data = {}
+        writer = OutputWriter()
         
-        # For each date and channel, get the schedule
-        for date in dates:
-            print(f"Processing date: {date}")
-            date_data = {}
-            
-            for channel in self.channels:
-                print(f"  Processing channel: {channel}")
-                programs = self.get_channel_schedule(channel, date)
+        try:
+            # For each date and channel, get the schedule
+            for date in dates:
+                print(f"Processing date: {date}")
+                date_data = {}
+                
+                for channel in self.channels:
+                    print(f"  Processing channel: {channel}")
+                    programs = self.get_channel_schedule(channel, date)
+                    
+                    # Process programs
+                    processed_programs = []
+                    for program in programs:
+                        details = self.extract_program_details(program)
+                        processed_programs.append(details)
+                    
+                    date_data[channel] = processed_programs
+                    self.hierarchy.add(channel, date, processed_programs)
                 
-                # Process programs
-                processed_programs = []
-                for program in programs:
-                    details = self.extract_program_details(program)
-                    processed_programs.append(details)
+                all_data[date] = date_data
                 
-                date_data[channel] = processed_programs
-            
-            all_data[date] = date_data
+                # Queue data for this date while the next date is fetched
+                writer.write_json(os.path.join(self.output_dir, f"yle_schedule_{date}.json"), date_data)
             
-            # Save data for this date
-            with open(os.path.join(self.output_dir, f"yle_schedule_{date}.json"), 'w', encoding='utf-8') as f:
-                json.dump(date_data, f, ensure_ascii=False, indent=2)
-        
-        # Save all data
-        with open(os.path.join(self.output_dir, "yle_all_schedules.json"), 'w', encoding='utf-8') as f:
-            json.dump(all_data, f, ensure_ascii=False, indent=2)
+            # Save all data
+            writer.write_json(os.path.join(self.output_dir, "yle_all_schedules.json"), all_data)
+        finally:
+            writer.close()
         
         # Create a hierarchical structure by genre/show/episodes
         self.organize_by_genre()
     
+    def seed_hierarchy(self):
+        """Index the yle_schedule_*.json files of earlier crawls if the index does not exist yet"""
+        if self.hierarchy.exists():
+            return
+        for filename in sorted(os.listdir(self.output_dir)):
+            if filename.startswith("yle_schedule_") and filename.endswith(".json"):
+                date = filename.replace("yle_schedule_", "").replace(".json", "")
+                date_data = serialization.read_json(os.path.join(self.output_dir, filename))
+                for channel, programs in date_data.items():
+                    self.hierarchy.add(channel, date, programs)
+    
     def organize_by_genre(self):
         """Organize the data by genre/show/episodes"""
         # This is a simplified approach since the API doesn't directly provide genre information
-        # We'll use the channel as a top-level category and group by show title
-        
-        # Load all schedule data
-        all_schedules = {}
-        for filename in os.listdir(self.output_dir):
-            if filename.startswith("yle_schedule_") and filename.endswith(".json"):
-                with open(os.path.join(self.output_dir, filename), 'r', encoding='utf-8') as f:
-                    date = filename.replace("yle_schedule_", "").replace(".json", "")
-                    all_schedules[date] = json.load(f)
-        
-        # Organize by channel (genre) -> show -> episodes
-        hierarchical_data = {}
-        
-        for date, date_data in all_schedules.items():
-            for channel, programs in date_data.items():
-                if channel not in hierarchical_data:
-                    hierarchical_data[channel] = {}
-                
-                for program in programs:
-                    title = program.get("title", "Unknown")
-                    if title not in hierarchical_data[channel]:
-                        hierarchical_data[channel][title] = []
-                    
-                    # Add date information to the episode
-                    episode = program.copy()
-                    episode["broadcast_date"] = date
-                    hierarchical_data[channel][title].append(episode)
-        
-        # Save hierarchical data
-        with open(os.path.join(self.output_dir, "yle_hierarchical.json"), 'w', encoding='utf-8') as f:
-            json.dump(hierarchical_data, f, ensure_ascii=False, indent=2)
+        # We use the channel as a top-level category and group by show title.
+        # Episodes are indexed incrementally during the crawl. The delta log is
+        # only folded into yle_hierarchical.json once it passes the size
+        # threshold, so read the current index through load_hierarchy().
+        self.hierarchy.flush()
+    
+    def load_hierarchy(self):
+        """Return the channel -> show -> episodes index, including crawls not yet compacted"""
+        return self.hierarchy.load()
 
 if __name__ == "__main__":
     crawler = YleAreenaCrawler()
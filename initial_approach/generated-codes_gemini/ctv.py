@@ -1,9 +1,14 @@
+import os
+import sys
 import requests
 import json
 from datetime import datetime, timedelta
 import pytz # A robust library for timezone calculations
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils import serialization
+
 class CTVCrawler:
     """
     A crawler to extract TV schedule data from CTV's APIs based on the
@@ -186,8 +191,7 @@ if __name__ == '__main__':
     if final_schedule_data:
         # Save to a file for easier inspection
         output_filename = "ctv_schedule.json"
-        with open(output_filename, "w", encoding="utf-8") as f:
-            json.dump(final_schedule_data, f, indent=2, ensure_ascii=False)
+        serialization.write_json(output_filename, final_schedule_data)
         print(f"Successfully saved all schedule data to '{output_filename}'")
     else:
         print("No data was crawled. Please check the script and API status.")
\ No newline at end of file
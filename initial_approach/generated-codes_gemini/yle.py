@@ -1,9 +1,13 @@
+import os
+import sys
 import requests
-import json
 import re
 from datetime import datetime, timedelta
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from crawler_utils import serialization
+
 class YLEAreenaCrawler:
     """
     A crawler to extract TV schedule data from YLE Areena's APIs,
@@ -214,8 +218,7 @@ if __name__ == '__main__':
         if crawled_data:
             # Save to a file for easier inspection
             output_filename = "../results/yle_areena_schedule.json"
-            with open(output_filename, "w", encoding="utf-8") as f:
-                json.dump(crawled_data, f, indent=2, ensure_ascii=False)
+            serialization.write_json(output_filename, crawled_data)
             print(f"Successfully saved all schedule data to '{output_filename}'")
         else:
             print("No data was crawled. Please check the script and API status.")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import sys
 import boto3
 import configparser
 from langchain_aws.chat_models import ChatBedrock
@@ -11,6 +12,15 @@ import subprocess
 import json
 from typing import Tuple
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from codegen_utils.build_cache import BuildCache, build_key
+from codegen_utils.patching import PatchError, apply_patch, build_patch_prompt
+
+MODEL_ID = "arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# Bump when a change to this script should invalidate every cached build
+GENERATOR_VERSION = "initial-langchain-1"
+
 # --- Configuration and Setup ---
 # This section remains the same as your original code for setting up AWS,
 # Bedrock, and loading API documentation/credentials.
@@ -44,7 +54,7 @@ def setup_bedrock_llm():
     )
 
     llm = ChatBedrock(
-        model_id="arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+        model_id=MODEL_ID,
         client=bedrock_runtime,
         provider="anthropic",
         model_kwargs={
@@ -191,6 +201,16 @@ def main():
         """)
     ])
     
+    # Skip generation when the same inputs already produced an untouched, validated script
+    build_cache = BuildCache()
+    prompt_templates = "\n".join(
+        message.content for template in (initial_prompt, feedback_prompt) for message in template.messages
+    )
+    cache_key = build_key(yle_file, prompt_templates, MODEL_ID, GENERATOR_VERSION)
+    if build_cache.is_fresh("initial:yle", cache_key):
+        print(f"Inputs unchanged since the last validated build, keeping {final_code_path}")
+        return
+
     # 3. The Generation and Validation Loop
     max_attempts = 3
     generated_code = ""
@@ -207,20 +227,28 @@ def main():
                 api_docs=yle_file
             )
         else:
-            print("Regenerating code based on feedback...")
-            prompt = feedback_prompt.format_messages(
-                previous_code=generated_code,
-                feedback=feedback
-            )
-            
-        response = llm.invoke(prompt)
-        generated_code = response.content.strip()
-
-        # Remove markdown fences if the LLM includes them
-        if generated_code.startswith("```python"):
-            generated_code = generated_code[9:]
-        if generated_code.endswith("```"):
-            generated_code = generated_code[:-3]
+            # Ask for just the fix first; regenerate the whole script only if it cannot be applied
+            print("Requesting a patch based on feedback...")
+            response = llm.invoke([HumanMessage(content=build_patch_prompt(generated_code, feedback))])
+            try:
+                generated_code = apply_patch(generated_code, response.content)
+                prompt = None
+            except PatchError as e:
+                print(f"Patch could not be applied ({e}), regenerating code based on feedback...")
+                prompt = feedback_prompt.format_messages(
+                    previous_code=generated_code,
+                    feedback=feedback
+                )
+
+        if prompt is not None:
+            response = llm.invoke(prompt)
+            generated_code = response.content.strip()
+
+            # Remove markdown fences if the LLM includes them
+            if generated_code.startswith("```python"):
+                generated_code = generated_code[9:]
+            if generated_code.endswith("```"):
+                generated_code = generated_code[:-3]
         
         print("--- 🧪 Running Validations ---")
         
@@ -240,6 +268,7 @@ def main():
 
         # If all tests pass
         print("\n--- ✅ All Validations Passed! ---")
+        feedback = ""
         break
     
     # 4. Final Output
@@ -253,6 +282,8 @@ def main():
     print(f"Saving final code to: {final_code_path}")
     with open(final_code_path, "w") as f:
         f.write(generated_code)
+    if not feedback:
+        build_cache.record("initial:yle", cache_key, [final_code_path])
     
     print("\nFinal Code:")
     print("-" * 20)
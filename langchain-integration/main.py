@@ -2,8 +2,7 @@
 # This script is compatible with Python 3.9 and higher.
 #
 import os
-import hashlib
-import json
+import sys
 import logging
 import configparser
 import boto3
@@ -21,6 +20,14 @@ from langchain.memory import ConversationSummaryBufferMemory
 # Pydantic for custom tool validation
 from pydantic import BaseModel, Field
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from codegen_utils.build_cache import BuildCache, build_key
+
+MODEL_ID = "arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# Bump when a change to this generator should invalidate every cached build
+GENERATOR_VERSION = "langchain-agent-1"
+
 # --- LangSmith and AWS Configuration ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -63,7 +70,7 @@ def initialize_llm():
     # Initialize the ChatBedrock model
     # Using the standard foundation model ID for Claude 3 Sonnet.
     llm = ChatBedrock(
-        model_id="arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+        model_id=MODEL_ID,
         client=bedrock_runtime,
         model_kwargs={
             "max_tokens": 4096,
@@ -115,36 +122,7 @@ class APICrawlerAgentGenerator:
         self.llm = llm
         self.code_file_path = os.path.join(self.GENERATED_CODE_DIR, f"{self.website_name}_crawler.py")
         os.makedirs(self.GENERATED_CODE_DIR, exist_ok=True)
-
-    def _load_hashes(self) -> dict:
-        if not os.path.exists(self.HASH_STORE_FILE):
-            return {}
-        try:
-            with open(self.HASH_STORE_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-
-    def _save_hash(self, file_hash: str):
-        hashes = self._load_hashes()
-        hashes[self.website_name] = file_hash
-        with open(self.HASH_STORE_FILE, 'w') as f:
-            json.dump(hashes, f, indent=4)
-
-    def _get_file_hash(self, file_path: str) -> str:
-        sha256_hash = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
-
-    def _is_code_modified(self) -> bool:
-        if not os.path.exists(self.code_file_path):
-            return False
-        stored_hash = self._load_hashes().get(self.website_name)
-        if not stored_hash:
-            return True
-        return self._get_file_hash(self.code_file_path) != stored_hash
+        self.build_cache = BuildCache(self.HASH_STORE_FILE)
 
     def generate(self):
         """
@@ -152,20 +130,7 @@ class APICrawlerAgentGenerator:
         """
         logging.info(f"--- Starting Agent-based generator for '{self.website_name}' ---")
 
-        if os.path.exists(self.code_file_path) and not self._is_code_modified():
-            logging.info("✅ Code already exists and is unmodified. No action needed.")
-            return
-
-        # 1. Define the tools for the agent
-        tools = [
-            PythonREPLTool(),
-            WriteCodeToFileTool()
-        ]
-
-        # 2. Pull the base prompt from LangChain Hub
-        base_prompt = hub.pull("hwchase17/react-chat")
-
-        # 3. Engineer the instructions for our specific task
+        # 1. Engineer the instructions for our specific task
         instructions = f"""
         You are an expert Python developer specializing in building API crawlers. Your primary goal is to write a complete, runnable Python script to crawl an API based on the provided documentation.
 
@@ -185,6 +150,22 @@ class APICrawlerAgentGenerator:
 
         Begin now. The user has provided the API documentation.
         """
+
+        # Skip the agent when the same inputs already produced the current, unmodified code
+        cache_key = build_key(self.api_docs, instructions, MODEL_ID, GENERATOR_VERSION)
+        if self.build_cache.is_fresh(self.website_name, cache_key):
+            logging.info("✅ Code already exists and its inputs are unchanged. No action needed.")
+            return
+
+        # 2. Define the tools for the agent
+        tools = [
+            PythonREPLTool(),
+            WriteCodeToFileTool()
+        ]
+
+        # 3. Pull the base prompt from LangChain Hub
+        base_prompt = hub.pull("hwchase17/react-chat")
+
         prompt = base_prompt.partial(instructions=instructions)
 
         # 4. Create the Agent
@@ -209,11 +190,10 @@ class APICrawlerAgentGenerator:
 
         agent_executor.invoke({"input": task})
 
-        # 6. Verify and store hash
+        # 6. Verify and record the build
         if os.path.exists(self.code_file_path):
-            new_hash = self._get_file_hash(self.code_file_path)
-            self._save_hash(new_hash)
-            logging.info(f"✅ Agent finished. Stored new code hash for '{self.website_name}'.")
+            self.build_cache.record(self.website_name, cache_key, [self.code_file_path])
+            logging.info(f"✅ Agent finished. Recorded the build of '{self.website_name}'.")
         else:
             logging.error("❌ Agent finished but failed to create the output file.")
 
@@ -1,10 +1,16 @@
 import requests
-import json
 import os
 import re
+import sys
 from datetime import datetime, timedelta
-import time
-from urllib.parse import quote
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_utils.changelog import ChangeLog
+from crawler_utils.dedup import ScheduleAliases, collapse, content_hash
+from crawler_utils.freshness import FreshnessScheduler, default_freshness_path
+from crawler_utils.http_client import HttpClient
+from crawler_utils.metrics import get_metrics
+from crawler_utils.output import OutputWriter
 
 class CTVCrawler:
     def __init__(self):
@@ -22,6 +28,17 @@ class CTVCrawler:
         }
         self.smart_id = None
         self.channel_mapping = self._get_channel_mapping()
+        # Request, sleep, parse and write timings for the run report
+        self.metrics = get_metrics()
+        self.http = HttpClient(metrics=self.metrics)
+        self.writer = OutputWriter(metrics=self.metrics)
+        # Per (feed, date) revisit intervals learned from earlier crawls
+        self.freshness = FreshnessScheduler(default_freshness_path("ctv"))
+        # Insert/update/delete events against the previous crawl
+        self.changelog = ChangeLog("ctv")
+        # Feed aliases learned by the work units this worker has crawled, and the hubs probed for them
+        self.aliases = ScheduleAliases()
+        self.probed_hubs = set()
         
         # Create results directory if it doesn't exist
         if not os.path.exists(self.results_dir):
@@ -117,10 +134,13 @@ class CTVCrawler:
             "$include": "[details]"
         }
         
-        response = requests.get(url, headers=self.headers, params=params)
+        response = self.http.get(
+            url, headers=self.headers, params=params,
+            endpoint="capi.9c9media.com/destinations/{hub}/platforms/atexace/channelaffiliates/{code}/schedules",
+        )
         
         if response.status_code == 200:
-            return response.json()
+            return self.http.json(response)
         else:
             print(f"Failed to get schedule for {channel_name}. Status code: {response.status_code}")
             return None
@@ -131,10 +151,8 @@ class CTVCrawler:
             print(f"No items found in data for {channel_name}")
             return
             
-        # Create channel directory
+        # Directories are created by the writer the first time they are used
         channel_dir = os.path.join(self.results_dir, self.sanitize_filename(channel_name))
-        if not os.path.exists(channel_dir):
-            os.makedirs(channel_dir)
             
         # Process each item in the schedule
         for item in data["Items"]:
@@ -147,8 +165,6 @@ class CTVCrawler:
                 episode_title = item.get("Title", f"Episode_{item.get('EpisodeNumber', 'Unknown')}")
                 
                 show_dir = os.path.join(channel_dir, self.sanitize_filename(show_name))
-                if not os.path.exists(show_dir):
-                    os.makedirs(show_dir)
                 
                 # Add timestamp to ensure uniqueness for episodes with same title
                 timestamp = item.get("StartTime", "").replace(":", "-").replace("+", "_plus_")
@@ -158,8 +174,6 @@ class CTVCrawler:
             elif entity_type == "Movie":
                 # Movies - save directly in movies folder
                 movie_dir = os.path.join(channel_dir, "movies")
-                if not os.path.exists(movie_dir):
-                    os.makedirs(movie_dir)
                 
                 movie_title = item.get("Name", "Unknown_Movie")
                 # Add timestamp to ensure uniqueness
@@ -170,8 +184,6 @@ class CTVCrawler:
             else:
                 # Other content types
                 content_dir = os.path.join(channel_dir, self.sanitize_filename(sub_type))
-                if not os.path.exists(content_dir):
-                    os.makedirs(content_dir)
                 
                 content_title = item.get("Name", "Unknown_Content")
                 # Add timestamp to ensure uniqueness
@@ -179,42 +191,158 @@ class CTVCrawler:
                 filename = f"{self.sanitize_filename(content_title)}_{timestamp}.json"
                 filepath = os.path.join(content_dir, filename)
             
-            # Save the item data to file
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(item, f, indent=2)
+            # Queue the item data for the background writer
+            self.writer.write_json(filepath, item)
                 
-            print(f"Saved: {filepath}")
+            print(f"Queued: {filepath}")
+
+        return len(data["Items"])
+
+    def save_schedule_reference(self, channel_name, source_channel, date_str, items):
+        """Record that a channel's schedule for a date is the one saved under source_channel"""
+        channel_dir = os.path.join(self.results_dir, self.sanitize_filename(channel_name))
+        filepath = os.path.join(channel_dir, f"schedule_{date_str}_same_as.json")
+        self.writer.write_json(filepath, {
+            "channel": channel_name,
+            "date": date_str,
+            "same_as": source_channel,
+            "items": items,
+        })
+        print(f"Queued: {filepath} (same schedule as {source_channel})")
+
+    def feed_groups(self, channel_names=None):
+        """Collapse channels that request the same (hub, code) feed into one group each"""
+        channel_names = channel_names or list(self.channel_mapping)
+        return collapse(
+            (name, (self.channel_mapping[name]["hub"], self.channel_mapping[name]["code"]))
+            for name in channel_names
+        )
+
+    def crawl_date(self, groups, date_str, aliases, probe=False):
+        """
+        Fetch every distinct feed once for a date and fan the result out to its channels.
+
+        On the probe date every feed is fetched and feeds whose schedules hash
+        identically are learned as aliases; on later dates an alias is not
+        fetched at all and its channels reference the leader's files instead.
+        Feeds fetched recently enough for their distance from today are
+        skipped; their files from the earlier crawl stay in place. An alias
+        served by reference is recorded as fetched with the leader's content,
+        so a later run that skips the probe date does not refetch it.
+        Returns the number of schedule items covered.
+        """
+        saved_under = {}
+        covered = 0
+        for group in groups:
+            unit_key = f"ctv:{group.key[0]}:{group.key[1]}:{date_str}"
+            leader = None if probe else aliases.leader(group.key)
+            if leader in saved_under:
+                source, items, digest = saved_under[leader]
+                for channel_name in group.members:
+                    self.save_schedule_reference(channel_name, source, date_str, items)
+                self.freshness.record(unit_key, date_str, digest)
+                covered += items
+                continue
+
+            primary = group.members[0]
+            if not self.freshness.is_due(unit_key, date_str):
+                print(f"  Skipping {primary} on {date_str}: fetched recently")
+                continue
+
+            schedule_data = self.get_channel_schedule(primary, date_str, date_str)
+            if not schedule_data:
+                print(f"  No data available for {primary} on {date_str}")
+                continue
+
+            items = len(schedule_data.get("Items", []))
+            digest = content_hash(schedule_data.get("Items", []))
+            self.freshness.record(unit_key, date_str, digest)
+            self.changelog.capture(
+                f"{primary}/{date_str}",
+                schedule_data.get("Items", []),
+                lambda item: item.get("StartTime") and f"{primary}:{item['StartTime']}",
+            )
+            match = aliases.observe(date_str, group.key, digest) if probe else None
+            if match in saved_under:
+                source = saved_under[match][0]
+                members = group.members
+            else:
+                self.save_schedule_data(primary, schedule_data)
+                saved_under[group.key] = (primary, items, digest)
+                source = primary
+                members = group.members[1:]
+            for channel_name in members:
+                self.save_schedule_reference(channel_name, source, date_str, items)
+            covered += items
+
+            # Be nice to the API
+            self.metrics.sleep(1)
+        return covered
+
+    def work_units(self, days_back=7):
+        """
+        Return one sharding work unit per (hub, date) pair as (key, payload) pairs.
+
+        A hub's feeds stay together within a date so crawl_date() can dedupe
+        affiliates that carry identical schedules, while its dates spread
+        over the workers like the per-date unit keys of crawl_date().
+        """
+        hubs = {}
+        for group in self.feed_groups():
+            hubs.setdefault(group.key[0], []).extend(group.members)
+        today = datetime.now()
+        # Today first, as in crawl_schedules()
+        dates = [(today - timedelta(days=day_offset)).strftime("%Y-%m-%d") for day_offset in range(days_back + 1)]
+        return [
+            (f"ctv:{hub}:{date_str}", {"hub": hub, "channels": channels, "date": date_str})
+            for date_str in dates
+            for hub, channels in hubs.items()
+        ]
+
+    def crawl_unit(self, unit):
+        """Crawl a single work unit produced by work_units()"""
+        if self.smart_id is None:
+            self.get_smart_id()
+        hub = unit["hub"]
+        print(f"\nCrawling data for feeds of {hub} on {unit['date']}")
+        groups = self.feed_groups(unit["channels"])
+        # The first unit of a hub on this worker fetches every feed to learn its
+        # aliases; the hub's later units on this worker fetch only the leaders
+        probe = hub not in self.probed_hubs
+        items = self.crawl_date(groups, unit["date"], self.aliases, probe=probe)
+        self.probed_hubs.add(hub)
+        return {"items": items}
+
+    def close(self):
+        """Wait for the queued files to reach the disk and close the crawl state databases"""
+        self.writer.close()
+        self.freshness.close()
+        self.changelog.close()
 
     def crawl_schedules(self, days_back=7):
         """Crawl TV schedules for the specified number of days back"""
         # Get API keys
         self.get_smart_id()
         
-        # Get today's date
+        groups = self.feed_groups()
+        print(f"{len(self.channel_mapping)} channels share {len(groups)} distinct feeds")
+        aliases = ScheduleAliases()
         today = datetime.now()
         
-        # For each channel in our mapping
-        for channel_name in self.channel_mapping:
-            print(f"\nCrawling data for channel: {channel_name}")
-            
-            # For each day in the range
-            for day_offset in range(days_back, -1, -1):
-                target_date = today - timedelta(days=day_offset)
-                date_str = target_date.strftime("%Y-%m-%d")
-                
-                print(f"  Getting schedule for {date_str}")
-                
-                # Get schedule data
-                schedule_data = self.get_channel_schedule(channel_name, date_str, date_str)
-                
-                if schedule_data:
-                    # Save the data
-                    self.save_schedule_data(channel_name, schedule_data)
-                    
-                    # Be nice to the API
-                    time.sleep(1)
-                else:
-                    print(f"  No data available for {channel_name} on {date_str}")
+        try:
+            # Date by date, so the first date can reveal affiliates that carry identical schedules.
+            # Today comes first since it is revisited most often; older dates are mostly still fresh.
+            for index, day_offset in enumerate(range(days_back + 1)):
+                date_str = (today - timedelta(days=day_offset)).strftime("%Y-%m-%d")
+                print(f"\nCrawling schedules for {date_str}")
+                self.crawl_date(groups, date_str, aliases, probe=index == 0)
+                if index == 0 and aliases.aliases:
+                    print(f"Feeds with identical schedules, fetched once from now on: {aliases.aliases}")
+        finally:
+            # Make sure every queued file reaches the disk
+            self.close()
+            json_path, _ = self.metrics.export("ctv")
+            print(f"Metrics written to {json_path}")
 
 def main():
     crawler = CTVCrawler()
@@ -1,17 +1,24 @@
 import os
+import sys
 import ast
-import json
+import time
 from typing import TypedDict, List
-from unittest.mock import patch, mock_open, MagicMock
 import boto3
 import configparser
 from langchain_aws.chat_models import ChatBedrock
-from langchain_core.messages import HumanMessage
 from botocore.config import Config
 
 # from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from codegen_utils.build_cache import BuildCache, build_key
+from codegen_utils.candidates import DEFAULT_VARIANTS, generate_candidates
+from codegen_utils.patching import PatchError, apply_patch, build_patch_prompt
+from codegen_utils.sandbox import mocked_exec, run_sandboxed
+from codegen_utils.streaming import stream_code
+from crawler_utils import serialization
+
 # --- 1. Define the State for the Graph ---
 # This dictionary carries data between the nodes.
 
@@ -26,6 +33,10 @@ class GraphState(TypedDict):
         test_error: Error message from the testing/validation phase. None otherwise.
         max_retries: The maximum number of retries to prevent infinite loops.
         current_retry: The current attempt number.
+        trace: Wall time and outcome of every node run, in order.
+        llm_calls: Latency and token counts of every LLM call, in order.
+        candidates: Number of generations to run in parallel per full generation (1 = sequential).
+        strategy: "first" to keep the first passing candidate, "best" to wait for all of them.
     """
     prompt: str
     generated_code: str
@@ -33,26 +44,71 @@ class GraphState(TypedDict):
     test_error: str
     max_retries: int
     current_retry: int
+    trace: List[dict]
+    llm_calls: List[dict]
+    candidates: int
+    strategy: str
 
-# --- 2. Define the Nodes (The Steps in the Flow) ---
+# --- Profiling helpers ---
 
-def generate_code_node(state: GraphState):
+def timed_node(name, node):
     """
-    Node to generate Python code based on the prompt and any previous errors.
+    Wrap a node so every run appends its wall time and outcome to state["trace"].
     """
-    print("--- GENERATING CODE ---")
-    
-    prompt = state["prompt"]
-    retries = state["current_retry"]
-    
-    # Append error feedback to the prompt for self-correction
-    error_feedback = ""
-    if state.get("parse_error"):
-        error_feedback = f"\n\nThe previous attempt failed with a syntax error: {state['parse_error']}. Please fix it."
-    elif state.get("test_error"):
-        error_feedback = f"\n\nThe previous attempt failed during testing: {state['test_error']}. Please fix the logic."
-    
-    full_prompt = f"""
+    def run(state: GraphState):
+        started_at = time.time()
+        start = time.perf_counter()
+        state = node(state)
+        state["trace"] = state.get("trace", []) + [{
+            "node": name,
+            "attempt": state["current_retry"],
+            "started_at": started_at,
+            "wall_seconds": round(time.perf_counter() - start, 3),
+            "parse_error": bool(state.get("parse_error")),
+            "test_error": bool(state.get("test_error")),
+        }]
+        return state
+    return run
+
+def write_trace(state, path="generation_trace.json"):
+    """
+    Write the node trace, LLM calls and a per-node summary of a finished run.
+    """
+    trace = state.get("trace", [])
+    nodes = {}
+    for entry in trace:
+        summary = nodes.setdefault(entry["node"], {"runs": 0, "wall_seconds": 0.0})
+        summary["runs"] += 1
+        summary["wall_seconds"] = round(summary["wall_seconds"] + entry["wall_seconds"], 3)
+
+    llm_calls = state.get("llm_calls", [])
+    report = {
+        "summary": {
+            "wall_seconds": round(sum(entry["wall_seconds"] for entry in trace), 3),
+            "attempts": state["current_retry"],
+            "retries": max(0, state["current_retry"] - 1),
+            "parse_failures": sum(1 for e in trace if e["node"] == "parser" and e["parse_error"]),
+            "test_failures": sum(1 for e in trace if e["node"] == "tester" and e["test_error"]),
+            "patch_calls": sum(1 for call in llm_calls if call.get("mode") == "patch"),
+            "llm_seconds": round(sum(call["total_seconds"] for call in llm_calls), 3),
+            "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in llm_calls),
+            "completion_tokens": sum(call["completion_tokens"] or 0 for call in llm_calls),
+            "nodes": nodes,
+        },
+        "trace": trace,
+        "llm_calls": llm_calls,
+    }
+    serialization.write_json(path, report, pretty=True)
+    return report
+
+# --- 2. Define the Nodes (The Steps in the Flow) ---
+
+MODEL_ID = "arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# Bump when a change to this pipeline should invalidate every cached build
+GENERATOR_VERSION = "langgraph-1"
+
+PROMPT_TEMPLATE = """
     You are an expert Python programmer. Generate a single, self-contained Python script based on this request:
     ---
     {prompt}
@@ -63,6 +119,7 @@ def generate_code_node(state: GraphState):
     - If the data is hierarchical (e.g., shows with episodes), save it as `showname/episode_name.json`.
     - If the data is a flat list (e.g., movies), save it as `movies/movie_title.json`.
     - Sanitize filenames by replacing spaces with underscores and removing special characters.
+    - Write JSON files with `serialization.write_json(path, data)` from the shared `crawler_utils` package instead of `json.dump`. Import it with `sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))` followed by `from crawler_utils import serialization`.
     - The script should define a main function and call it under an `if __name__ == "__main__":` block.
     - Name the crawler code python file as site_name_api_crawler.py
     - Store the Json results in a folder named site_name_results/
@@ -72,6 +129,11 @@ def generate_code_node(state: GraphState):
     Return only the raw Python code, without any markdown formatting (e.g., ```python).
     """
 
+
+def build_llm(temperature=0):
+    """
+    Create the Bedrock chat model used for generation.
+    """
     # llm = ChatOpenAI(model="gpt-4o", temperature=0.2)
 
     os.environ["AWS_SHARED_CREDENTIALS_FILE"] = '~/.aws/credentials'
@@ -106,22 +168,97 @@ def generate_code_node(state: GraphState):
     bedrock_runtime = boto3.client("bedrock-runtime", region_name=region_name, config=config)
 
     llm = ChatBedrock(
-        model_id="arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+        model_id=MODEL_ID,
         client=bedrock_runtime,
         provider="anthropic",
         model_kwargs={
             "max_tokens": 64000,
             "anthropic_version": "bedrock-2023-05-31",
-            "temperature": 0
+            "temperature": temperature
         }
     )
+    return llm
+
+def validate_candidate(code):
+    """
+    Run a candidate through the mocked harness in a child process, so that
+    several candidates can be checked at once.
+    """
+    return run_sandboxed(code, os.path.abspath("generated_api_crawler.py"))
 
-    response = llm.invoke([full_prompt])
+
+def generate_code_node(state: GraphState):
+    """
+    Node to generate Python code based on the prompt and any previous errors.
+    """
+    print("--- GENERATING CODE ---")
+    
+    prompt = state["prompt"]
+    retries = state["current_retry"]
+    
+    # Append error feedback to the prompt for self-correction
+    error_feedback = ""
+    if state.get("parse_error"):
+        error_feedback = f"\n\nThe previous attempt failed with a syntax error: {state['parse_error']}. Please fix it."
+    elif state.get("test_error"):
+        error_feedback = f"\n\nThe previous attempt failed during testing: {state['test_error']}. Please fix the logic."
+    
+    full_prompt = PROMPT_TEMPLATE.format(prompt=prompt, error_feedback=error_feedback)
+
+    llm = build_llm()
+
+    llm_calls = state.get("llm_calls", [])
+    code = None
+    error = state.get("parse_error") or state.get("test_error")
+    previous_code = state.get("generated_code")
+    if error and previous_code and llm_calls and llm_calls[-1]["stop_reason"] == "complete":
+        # The previous code is whole, so ask only for the change and apply it locally
+        result = stream_code(llm, build_patch_prompt(previous_code, error), fenced=True)
+        llm_stats = dict(result.stats, attempt=retries + 1, mode="patch")
+        llm_calls = llm_calls + [llm_stats]
+        print(f"Patch call took {llm_stats['total_seconds']}s (first token after {llm_stats['ttft_seconds']}s)")
+        try:
+            code = apply_patch(previous_code, result.text)
+        except PatchError as e:
+            print(f"Patch could not be applied ({e}), regenerating the full script")
+
+    stream_error = None
+    if code is None and state.get("candidates", 1) > 1:
+        # Generate several candidates at once and keep one that passes the harness
+        winner, candidates = generate_candidates(
+            build_llm, full_prompt, validate_candidate,
+            variants=DEFAULT_VARIANTS[:state["candidates"]], strategy=state.get("strategy", "first"),
+        )
+        llm_calls = llm_calls + [dict(c.stats, attempt=retries + 1, mode="candidate") for c in candidates]
+        for c in candidates:
+            print(f"Candidate '{c.variant.name}': {'passed' if c.error is None else c.error}")
+        if winner is None:
+            # Carry on with a candidate that at least parses, so the retry can patch it
+            complete = [c for c in candidates if c.stats["stop_reason"] == "complete"]
+            winner = complete[0] if complete else candidates[0]
+            stream_error = None if complete else winner.error
+        code = winner.code
+        # The last call decides whether the next retry may patch this code
+        llm_calls.append(llm_calls.pop(winner.index - len(candidates)))
+    elif code is None:
+        # Stream the completion: fences are stripped as it arrives, each top-level
+        # statement is syntax-checked, and a broken generation is cancelled early
+        result = stream_code(llm, full_prompt)
+        llm_stats = dict(result.stats, attempt=retries + 1, mode="full")
+        llm_calls = llm_calls + [llm_stats]
+        print(f"LLM call took {llm_stats['total_seconds']}s (first token after {llm_stats['ttft_seconds']}s)")
+        code = result.code
+        if result.error:
+            stream_error = f"Invalid Python syntax: {result.error}"
+    state["llm_calls"] = llm_calls
     
-    state["generated_code"] = response.content
+    state["generated_code"] = code
     state["current_retry"] += 1
     state["parse_error"] = None # Reset errors for the new code
     state["test_error"] = None
+    if stream_error:
+        print(f"Generation cancelled early: {stream_error}")
+        state["parse_error"] = stream_error
     
     return state
 
@@ -130,6 +267,10 @@ def parse_code_node(state: GraphState):
     Node to check if the generated code is valid Python syntax.
     """
     print("--- PARSING CODE ---")
+    if state.get("parse_error"):
+        # The generator already cancelled this attempt on a syntax error
+        print(f"Syntax error found while streaming: {state['parse_error']}")
+        return state
     try:
         ast.parse(state["generated_code"])
         print("Syntax is valid.")
@@ -151,44 +292,16 @@ def test_code_node(state: GraphState):
     
     code_to_test = state["generated_code"]
     
-    # Mock the API response
-    mock_api_response = MagicMock()
-    mock_api_response.status_code = 200
-    # mock_api_response.json.return_value = {
-    #     "results": [
-    #         {"title": "A New Hope", "episode_id": 4, "director": "George Lucas"},
-    #         {"title": "The Empire Strikes Back", "episode_id": 5, "director": "Irvin Kershner"},
-    #     ]
-    # }
-    
-    # Use patch to intercept calls to requests, os, and open
-    # This creates a "sandbox" for our test.
-    with patch('requests.get', return_value=mock_api_response) as mock_get, \
-         patch('os.makedirs') as mock_makedirs, \
-         patch('builtins.open', mock_open()) as mock_file:
-        
-        try:
-            # Execute the generated code in a restricted namespace
-            exec_namespace = {}
-            exec(code_to_test, exec_namespace)
-            
-            # --- Validation Checks ---
-            # 1. Did it try to make the correct directory?
-            # mock_makedirs.assert_called_with("movies", exist_ok=True)
-            
-            # 2. Did it try to fetch data from the API?
-            # mock_get.assert_called_with("[https://swapi.dev/api/films/](https://swapi.dev/api/films/)")
-
-            # 3. Did it try to create the correct files?
-            # mock_file.assert_any_call("movies/A_New_Hope.json", "w")
-            # mock_file.assert_any_call("movies/The_Empire_Strikes_Back.json", "w")
-            
-            print("All validation checks passed.")
-            state["test_error"] = None
+    try:
+        # Execute the generated code with network and file access mocked out. __file__
+        # points at the path the code is saved to, so its crawler_utils import resolves.
+        mocked_exec(code_to_test, os.path.abspath("generated_api_crawler.py"))
+        print("All validation checks passed.")
+        state["test_error"] = None
 
-        except Exception as e:
-            print(f"Test failed: {e}")
-            state["test_error"] = f"Runtime or validation error: {e}"
+    except Exception as e:
+        print(f"Test failed: {e}")
+        state["test_error"] = f"Runtime or validation error: {e}"
             
     return state
 
@@ -226,9 +339,9 @@ def decide_after_test(state: GraphState):
 workflow = StateGraph(GraphState)
 
 # Add the nodes
-workflow.add_node("generator", generate_code_node)
-workflow.add_node("parser", parse_code_node)
-workflow.add_node("tester", test_code_node)
+workflow.add_node("generator", timed_node("generator", generate_code_node))
+workflow.add_node("parser", timed_node("parser", parse_code_node))
+workflow.add_node("tester", timed_node("tester", test_code_node))
 
 # Set the entry point
 workflow.set_entry_point("generator")
@@ -263,6 +376,14 @@ if __name__ == "__main__":
     {ctv_doc}
     """
     
+    # Skip the whole run when nothing that shapes the generated code has changed
+    build_cache = BuildCache()
+    build_target = "langgraph:ctv"
+    cache_key = build_key(ctv_doc, PROMPT_TEMPLATE + USER_PROMPT, MODEL_ID, GENERATOR_VERSION)
+    if build_cache.is_fresh(build_target, cache_key):
+        print("Inputs unchanged since the last successful build, keeping 'generated_api_crawler.py'.")
+        sys.exit(0)
+    
     # Set initial state and run the graph
     initial_state = {
         "prompt": USER_PROMPT,
@@ -271,10 +392,18 @@ if __name__ == "__main__":
         "test_error": None,
         "max_retries": 3,
         "current_retry": 0,
+        "trace": [],
+        "llm_calls": [],
+        "candidates": int(os.getenv("CANDIDATES", "1")),
+        "strategy": os.getenv("CANDIDATE_STRATEGY", "first"),
     }
     
     final_state = app.invoke(initial_state)
     
+    report = write_trace(final_state)
+    print(f"\nGeneration trace saved to 'generation_trace.json' "
+          f"({report['summary']['wall_seconds']}s over {report['summary']['attempts']} attempts)")
+    
     print("\n\n--- FINAL RESULT ---")
     
     if final_state["test_error"] or final_state["parse_error"]:
@@ -287,6 +416,7 @@ if __name__ == "__main__":
         final_code = final_state["generated_code"]
         with open("generated_api_crawler.py", "w") as f:
             f.write(final_code)
+        build_cache.record(build_target, cache_key, ["generated_api_crawler.py"])
         
         print("\nFinal code saved to 'generated_api_crawler.py'")
         print("\n--- CODE ---")
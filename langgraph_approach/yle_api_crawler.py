@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 import requests
-import json
 import os
 import re
-import time
+import sys
 from datetime import datetime, timedelta
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawler_utils.bootstrap_cache import BootstrapCache, default_cache_path
+from crawler_utils.changelog import ChangeLog
+from crawler_utils.dedup import content_hash
+from crawler_utils.freshness import FreshnessScheduler, default_freshness_path
+from crawler_utils.http_client import HttpClient
+from crawler_utils.locales import fan_out, split_locales
+from crawler_utils.metrics import get_metrics
+from crawler_utils.output import OutputWriter
+from crawler_utils.tv_guide import TvGuide
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -14,8 +24,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+FALLBACK_BUILD_ID = "Q_35nL8jUwGOhxPC9wVX5"  # Example build_id from the API docs
+
 class YleAreenaCrawler:
-    def __init__(self, days_to_crawl=7):
+    def __init__(self, days_to_crawl=7, locales=None):
         self.days_to_crawl = days_to_crawl
         self.base_url = "https://areena.api.yle.fi"
         self.next_data_url = "https://areena.yle.fi/_next/data"
@@ -31,6 +43,10 @@ class YleAreenaCrawler:
             "app_key": "wlTs5D9OjIdeS9krPzRQR4I1PYVzoazN"
         }
         
+        # Schedule languages, fetched concurrently; the first one is primary and
+        # the others only store their translated fields (e.g. YLE_LOCALES=fi,sv)
+        self.locales = locales or os.getenv("YLE_LOCALES", self.common_params["language"]).split(",")
+        
         # Common headers
         self.headers = {
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
@@ -54,16 +70,34 @@ class YleAreenaCrawler:
             "yle-areena"
         ]
         
+        # (channel, date) pairs learned from the TV guide page, see get_crawl_plan()
+        self._plan = None
+        
         # Create output directory
         self.output_dir = "yle_areena_results"
         os.makedirs(self.output_dir, exist_ok=True)
+        # Request, sleep, parse and write timings for the run report
+        self.metrics = get_metrics()
+        self.http = HttpClient(metrics=self.metrics)
+        self.writer = OutputWriter(metrics=self.metrics)
+        # Per (channel, date) revisit intervals learned from earlier crawls
+        self.freshness = FreshnessScheduler(default_freshness_path("yle"))
+        # Insert/update/delete events against the previous crawl
+        self.changelog = ChangeLog("yle")
+        
+        # build_id and country are cached between runs. The build_id is only
+        # refetched once it expires or a _next/data call reports it stale.
+        self.bootstrap_cache = BootstrapCache(default_cache_path("yle_bootstrap"))
         
         # Get build_id and location
-        self.build_id = self._get_build_id()
-        self._get_location()
+        self.build_id = self.bootstrap_cache.get_or_fetch("build_id", self._get_build_id) or FALLBACK_BUILD_ID
+        country = self.bootstrap_cache.get_or_fetch("country", self._get_location)
+        if country:
+            self.common_params["country"] = country
+        logger.info(f"Using build_id {self.build_id} and country {self.common_params['country']}")
 
     def _get_build_id(self):
-        """Extract the build_id from the main page"""
+        """Extract the build_id from the main page, or None if it cannot be found"""
         try:
             response = requests.get("https://areena.yle.fi/tv/opas", headers=self.headers)
             response.raise_for_status()
@@ -76,13 +110,44 @@ class YleAreenaCrawler:
                 return build_id
             else:
                 logger.error("Could not find build_id in the page")
-                return "Q_35nL8jUwGOhxPC9wVX5"  # Fallback to example build_id
+                return None
         except Exception as e:
             logger.error(f"Error getting build_id: {e}")
-            return "Q_35nL8jUwGOhxPC9wVX5"  # Fallback to example build_id
+            return None
+
+    def _refresh_build_id(self):
+        """Drop the cached build_id and fetch the current one"""
+        self.bootstrap_cache.invalidate("build_id")
+        self.build_id = self.bootstrap_cache.get_or_fetch("build_id", self._get_build_id) or FALLBACK_BUILD_ID
+        logger.info(f"Refreshed build_id: {self.build_id}")
+        return self.build_id
+
+    def _get_next_data(self, page, params=None):
+        """Fetch a Next.js data page such as "fi/tv/opas.json" for the current build"""
+        headers = {**self.headers, "x-nextjs-data": "1"}
+        
+        for attempt in range(2):
+            url = f"{self.next_data_url}/{self.build_id}/{page}"
+            # Hedged: these pages have a long latency tail
+            response = self.http.get(
+                url,
+                params=params,
+                headers=headers,
+                cookies=self.cookies,
+                endpoint=f"areena.yle.fi/_next/data/{{build_id}}/{page}",
+                hedge=True
+            )
+            
+            # A 404 means the site was redeployed and the build_id is stale
+            if response.status_code == 404 and attempt == 0:
+                self._refresh_build_id()
+                continue
+            
+            response.raise_for_status()
+            return response.json()
 
     def _get_location(self):
-        """Get user location information"""
+        """Get the user's country code, or None if the lookup fails"""
         try:
             params = {
                 "app_id": "analytics-sdk",
@@ -98,11 +163,11 @@ class YleAreenaCrawler:
             response.raise_for_status()
             
             location_data = response.json()
-            self.common_params["country"] = location_data.get("country_code", "IN")
-            logger.info(f"Location set to: {self.common_params['country']}")
+            return location_data.get("country_code")
         except Exception as e:
             logger.error(f"Error getting location: {e}")
             # Keep default country code
+            return None
 
     def _sanitize_filename(self, filename):
         """Sanitize filename by replacing spaces with underscores and removing special characters"""
@@ -113,7 +178,7 @@ class YleAreenaCrawler:
         return sanitized
 
     def get_tv_guide_dates(self):
-        """Get available dates from the TV guide navigation API"""
+        """Get the dates to crawl: the past n days including today"""
         dates = []
         today = datetime.now()
         
@@ -124,8 +189,54 @@ class YleAreenaCrawler:
         
         return dates
 
-    def get_channel_schedule(self, channel_id, date):
-        """Get the TV program schedule for a specific channel on a specific date"""
+    def get_tv_guide(self):
+        """Read the TV guide page once and return its TvGuide, or None if nothing was recognised"""
+        try:
+            guide = TvGuide.from_next_data(self._get_next_data("fi/tv/opas.json"))
+        except Exception as e:
+            logger.error(f"Error reading the TV guide page: {e}")
+            return None
+        
+        if not guide.dates or not guide.channels:
+            logger.warning("TV guide page listed no dates or channels")
+            return None
+        
+        logger.info(f"TV guide offers {guide.dates[0]}..{guide.dates[-1]} for channels {guide.channels}")
+        return guide
+
+    def get_crawl_plan(self):
+        """
+        Return the (channel, date) pairs to crawl, ordered by date.
+        
+        Only dates the guide offers within the crawl window and channels it has
+        schedules for are planned. If the guide page cannot be read, every
+        configured channel is planned for every date in the window. Pairs
+        fetched recently enough for their distance from today are left out.
+        """
+        if self._plan is None:
+            window = self.get_tv_guide_dates()
+            guide = self.get_tv_guide()
+            if guide:
+                plan = guide.plan(start=min(window), end=max(window))
+            else:
+                plan = [(channel_id, date) for date in sorted(window) for channel_id in self.channels]
+            self._plan = [
+                (channel_id, date) for channel_id, date in plan
+                if self.freshness.is_due(f"yle:{channel_id}:{date}", date)
+            ]
+            logger.info(f"{len(self._plan)} of {len(plan)} channel schedules are due for a recrawl")
+        return self._plan
+
+    def get_channel_schedule(self, channel_id, date, strict=False, language=None):
+        """
+        Get the TV program schedule for a specific channel on a specific date.
+        
+        The HTTP client already retries transient failures with jitter and fails
+        fast while the schedules endpoint's circuit is open. A page that still
+        fails ends the pagination; with strict=True the error is raised instead
+        of returning the pages fetched so far. language overrides the default
+        schedule language.
+        """
         all_programs = []
         offset = 0
         limit = 100
@@ -137,6 +248,8 @@ class YleAreenaCrawler:
                 
                 # Set up parameters
                 params = self.common_params.copy()
+                if language:
+                    params["language"] = language
                 params.update({
                     "yleReferer": yle_referer,
                     "offset": offset,
@@ -145,15 +258,16 @@ class YleAreenaCrawler:
                 
                 # Make the request
                 url = f"{self.base_url}/v1/ui/schedules/{channel_id}/{date}.json"
-                response = requests.get(
+                response = self.http.get(
                     url,
                     params=params,
                     headers=self.headers,
-                    cookies=self.cookies
+                    cookies=self.cookies,
+                    endpoint="areena.api.yle.fi/v1/ui/schedules/{channel}/{date}.json"
                 )
                 response.raise_for_status()
                 
-                data = response.json()
+                data = self.http.json(response)
                 programs = data.get("data", [])
                 all_programs.extend(programs)
                 
@@ -165,37 +279,40 @@ class YleAreenaCrawler:
                     break
                 
                 offset += limit
-                time.sleep(1)  # Be nice to the server
+                self.metrics.sleep(1)  # Be nice to the server
                 
             except Exception as e:
                 logger.error(f"Error getting schedule for {channel_id} on {date}: {e}")
+                if strict:
+                    raise
                 break
         
         return all_programs
 
-    def save_program_data(self, program, channel_id, date):
-        """Save program data to a JSON file"""
+    def _program_id(self, program):
+        """Return the Areena item ID from a program's pointer.uri, or None"""
+        uri = (program.get("pointer") or {}).get("uri", "")
+        id_match = re.search(r'yleareena://items/(\S+)', uri)
+        return id_match.group(1) if id_match else None
+
+    def save_program_data(self, program, channel_id, date, variants=None):
+        """
+        Save program data to a JSON file.
+        
+        variants maps locale codes to the program as fetched in that locale;
+        with more than one, program_data holds the shared fields once and only
+        the translated fields per locale (see crawler_utils.locales).
+        """
         try:
             # Extract program title
             title = program.get("title", "Unknown_Program")
             sanitized_title = self._sanitize_filename(title)
             
             # Extract program ID from pointer.uri if available
-            program_id = "unknown_id"
-            pointer = program.get("pointer", {})
-            if pointer and "uri" in pointer:
-                uri = pointer["uri"]
-                id_match = re.search(r'yleareena://items/(\S+)', uri)
-                if id_match:
-                    program_id = id_match.group(1)
+            program_id = self._program_id(program) or "unknown_id"
             
-            # Create channel directory
-            channel_dir = os.path.join(self.output_dir, channel_id)
-            os.makedirs(channel_dir, exist_ok=True)
-            
-            # Create date directory
-            date_dir = os.path.join(channel_dir, date)
-            os.makedirs(date_dir, exist_ok=True)
+            # Channel/date directory, created by the writer on first use
+            date_dir = os.path.join(self.output_dir, channel_id, date)
             
             # Create filename with program ID for uniqueness
             filename = f"{sanitized_title}_{program_id}.json"
@@ -215,40 +332,100 @@ class YleAreenaCrawler:
                 "broadcast_time": broadcast_time,
                 "program_data": program
             }
+            if variants and len(variants) > 1:
+                program_data["locales"] = list(variants)
+                program_data["program_data"] = split_locales(variants)
             
-            # Save to file
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(program_data, f, ensure_ascii=False, indent=2)
+            # Queue for the background writer
+            self.writer.write_json(filepath, program_data)
             
-            logger.debug(f"Saved program: {title} to {filepath}")
+            logger.debug(f"Queued program: {title} for {filepath}")
             
         except Exception as e:
             logger.error(f"Error saving program data: {e}")
 
+    def work_units(self):
+        """Return one sharding work unit per (channel, date) pair as (key, payload) pairs"""
+        return [
+            (f"yle:{channel_id}:{date}", {"channel": channel_id, "date": date})
+            for channel_id, date in self.get_crawl_plan()
+        ]
+
+    def crawl_schedule(self, channel_id, date):
+        """
+        Fetch and save one channel's schedule for a date, recording it for freshness scheduling.
+        
+        A schedule that cannot be fetched completely raises, so it is neither
+        saved partially nor reported as deleted programs, and stays due.
+        """
+        variants = fan_out(
+            self.locales,
+            lambda language: self.get_channel_schedule(channel_id, date, strict=True, language=language)
+        )
+        programs = variants[self.locales[0]]
+        logger.info(f"Found {len(programs)} programs for {channel_id} on {date}")
+        
+        # An empty result may be a failed fetch, so it stays due for the next
+        # run and is not reported as every program being deleted
+        if programs:
+            self.freshness.record(f"yle:{channel_id}:{date}", date, content_hash(programs))
+            self.changelog.capture(f"{channel_id}/{date}", programs, self._program_id)
+        
+        # Match each program's translations by item ID
+        translations = {
+            locale: {self._program_id(program): program for program in localized}
+            for locale, localized in variants.items()
+        }
+        for program in programs:
+            program_id = self._program_id(program)
+            program_variants = {
+                locale: by_id[program_id] for locale, by_id in translations.items() if program_id in by_id
+            } if program_id else {}
+            self.save_program_data(program, channel_id, date, program_variants)
+        return programs
+
+    def crawl_unit(self, unit):
+        """Crawl a single work unit produced by work_units()"""
+        programs = self.crawl_schedule(unit["channel"], unit["date"])
+        return {"programs": len(programs)}
+
+    def close(self):
+        """Wait for the queued files to reach the disk and close the crawl state databases"""
+        self.writer.close()
+        self.freshness.close()
+        self.changelog.close()
+
     def crawl(self):
         """Main crawling function"""
         logger.info("Starting YLE Areena TV schedule crawler")
         
-        # Get available dates
-        dates = self.get_tv_guide_dates()
-        logger.info(f"Crawling data for dates: {dates}")
+        # Get the (channel, date) pairs the guide has data for
+        plan = self.get_crawl_plan()
+        logger.info(f"Crawling {len(plan)} channel schedules for dates: {sorted({date for _, date in plan})}")
         
         # Iterate through dates and channels
-        for date in dates:
-            logger.info(f"Processing date: {date}")
-            
-            for channel_id in self.channels:
-                logger.info(f"Processing channel: {channel_id}")
+        try:
+            current_date = None
+            for channel_id, date in plan:
+                if date != current_date:
+                    logger.info(f"Processing date: {date}")
+                    current_date = date
                 
-                # Get channel schedule
-                programs = self.get_channel_schedule(channel_id, date)
-                logger.info(f"Found {len(programs)} programs for {channel_id} on {date}")
+                logger.info(f"Processing channel: {channel_id}")
                 
-                # Save each program
-                for program in programs:
-                    self.save_program_data(program, channel_id, date)
+                # Get and save the channel schedule
+                try:
+                    self.crawl_schedule(channel_id, date)
+                except Exception:
+                    # Already logged; an open circuit makes the next units fail fast
+                    pass
                 
-                time.sleep(2)  # Be nice to the server
+                self.metrics.sleep(2)  # Be nice to the server
+        finally:
+            # Wait for the queued files to reach the disk
+            self.close()
+            json_path, _ = self.metrics.export("yle")
+            logger.info(f"Metrics written to {json_path}")
         
         logger.info("Crawling completed")
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import boto3
 import configparser
 from langchain_aws.chat_models import ChatBedrock
@@ -6,6 +7,14 @@ from langchain_core.messages import HumanMessage
 import dotenv
 from botocore.config import Config
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from codegen_utils.build_cache import BuildCache, build_key
+
+MODEL_ID = "arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# Bump when a change to this script should invalidate every cached build
+GENERATOR_VERSION = "initial-1"
+
 os.environ["AWS_SHARED_CREDENTIALS_FILE"] = '~/.aws/credentials'
 os.environ["AWS_PROFILE"] = '536697239187-/AI-DEVELOPER'
 
@@ -42,7 +51,7 @@ bedrock_runtime = boto3.client(
 )
 
 llm = ChatBedrock(
-    model_id="arn:aws:bedrock:us-east-1:536697239187:inference-profile/us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+    model_id=MODEL_ID,
     client=bedrock_runtime,
     provider="anthropic",
     model_kwargs={
@@ -140,13 +149,22 @@ prompt = f"""
 
 # """
 
+# Skip the LLM call when the same inputs already produced an untouched crawler
+build_cache = BuildCache()
+output_path = f"{dir}/hotstar.py"
+cache_key = build_key(hotstar_file, prompt, MODEL_ID, GENERATOR_VERSION)
+if build_cache.is_fresh("initial:hotstar", cache_key):
+    print(f"Inputs unchanged since the last build, keeping {output_path}")
+    sys.exit(0)
+
 # print(hotstar_device_id)
 message = HumanMessage(content=prompt)
 
 response = llm.invoke([message])
 
-with open(f"{dir}/hotstar.py", "w") as f:
+with open(output_path, "w") as f:
     f.write(response.content)
+build_cache.record("initial:hotstar", cache_key, [output_path])
 # print(response.content)
 
 print("SUCCESS")
\ No newline at end of file
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from codegen_utils.candidates import Variant, generate_candidates
+
+VARIANTS = (Variant("greedy", 0.0, ""), Variant("warm", 0.5, ""))
+
+
+class FakeChunk:
+    def __init__(self, content):
+        self.content = content
+        self.usage_metadata = None
+
+    def __add__(self, other):
+        return FakeChunk(self.content + other.content)
+
+
+class FakeLLM:
+    def __init__(self, text):
+        self.text = text
+
+    def stream(self, messages):
+        for line in self.text.splitlines(keepends=True):
+            yield FakeChunk(line)
+
+
+class ThrottlingException(Exception):
+    pass
+
+
+def test_a_failing_candidate_does_not_abort_the_others():
+    def make_llm(temperature):
+        if temperature == 0.0:
+            raise ThrottlingException("Rate exceeded")
+        return FakeLLM("x = 1\n")
+
+    winner, candidates = generate_candidates(make_llm, "prompt", lambda code: None, variants=VARIANTS)
+    assert winner.variant.name == "warm"
+    assert candidates[0].error.startswith("Generation failed: ThrottlingException")
+    assert candidates[0].stats["stop_reason"] == "error"
+
+
+def test_a_raising_validation_is_recorded_as_the_candidates_error():
+    def validate(code):
+        raise RuntimeError("sandbox crashed")
+
+    winner, candidates = generate_candidates(lambda t: FakeLLM("x = 1\n"), "prompt", validate,
+                                             variants=VARIANTS, strategy="best")
+    assert winner is None
+    assert all(c.error == "Validation failed: RuntimeError: sandbox crashed" for c in candidates)
+
+
+def test_first_does_not_wait_for_validations_in_flight():
+    release = threading.Event()
+
+    def validate(code):
+        if code.startswith("slow"):
+            release.wait(5)
+        return None
+
+    def make_llm(temperature):
+        return FakeLLM("slow = 1\n" if temperature == 0.0 else "fast = 1\n")
+
+    start = time.perf_counter()
+    try:
+        winner, candidates = generate_candidates(make_llm, "prompt", validate, variants=VARIANTS)
+    finally:
+        release.set()
+    assert time.perf_counter() - start < 2
+    assert winner.variant.name == "warm"
+    assert [c.index for c in candidates] == [0, 1]
+    assert candidates[0].error == "cancelled"
@@ -0,0 +1,47 @@
+import ast
+
+from codegen_utils.patching import apply_patch
+
+ORIGINAL = '''import os
+
+
+class A:
+    def g(self):
+        def f():
+            return "helper"
+        return f()
+
+
+def main():
+    return A().g()
+'''
+
+
+def test_method_replacement_does_not_touch_nested_helpers():
+    patched = apply_patch(ORIGINAL, '''class A:
+    def f(self):
+        return "method"
+''')
+    ast.parse(patched)
+    # The helper nested in A.g stays; f is added as a new method of A
+    assert 'return "helper"' in patched
+    cls = next(node for node in ast.parse(patched).body if isinstance(node, ast.ClassDef))
+    assert [item.name for item in cls.body] == ["g", "f"]
+
+
+def test_existing_method_is_replaced_in_place():
+    patched = apply_patch(ORIGINAL, '''class A:
+    def g(self):
+        return "patched"
+''')
+    assert 'return "patched"' in patched
+    assert 'return "helper"' not in patched
+    assert patched.index("class A") < patched.index('return "patched"') < patched.index("def main")
+
+
+def test_top_level_function_is_replaced():
+    patched = apply_patch(ORIGINAL, '''def main():
+    return None
+''')
+    assert "return None" in patched
+    assert "return A().g()" not in patched
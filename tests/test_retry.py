@@ -0,0 +1,104 @@
+import time
+
+import pytest
+import requests
+
+from crawler_utils.metrics import Metrics
+from crawler_utils.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+def open_breaker(threshold=2, reset_timeout=0.05):
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_timeout=reset_timeout)
+    for _ in range(threshold):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    assert not breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    assert not breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes_the_circuit():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, failure_threshold=2,
+                       reset_timeout=0.05, metrics=Metrics())
+
+
+def test_policy_retries_failing_statuses(policy):
+    responses = iter([FakeResponse(503), FakeResponse(200)])
+    assert policy.call("api", lambda: next(responses)).status_code == 200
+
+
+def test_policy_fails_fast_while_open(policy):
+    def send():
+        raise requests.exceptions.ConnectionError("down")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        policy.call("api", send)
+    assert policy.breaker("api").state == "open"
+    with pytest.raises(CircuitOpenError):
+        policy.call("api", lambda: FakeResponse(200))
+
+
+def test_unexpected_error_in_trial_releases_it(policy):
+    breaker = policy.breaker("api")
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    def send():
+        raise ValueError("bad body")
+
+    with pytest.raises(ValueError):
+        policy.call("api", send)
+    # The trial failed and reopened the circuit; the next trial is allowed once it resets
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert policy.call("api", lambda: FakeResponse(200)).status_code == 200
+    assert breaker.state == "closed"
@@ -0,0 +1,46 @@
+from crawler_utils.sharding import HashRing, plan, shard_names
+from crawler_utils.work_queue import InMemoryWorkQueue
+
+KEYS = [f"yle:yle-tv1:2024-06-{day:02d}:{i}" for day in range(1, 31) for i in range(20)]
+
+
+def assignment(nodes):
+    ring = HashRing(nodes)
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_assignment_is_deterministic():
+    assert assignment(shard_names(3)) == assignment(shard_names(3))
+
+
+def test_every_shard_gets_units():
+    owners = set(assignment(shard_names(4)).values())
+    assert owners == set(shard_names(4))
+
+
+def test_adding_a_node_only_moves_units_to_it():
+    before = assignment(shard_names(4))
+    after = assignment(shard_names(5))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "shard-4" for key in moved)
+    # Roughly a fifth of the units should move, nowhere near all of them
+    assert 0 < len(moved) < len(KEYS) * 0.35
+
+
+def test_removing_a_node_only_moves_its_units():
+    before = assignment(shard_names(5))
+    after = assignment(shard_names(4))
+    for key in KEYS:
+        if before[key] != "shard-4":
+            assert after[key] == before[key]
+
+
+def test_plan_enqueues_each_unit_on_exactly_one_shard():
+    shards = shard_names(3)
+    ring = HashRing(shards)
+    units = [(key, {"key": key}) for key in KEYS[:100]]
+    queues = {shard: InMemoryWorkQueue() for shard in shards}
+    planned = sum(plan(queue, units, ring, shard) for shard, queue in queues.items())
+    assert planned == len(units)
+    # Planning again adds nothing
+    assert sum(plan(queue, units, ring, shard) for shard, queue in queues.items()) == 0
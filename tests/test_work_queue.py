@@ -0,0 +1,161 @@
+import time
+
+import pytest
+
+from crawler_utils.work_queue import (
+    InMemoryWorkQueue, LocalBroker, RedisWorkQueue, SQLiteWorkQueue, WorkQueue, open_queue,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "local"])
+def make_queue(request, tmp_path):
+    queues = []
+
+    def make(max_attempts=3):
+        if request.param == "memory":
+            queue = InMemoryWorkQueue(max_attempts=max_attempts)
+        elif request.param == "sqlite":
+            queue = SQLiteWorkQueue(str(tmp_path / f"queue-{len(queues)}.sqlite"), max_attempts=max_attempts)
+        else:
+            queue = open_queue("local://", max_attempts=max_attempts)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def test_work_queue_is_abstract():
+    with pytest.raises(TypeError):
+        WorkQueue()
+
+
+def test_put_ignores_known_keys(make_queue):
+    queue = make_queue()
+    assert queue.put("a", {"n": 1})
+    assert not queue.put("a", {"n": 2})
+    assert queue.lease("w").payload == {"n": 1}
+
+
+def test_leased_unit_is_hidden_until_acked(make_queue):
+    queue = make_queue()
+    queue.put("a", {"n": 1})
+    lease = queue.lease("w1")
+    assert lease.key == "a" and lease.attempts == 1
+    assert queue.lease("w2") is None
+    assert queue.ack(lease, {"items": 3})
+    assert queue.counts() == {"done": 1}
+    assert queue.results() == {"a": {"items": 3}}
+    assert queue.lease("w2") is None
+
+
+def test_ack_twice_only_succeeds_once(make_queue):
+    queue = make_queue()
+    queue.put("a", {})
+    lease = queue.lease("w")
+    assert queue.ack(lease)
+    assert not queue.ack(lease)
+    assert not queue.nack(lease)
+
+
+def test_nack_makes_the_unit_visible_again(make_queue):
+    queue = make_queue()
+    queue.put("a", {})
+    lease = queue.lease("w1")
+    assert queue.nack(lease, "boom")
+    assert not queue.nack(lease, "boom")
+    retry = queue.lease("w2")
+    assert retry.key == "a" and retry.attempts == 2
+    assert retry.lease_id != lease.lease_id
+
+
+def test_nack_delay_hides_the_unit(make_queue):
+    queue = make_queue()
+    queue.put("a", {})
+    queue.nack(queue.lease("w"), delay=60)
+    assert queue.lease("w") is None
+    assert queue.counts() == {"pending": 1}
+
+
+def test_nack_on_the_last_attempt_fails_the_unit(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.put("a", {})
+    queue.nack(queue.lease("w"))
+    queue.nack(queue.lease("w"))
+    assert queue.lease("w") is None
+    assert queue.counts() == {"failed": 1}
+
+
+def test_expired_lease_is_handed_to_the_next_worker(make_queue):
+    queue = make_queue()
+    queue.put("a", {})
+    stale = queue.lease("crashed", timeout=0.01)
+    time.sleep(0.05)
+    lease = queue.lease("w")
+    assert lease.key == "a" and lease.attempts == 2
+    # The crashed worker's lease is lost; the new one completes the unit
+    assert not queue.nack(stale)
+    assert queue.ack(lease)
+    assert queue.counts() == {"done": 1}
+
+
+def test_unit_fails_once_its_leases_keep_expiring(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.put("a", {})
+    queue.lease("w1", timeout=0.01)
+    time.sleep(0.05)
+    queue.lease("w2", timeout=0.01)
+    time.sleep(0.05)
+    assert queue.lease("w3") is None
+    assert queue.counts() == {"failed": 1}
+
+
+def test_sqlite_queue_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    first, second = SQLiteWorkQueue(path), SQLiteWorkQueue(path)
+    try:
+        first.put("a", {})
+        first.put("b", {})
+        leases = [first.lease("w1"), second.lease("w2")]
+        assert {lease.key for lease in leases} == {"a", "b"}
+        assert first.lease("w1") is None
+        assert second.ack(leases[0])
+        assert first.counts() == {"done": 1, "running": 1}
+    finally:
+        first.close()
+        second.close()
+
+
+class DroppingBroker(LocalBroker):
+    """Drops the connection once, after a transaction's commands are queued but before EXEC."""
+
+    def __init__(self):
+        super().__init__()
+        self.drop_next = False
+
+    def transaction(self, func, *watches, **kwargs):
+        if not self.drop_next:
+            return super().transaction(func, *watches, **kwargs)
+        self.drop_next = False
+
+        def queue_then_drop(pipe):
+            func(pipe)
+            raise ConnectionError("connection dropped before EXEC")
+
+        return super().transaction(queue_then_drop, *watches, **kwargs)
+
+
+def test_redis_claim_interrupted_before_the_lease_is_recorded_keeps_the_unit():
+    broker = DroppingBroker()
+    queue = RedisWorkQueue(broker)
+    queue.put("a", {"n": 1})
+    broker.drop_next = True
+    with pytest.raises(ConnectionError):
+        queue.lease("crashed")
+    # The claim never committed, so the unit is still ready rather than lost
+    assert queue.counts() == {"pending": 1}
+    lease = queue.lease("w")
+    assert lease.key == "a" and lease.attempts == 1
+    assert queue.ack(lease)
+    assert queue.counts() == {"done": 1}